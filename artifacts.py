@@ -0,0 +1,235 @@
+# --- Hata Ayıklama Kayıtları (ekran görüntüsü / HTML) Deposu ---
+# Scrape hatalarında alınan ekran görüntüsü ve HTML'ler buraya yazılır. Aynı mağaza ve aynı hata
+# imzası ARTIFACT_DEDUPE_WINDOW içinde tekrar gelirse kaydedilmez, sadece sayılır; böylece bir
+# mağaza çöktüğünde her sorgu diske megabaytlar eklemez. Dosyalar event loop dışında yazılır,
+# HTML gzip ile sıkıştırılır. Toplam boyut ARTIFACT_MAX_BYTES'ı ya da yaş ARTIFACT_MAX_AGE'i
+# aşınca en eski kayıtlar silinir (halka tampon). Yaş sınırı yeni hata gelmese de uygulansın diye
+# start() ile açılan döngü ARTIFACT_PRUNE_INTERVAL'de bir eski kayıtları temizler.
+#
+# Dosya düzeni: ARTIFACT_DIR/<id>.png, ARTIFACT_DIR/<id>.html.gz ve tüm kayıtları listeleyen
+# ARTIFACT_DIR/index.json (en yeni sonda).
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import time
+from datetime import datetime
+
+import metrics
+
+ARTIFACT_DIR = os.environ.get("ARTIFACT_DIR", "debug_output/artifacts")
+ARTIFACT_MAX_BYTES = int(os.environ.get("ARTIFACT_MAX_MB", 200)) * 1024 * 1024
+ARTIFACT_MAX_AGE = float(os.environ.get("ARTIFACT_MAX_AGE_HOURS", 72)) * 3600
+ARTIFACT_DEDUPE_WINDOW = float(os.environ.get("ARTIFACT_DEDUPE_WINDOW", 900))
+# İmza ilk kez görülmese bile kayıtların ancak bu oranı alınır (1.0 = hepsi)
+ARTIFACT_SAMPLE_RATE = float(os.environ.get("ARTIFACT_SAMPLE_RATE", 1.0))
+ARTIFACT_PRUNE_INTERVAL = 3600.0
+INDEX_FILE = "index.json"
+# İmzada oyun adı, sayı ve id'ler farklı olsa da aynı hata aynı sayılsın
+_VOLATILE_RE = re.compile(r"\d+|'[^']*'|\"[^\"]*\"|https?://\S+")
+
+ARTIFACT_CAPTURES = metrics.Counter(
+    "fiyatbot_debug_artifacts_total", "Failure captures by result (saved, duplicate, sampled_out, failed).", ["store", "result"]
+)
+ARTIFACT_BYTES = metrics.Gauge("fiyatbot_debug_artifact_bytes", "Disk space used by stored debug artifacts.")
+
+def error_signature(store, error):
+    """Stable signature of a failure: the store plus the error type and message with volatile parts removed."""
+    if error is None:
+        text = "unknown"
+    elif isinstance(error, BaseException):
+        text = f"{type(error).__name__}: {_VOLATILE_RE.sub('#', str(error).splitlines()[0] if str(error) else '')}"
+    else:
+        text = _VOLATILE_RE.sub("#", str(error))
+    return hashlib.sha1(f"{store}\n{text[:300]}".encode("utf-8")).hexdigest()[:12]
+
+class ArtifactStore:
+    """Bounded, deduplicated store of failure captures with a JSON index."""
+
+    def __init__(self, directory=ARTIFACT_DIR, max_bytes=ARTIFACT_MAX_BYTES, max_age=ARTIFACT_MAX_AGE,
+                 dedupe_window=ARTIFACT_DEDUPE_WINDOW, sample_rate=ARTIFACT_SAMPLE_RATE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.dedupe_window = dedupe_window
+        self.sample_rate = sample_rate
+        self._entries = None  # index.json, ilk kullanımda yüklenir
+        self._total_bytes = 0
+        # imza -> son kayıt zamanı; ekleme sırası zaman sırasıdır, süresi dolanlar baştan silinir
+        self._last_seen = {}
+        self._pending_duplicates = {}  # kaydı henüz yazılmakta olan imzaların tekrar sayısı
+        self._lock = asyncio.Lock()
+        self._background_tasks = set()
+        self._prune_task = None
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    def start(self):
+        # Yeniden bağlanmalarda tekrar çağrılabilir; tek bir döngü yeterli.
+        if self._prune_task is None or self._prune_task.done():
+            self._prune_task = asyncio.create_task(self._prune_loop())
+
+    async def _prune_loop(self):
+        while True:
+            try:
+                await self.prune()
+            except Exception as e:
+                logging.error(f"Eski hata ayıklama kayıtları silinemedi: {e}", exc_info=True)
+            await asyncio.sleep(ARTIFACT_PRUNE_INTERVAL)
+
+    async def prune(self):
+        """Removes entries past the age or size limit from disk and the index."""
+        async with self._lock:
+            await self._load_index()
+            expired = self._prune(time.time())
+            if expired:
+                await asyncio.to_thread(self._persist, list(self._entries), expired)
+
+    def entries(self, store=None, since=0):
+        """Returns index entries (oldest first), optionally filtered by store and creation time."""
+        # Bir sonraki temizliği beklemeden yaş sınırını aşmış kayıtlar gösterilmez.
+        since = max(since, time.time() - self.max_age)
+        return [e for e in self._entries or () if (store is None or e["store"] == store) and e["created_at"] >= since]
+
+    def admit(self, store, error):
+        """Decides whether a failure should be captured; returns its signature, or None to skip it."""
+        signature = error_signature(store, error)
+        now = time.time()
+        self._forget_seen(now)
+        if signature in self._last_seen:
+            ARTIFACT_CAPTURES.inc(store=store, result="duplicate")
+            self._count_duplicate(signature)
+            return None
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            ARTIFACT_CAPTURES.inc(store=store, result="sampled_out")
+            return None
+        self._last_seen[signature] = now
+        return signature
+
+    def _forget_seen(self, now):
+        # En eski imza baştadır; pencere dışına çıkanlar silinir, sözlük sınırsız büyümez.
+        while self._last_seen:
+            signature, seen_at = next(iter(self._last_seen.items()))
+            if now - seen_at < self.dedupe_window:
+                break
+            del self._last_seen[signature]
+
+    def _count_duplicate(self, signature):
+        # Sayı index'e bir sonraki kayıtta yazılır.
+        for entry in reversed(self._entries or ()):
+            if entry["signature"] == signature:
+                entry["duplicates"] += 1
+                return
+        self._pending_duplicates[signature] = self._pending_duplicates.get(signature, 0) + 1
+
+    async def capture_page(self, page, store, game_name, error=None):
+        """Screenshots a Playwright page and grabs its HTML, then writes both in the background."""
+        signature = self.admit(store, error)
+        if signature is None:
+            return
+        try:
+            # Sayfa hâlâ açıkken alınmalı; diske yazma arka planda yapılır.
+            screenshot = await page.screenshot()
+            html = await page.content()
+        except Exception as e:
+            ARTIFACT_CAPTURES.inc(store=store, result="failed")
+            logging.error(f"Hata ayıklama verileri alınırken bir sorun oluştu: {e}")
+            return
+        self._spawn(self._save(store, signature, game_name, error, page.url, {".png": screenshot, ".html.gz": html}))
+
+    def capture_response(self, response, store, game_name, error=None):
+        """Stores the body of a failed HTTP response in the background."""
+        signature = self.admit(store, error)
+        if signature is None:
+            return
+        self._spawn(self._save(store, signature, game_name, error, str(response.url), {".html.gz": response.text}))
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _save(self, store, signature, game_name, error, url, files):
+        now = time.time()
+        safe_game_name = re.sub(r'[^\w-]', '_', game_name)[:60]
+        artifact_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{store}_{safe_game_name}_{signature}"
+        try:
+            sizes = await asyncio.to_thread(self._write_files, artifact_id, files)
+        except Exception as e:
+            ARTIFACT_CAPTURES.inc(store=store, result="failed")
+            logging.error(f"Hata ayıklama verileri kaydedilirken bir sorun oluştu: {e}")
+            return
+        entry = {
+            "id": artifact_id,
+            "store": store,
+            "signature": signature,
+            "game": game_name,
+            "error": str(error)[:500] if error is not None else None,
+            "url": url,
+            "created_at": now,
+            "files": [artifact_id + suffix for suffix in files],
+            "bytes": sum(sizes),
+            "duplicates": 0,
+        }
+        async with self._lock:
+            await self._load_index()
+            entry["duplicates"] = self._pending_duplicates.pop(signature, 0)
+            self._entries.append(entry)
+            self._total_bytes += entry["bytes"]
+            expired = self._prune(now)
+            await asyncio.to_thread(self._persist, list(self._entries), expired)
+        ARTIFACT_CAPTURES.inc(store=store, result="saved")
+        logging.info(f"Hata ayıklama kaydı alındı: {artifact_id} ({entry['bytes'] // 1024} KB)")
+
+    def _write_files(self, artifact_id, files):
+        os.makedirs(self.directory, exist_ok=True)
+        sizes = []
+        for suffix, content in files.items():
+            if suffix.endswith(".gz"):
+                content = gzip.compress(content.encode("utf-8") if isinstance(content, str) else content, compresslevel=6)
+            with open(os.path.join(self.directory, artifact_id + suffix), "wb") as f:
+                f.write(content)
+            sizes.append(len(content))
+        return sizes
+
+    async def _load_index(self):
+        if self._entries is None:
+            self._entries = await asyncio.to_thread(self._read_index)
+            self._total_bytes = sum(entry["bytes"] for entry in self._entries)
+            ARTIFACT_BYTES.set_function(lambda: self.total_bytes)
+
+    def _read_index(self):
+        try:
+            with open(os.path.join(self.directory, INDEX_FILE), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    def _prune(self, now):
+        """Drops the oldest entries past the age or size limit and returns them."""
+        expired = []
+        while self._entries and (
+            now - self._entries[0]["created_at"] > self.max_age or self.total_bytes > self.max_bytes
+        ):
+            entry = self._entries.pop(0)
+            self._total_bytes -= entry["bytes"]
+            expired.append(entry)
+        return expired
+
+    def _persist(self, entries, expired):
+        for entry in expired:
+            for name in entry["files"]:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+        path = os.path.join(self.directory, INDEX_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(entries, f, ensure_ascii=False, indent=1)
+        os.replace(path + ".tmp", path)
@@ -0,0 +1,173 @@
+# --- Discord'suz Toplu Fiyat Sorgusu (CLI) ---
+# Bir dosyadaki (ya da stdin'deki) her satırı bir oyun adı olarak alır ve bot ile aynı
+# sorgu hattından (Steam, ITAD, Xbox, PlayStation; aynı önbellekler, çözümleme deposu ve
+# tarayıcı havuzları) geçirir. DISCORD_TOKEN gerekmez. Her oyunun sonucu, biter bitmez bir
+# JSON satırı olarak yazılır (web API'deki /price ile aynı biçim).
+#
+#   python batch.py katalog.txt -o fiyatlar.jsonl --concurrency 8
+#   cat katalog.txt | python batch.py - -o fiyatlar.jsonl
+#
+# Yarıda kesilen bir çalışma aynı komutla --resume eklenerek sürdürülür: çıktı dosyasında
+# başarılı satırı olan oyunlar atlanır, hata alanlar tekrar denenir.
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+import browser_workers
+import log_pipeline
+import main
+from log_pipeline import log_context
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Price a list of games without Discord and stream the results as JSON lines.")
+    parser.add_argument("input", help="file with one game title per line, or - for stdin")
+    parser.add_argument("-o", "--output", help="JSONL file to append results to (default: stdout)")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="lookups in flight at once (default: 4)")
+    parser.add_argument("--resume", action="store_true", help="skip titles that already have a successful line in --output")
+    parser.add_argument("--api-only", action="store_true", help="skip the browser scrapers and use only caches and APIs")
+    args = parser.parse_args()
+    if args.resume and not args.output:
+        parser.error("--resume needs --output")
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    return args
+
+def read_titles(path):
+    """Returns the titles in file order, without blank lines, # comments or duplicates."""
+    f = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    try:
+        titles = []
+        seen = set()
+        for line in f:
+            title = line.strip()
+            if title and not title.startswith("#") and title not in seen:
+                seen.add(title)
+                titles.append(title)
+        return titles
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def completed_titles(path):
+    """Titles that already have a successful result line in the output file."""
+    done = set()
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Kesinti anında yarım kalmış son satır
+                if isinstance(entry, dict) and "error" not in entry and entry.get("query"):
+                    done.add(entry["query"])
+    except FileNotFoundError:
+        pass
+    return done
+
+def open_output(path):
+    if not path:
+        return sys.stdout
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    # Önceki çalışma bir satırın ortasında kesildiyse yeni satırlar ona eklenmesin.
+    needs_newline = False
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        with open(path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b"\n"
+    out = open(path, "a", encoding="utf-8")
+    if needs_newline:
+        out.write("\n")
+    return out
+
+async def start_services(api_only):
+    main.start_steam_title_index()
+    main.exchange_rates.start()
+    main.artifact_store.start()
+    if main.exchange_rates.rate("USD", "TRY") is None:
+        # Soğuk başlangıçta ilk satırlarda TL karşılığı eksik kalmasın.
+        try:
+            await main.exchange_rates.refresh()
+        except Exception as e:
+            logging.warning(f"Döviz kurları alınamadı, TL karşılıkları eksik olacak: {e}")
+    if api_only:
+        return
+    if browser_workers.enabled():
+        await main.start_browser_workers()
+    else:
+        # Tarayıcı ilk konsol sorgusunda denetçi tarafından açılır.
+        main.browser_supervisor.start()
+
+async def stop_services():
+    if main.browser_worker_pool is not None:
+        await main.browser_worker_pool.close()
+    await main.browser_supervisor.close()
+    for http_client in list(main.http_clients.values()):
+        await http_client.aclose()
+
+async def run_batch(titles, out, concurrency, api_only):
+    pending = asyncio.Queue()
+    for title in titles:
+        pending.put_nowait(title)
+    counts = {"ok": 0, "error": 0}
+    started = time.monotonic()
+
+    def write(entry):
+        out.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        out.flush()
+        done = counts["ok"] + counts["error"]
+        if done % 50 == 0 or done == len(titles):
+            rate = done / max(time.monotonic() - started, 1e-9)
+            logging.info(f"Toplu sorgu: {done}/{len(titles)} tamamlandı ({counts['error']} hata, {rate * 60:.1f} oyun/dk)")
+
+    async def worker():
+        while not pending.empty():
+            title = pending.get_nowait()
+            query_started = time.monotonic()
+            with log_context(query_id=log_pipeline.new_query_id()):
+                try:
+                    display_game_name, sonuclar = await main.lookup_prices_coalesced(title, api_only=api_only)
+                    entry = main.price_result_json(title, display_game_name, sonuclar)
+                    counts["ok"] += 1
+                except Exception as e:
+                    logging.error(f"Toplu sorguda '{title}' başarısız: {e}", exc_info=True)
+                    entry = {"query": title, "error": f"{type(e).__name__}: {e}"}
+                    counts["error"] += 1
+            entry["elapsed_ms"] = round((time.monotonic() - query_started) * 1000)
+            write(entry)
+
+    # Binlerce görev açmak yerine sabit sayıda işçi aynı kuyruktan çeker; sonuçlar bitiş sırasıyla yazılır.
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, len(titles)))))
+    return counts
+
+async def amain(args):
+    titles = read_titles(args.input)
+    if args.resume:
+        done = completed_titles(args.output)
+        skipped = sum(1 for title in titles if title in done)
+        titles = [title for title in titles if title not in done]
+        logging.info(f"Devam ediliyor: {skipped} oyun zaten tamamlanmış, {len(titles)} oyun kaldı.")
+    if not titles:
+        return 0
+
+    out = open_output(args.output)
+    await start_services(args.api_only)
+    try:
+        counts = await run_batch(titles, out, args.concurrency, args.api_only)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        await stop_services()
+    return 1 if counts["error"] else 0
+
+if __name__ == "__main__":
+    try:
+        sys.exit(asyncio.run(amain(parse_args())))
+    except KeyboardInterrupt:
+        logging.warning("Toplu sorgu kesildi; --resume ile kaldığı yerden devam edilebilir.")
+        sys.exit(130)
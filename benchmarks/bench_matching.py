@@ -0,0 +1,151 @@
+"""Micro-benchmark for the title matching engine in matching.py.
+
+Every title in store_titles.txt is used once as a query and ranked against the
+whole corpus for each store profile, which is roughly what a search result
+page costs, multiplied a few hundred times. The pre-matching.py implementation
+is kept below so the two can be compared for both speed and identical picks.
+
+    python benchmarks/bench_matching.py [--rounds N]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import matching
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "store_titles.txt")
+
+# --- Eski uygulama (karşılaştırma için, main.py'den olduğu gibi alındı) ---
+def legacy_clean_and_extract_roman(name):
+    name = name.upper()
+    if name.endswith(" IV"): return name.replace(" IV", " 4"), 4
+    if name.endswith(" IX"): return name.replace(" IX", " 9"), 9
+    if name.endswith(" V"): return name.replace(" V", " 5"), 5
+    if name.endswith(" III"): return name.replace(" III", " 3"), 3
+    if name.endswith(" II"): return name.replace(" II", " 2"), 2
+    if name.endswith(" I"): return name.replace(" I", " 1"), 1
+    return name.lower(), None
+
+def legacy_clean_game_name(game_name):
+    name_with_arabic, _ = legacy_clean_and_extract_roman(game_name)
+    cleaned_name = name_with_arabic.replace("™", "")
+    cleaned_name = cleaned_name.replace("®", "")
+    cleaned_name = cleaned_name.replace("©", "")
+    cleaned_name = cleaned_name.replace("'", "")
+    cleaned_name = cleaned_name.replace("’", "")
+    cleaned_name = re.sub(r'[^\w\s]', ' ', cleaned_name, flags=re.UNICODE)
+    cleaned_name = re.sub(r'\s*\(?goty\)?\s*', ' ', cleaned_name, flags=re.I)
+    cleaned_name = re.sub(r'\s*\(?game of the year\)?\s*', ' ', cleaned_name, flags=re.I)
+    cleaned_name = re.sub(r'\s*edition\s*', ' ', cleaned_name, flags=re.I)
+    cleaned_name = re.sub(r'\s*sürümü\s*', ' ', cleaned_name, flags=re.I)
+    cleaned_name = re.sub(r'\s*remastered\s*', ' ', cleaned_name, flags=re.I)
+    cleaned_name = re.sub(r'\s*ultimate\s*', ' ', cleaned_name, flags=re.I)
+    cleaned_name = re.sub(r'\s*deluxe\s*', ' ', cleaned_name, flags=re.I)
+    cleaned_name = re.sub(r'\s+', ' ', cleaned_name)
+    return cleaned_name.strip().lower()
+
+def legacy_extract_numbers_from_title(title):
+    numbers = set(map(int, re.findall(r'\d+', title)))
+    title_upper = f" {title.upper()} "
+    if " II " in title_upper or title_upper.endswith(" II"): numbers.add(2)
+    if " III " in title_upper or title_upper.endswith(" III"): numbers.add(3)
+    if " IV " in title_upper or title_upper.endswith(" IV"): numbers.add(4)
+    if " V " in title_upper or title_upper.endswith(" V"): numbers.add(5)
+    return numbers
+
+def legacy_score_containment(query, item_name, user_query_numbers):
+    cleaned_item_name = legacy_clean_game_name(item_name)
+    current_score = 0
+    if query in cleaned_item_name: current_score += 90
+    elif cleaned_item_name in query: current_score += 85
+    else: return None
+    result_numbers = legacy_extract_numbers_from_title(cleaned_item_name)
+    if user_query_numbers:
+        if not user_query_numbers.intersection(result_numbers): current_score -= 100
+    else:
+        if any(n > 1 for n in result_numbers): current_score -= 100
+    return current_score
+
+def legacy_score_playstation(query, item_name, user_query_numbers):
+    cleaned_item_name = legacy_clean_game_name(item_name)
+    base_score = 100; current_score = 0
+    if cleaned_item_name.startswith(query): current_score = base_score - 5
+    elif query in cleaned_item_name: current_score = base_score - 10
+    else: return None
+    current_score -= len(cleaned_item_name) - len(query)
+    result_numbers = legacy_extract_numbers_from_title(cleaned_item_name)
+    if user_query_numbers:
+        if not user_query_numbers.intersection(result_numbers): current_score = -1
+    else:
+        is_platform_version = any(platform_str in cleaned_item_name for platform_str in ['ps4', 'ps5'])
+        if not is_platform_version and any(n > 1 for n in result_numbers):
+            current_score = -1
+    return current_score
+
+LEGACY_SCORERS = {"steam": legacy_score_containment, "xbox": legacy_score_containment, "playstation": legacy_score_playstation}
+
+def legacy_best(query, titles, profile):
+    scorer = LEGACY_SCORERS[profile]
+    user_query_numbers = legacy_extract_numbers_from_title(query)
+    best_index = None; highest_score = -1
+    for index, title in enumerate(titles):
+        current_score = scorer(query, title, user_query_numbers)
+        if current_score is None: continue
+        if current_score > highest_score:
+            highest_score = current_score; best_index = index
+    if best_index is None or highest_score < 50:
+        return None
+    return best_index, highest_score
+
+def new_best(query, titles, profile):
+    match = matching.best_candidate(query, titles, profile)
+    return (match.index, match.score) if match else None
+
+def load_corpus():
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+def queries_for(titles):
+    # Gerçek sorgular gibi: ham başlık, temizlenmiş hali ve ilk iki kelime
+    queries = []
+    for title in titles:
+        cleaned = legacy_clean_game_name(title)
+        queries.extend([title, cleaned, " ".join(cleaned.split()[:2])])
+    return queries
+
+def run(best, queries, titles, rounds):
+    started = time.perf_counter()
+    picks = None
+    for _ in range(rounds):
+        picks = [best(query, titles, profile) for profile in LEGACY_SCORERS for query in queries]
+    return time.perf_counter() - started, picks
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    titles = load_corpus()
+    queries = queries_for(titles)
+    for name in titles:
+        assert matching.clean_game_name(name) == legacy_clean_game_name(name), name
+
+    legacy_time, legacy_picks = run(legacy_best, queries, titles, args.rounds)
+    matching.clean_game_name.cache_clear()
+    matching.extract_numbers_from_title.cache_clear()
+    new_time, new_picks = run(new_best, queries, titles, args.rounds)
+
+    mismatches = sum(1 for a, b in zip(legacy_picks, new_picks) if a != b)
+    rankings = len(legacy_picks) * args.rounds
+    print(f"corpus: {len(titles)} titles, {len(queries)} queries, {rankings} rankings")
+    print(f"legacy:   {legacy_time:.3f}s ({legacy_time / rankings * 1e6:.1f} µs/ranking)")
+    print(f"matching: {new_time:.3f}s ({new_time / rankings * 1e6:.1f} µs/ranking)")
+    print(f"speedup:  {legacy_time / new_time:.1f}x, differing picks: {mismatches}")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+"""Offline end-to-end benchmark for the price lookup pipeline.
+
+Runs every store function, the lookup graph, and the full !fiyat on_message
+handler against recorded fixtures (see fixtures.py), then reports per-stage and
+end-to-end timings. Each round starts with empty caches and a fresh resolution
+store. A second "warm" pass shows what caching buys.
+
+Record the fixtures once. This needs network access and ITAD_API_KEY:
+
+    python benchmarks/bench_pipeline.py --record "Elden Ring" "Hades"
+
+Then replay them offline as often as you like:
+
+    python benchmarks/bench_pipeline.py --rounds 5 "Elden Ring" "Hades"
+
+Add --browser to also start Chromium and the page pools, for the scraper
+fallbacks. Without it only the browserless paths run.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+DEFAULT_QUERIES = ["Elden Ring", "Red Dead Redemption 2", "Hades", "The Witcher 3", "Forza Horizon 5"]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("queries", nargs="*", default=DEFAULT_QUERIES)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--record", action="store_true", help="hit the live stores and (re)write fixtures")
+    parser.add_argument("--browser", action="store_true", help="start Chromium and the page pools")
+    parser.add_argument("--fixture-dir", default=os.path.join(ROOT, "fixtures"))
+    return parser.parse_args()
+
+def configure_environment(args, work_dir):
+    # main.py bu değişkenleri import sırasında okur; önce ayarlanmalı.
+    os.environ["FIXTURE_MODE"] = "record" if args.record else "replay"
+    os.environ["FIXTURE_DIR"] = args.fixture_dir
+    os.environ["RESOLUTION_DB_PATH"] = os.path.join(work_dir, "resolutions.sqlite3")
+    os.environ["STEAM_TITLE_INDEX_DIR"] = os.path.join(work_dir, "steam_title_index")
+    os.environ["EXCHANGE_RATE_PATH"] = os.path.join(work_dir, "exchange_rates.json")
+    os.environ["WATCHLIST_DB_PATH"] = os.path.join(work_dir, "watchlist.sqlite3")
+    # Loglar ve hata kayıtları da repodaki debug_output/ yerine geçici dizine yazılsın.
+    os.environ["LOG_FILE"] = os.path.join(work_dir, "bench.log")
+    os.environ["ARTIFACT_DIR"] = os.path.join(work_dir, "artifacts")
+    if not args.record:
+        # Anahtar fixture anahtarına girmez; tekrar oynatmada herhangi bir değer yeter.
+        os.environ.setdefault("ITAD_API_KEY", "fixture")
+    sys.path.insert(0, ROOT)
+
+def check_fixtures(args):
+    if args.record:
+        return True
+    if not os.path.isdir(args.fixture_dir) or not os.listdir(args.fixture_dir):
+        print(f"No fixtures in {args.fixture_dir}. Record them first (needs network access and ITAD_API_KEY):", file=sys.stderr)
+        print(f"    python benchmarks/bench_pipeline.py --record {' '.join(repr(q) for q in args.queries)}", file=sys.stderr)
+        return False
+    return True
+
+class Timings:
+    def __init__(self):
+        self.samples = {}
+        self.skipped = {}
+
+    def add(self, name, seconds):
+        self.samples.setdefault(name, []).append(seconds * 1000)
+
+    async def measure(self, name, coro):
+        import fixtures  # configure_environment'tan sonra import edilebilir
+        import main
+
+        started = time.perf_counter()
+        try:
+            result = await coro
+        except (fixtures.FixtureMissing, main.StoreUnavailable) as e:
+            # Bu sorgu için kayıt eksik (mağaza fonksiyonları bunu StoreUnavailable olarak bildirir);
+            # aşama atlanır, süre ölçülmez.
+            self.skipped[name] = str(e)
+            return None
+        self.add(name, time.perf_counter() - started)
+        return result
+
+    def report(self, title):
+        print(f"\n{title}")
+        print(f"  {'stage':<34}{'n':>4}{'median':>10}{'min':>10}{'max':>10}  (ms)")
+        for name, values in self.samples.items():
+            print(f"  {name:<34}{len(values):>4}{statistics.median(values):>10.1f}{min(values):>10.1f}{max(values):>10.1f}")
+        for name, reason in self.skipped.items():
+            print(f"  {name:<34} skipped: {reason}")
+
+class StageRecorder:
+    """Stands in for LookupProgress and records when each graph stage finished."""
+
+    def __init__(self, timings, prefix):
+        self.timings = timings
+        self.prefix = prefix
+        self.started = time.perf_counter()
+
+    def stage_done(self, name, result, timed_out=False):
+        self.timings.add(f"{self.prefix}{name}{' (timeout)' if timed_out else ''}", time.perf_counter() - self.started)
+
+class FakeSentMessage:
+    def __init__(self, started):
+        self.started = started
+        self.edits = []
+
+    async def edit(self, content=None, embed=None):
+        self.edits.append(time.perf_counter() - self.started)
+
+class FakeChannel:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, content=None, embed=None):
+        message = FakeSentMessage(time.perf_counter())
+        self.sent.append(message)
+        return message
+
+class FakeAuthor:
+    id = 0
+
+class FakeMessage:
+    def __init__(self, content):
+        self.content = content
+        self.author = FakeAuthor()
+        self.guild = None
+        self.channel = FakeChannel()
+
+def reset_state(main, work_dir, round_no):
+    main.price_cache = main.PriceCache(
+        main.PRICE_CACHE_MAX_ENTRIES, main.PRICE_CACHE_TTL, main.PRICE_CACHE_DEFAULT_TTL,
+        main.PRICE_CACHE_NEGATIVE_TTL, main.PRICE_CACHE_STALE_TTL,
+    )
+    main.resolution_store = main.ResolutionStore(os.path.join(work_dir, f"resolutions-{round_no}.sqlite3"))
+    main.exchange_rates.rates, main.exchange_rates.fetched_at = {}, 0.0
+    main.inflight_lookups.clear()
+
+async def run_store_functions(main, query, timings):
+    cleaned = main.clean_game_name(query)
+    await timings.measure("exchange_rates.refresh", main.exchange_rates.refresh())
+    await timings.measure("get_steam_price", main.get_steam_price(query))
+    game_id = await timings.measure("get_itad_game_id", main.get_itad_game_id(query))
+    shop_ids = await timings.measure("get_itad_shop_ids", main.get_itad_shop_ids())
+    if game_id:
+        await timings.measure("get_itad_prices", main.get_itad_prices(game_id, shop_ids or ""))
+        await timings.measure("get_historical_lows", main.get_historical_lows(game_id))
+        await timings.measure("get_itad_subscriptions", main.get_itad_subscriptions(game_id))
+    await timings.measure("get_xbox_price", main.get_xbox_price(cleaned))
+    await timings.measure("get_playstation_price", main.get_playstation_price(cleaned))
+
+async def run_pipeline(main, query, timings, prefix):
+    await timings.measure(f"{prefix}lookup_prices", main.lookup_prices(query, StageRecorder(timings, f"{prefix}stage:")))
+
+async def run_on_message(main, query, timings, prefix):
+    message = FakeMessage(f"!fiyat {query}")
+    started = time.perf_counter()
+    await main.on_message(message)
+    timings.add(f"{prefix}on_message", time.perf_counter() - started)
+    sent = message.channel.sent[0]
+    if sent.edits:
+        timings.add(f"{prefix}on_message first edit", sent.edits[0])
+
+async def bench(args, work_dir):
+    import main
+
+    if args.browser:
+        await main.browser_supervisor.ensure()
+
+    store_timings, cold_timings, warm_timings = Timings(), Timings(), Timings()
+    try:
+        for round_no in range(args.rounds):
+            for query in args.queries:
+                reset_state(main, work_dir, round_no)
+                await run_store_functions(main, query, store_timings)
+                reset_state(main, work_dir, round_no)
+                await run_pipeline(main, query, cold_timings, "cold ")
+                await run_pipeline(main, query, warm_timings, "warm ")
+                reset_state(main, work_dir, round_no)
+                await run_on_message(main, query, cold_timings, "cold ")
+                await run_on_message(main, query, warm_timings, "warm ")
+            if args.record:
+                break
+    finally:
+        for http_client in main.http_clients.values():
+            await http_client.aclose()
+        if args.browser:
+            await main.browser_supervisor.close()
+
+    mode = "record" if args.record else "replay"
+    print(f"{len(args.queries)} queries x {1 if args.record else args.rounds} rounds, fixtures: {args.fixture_dir} ({mode})")
+    store_timings.report("Store functions (cold caches)")
+    cold_timings.report("Pipeline, cold caches (stage rows = time from query start until the stage finished)")
+    warm_timings.report("Pipeline, warm caches")
+
+def main():
+    args = parse_args()
+    if not check_fixtures(args):
+        sys.exit(2)
+    with tempfile.TemporaryDirectory() as work_dir:
+        configure_environment(args, work_dir)
+        asyncio.run(bench(args, work_dir))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+# --- Çok Süreçli Tarayıcı İşçi Havuzu ---
+# Playwright işleri Discord gateway'iyle aynı event loop'ta ve tek çekirdekte çalışınca ağır
+# scrape'ler heartbeat'leri geciktiriyor. BROWSER_WORKERS > 0 iken her mağaza için o kadar
+# işçi süreci açılır; her işçi kendi Chromium'unu ve sadece kendi mağazasının sayfa havuzunu
+# çalıştırır. Ana süreç işleri yerel bir Pipe üzerinden gönderir ve sadece sonucu bekler.
+#
+# Mesajlar (pickle): ana süreç -> işçi  ("job", job_id, game_name, budget_seconds, log_context) | ("stop",)
+#                    işçi -> ana süreç ("ready",) | ("result", job_id, result, error)
+import asyncio
+import contextlib
+import importlib
+import itertools
+import logging
+import multiprocessing
+import os
+import sys
+import time
+
+import log_pipeline
+
+BROWSER_WORKERS = int(os.environ.get("BROWSER_WORKERS", 0))
+# Çöken işçi bu süreden kısa aralıklarla tekrar çökerse yeniden başlatma beklemesi ikiye katlanır.
+RESPAWN_BACKOFF_MAX = 60.0
+WORKER_READY_TIMEOUT = 60.0
+# İşçinin kendi sonucunu göndermesi için ana süreçteki beklemeye eklenen pay
+RESULT_GRACE_SECONDS = 2.0
+
+class WorkerCrashed(Exception):
+    """Raised for jobs that were in flight on a worker process that died."""
+
+class WorkerJobFailed(Exception):
+    """Raised when no worker is ready or the scraper failed inside the worker."""
+
+def enabled():
+    return BROWSER_WORKERS > 0
+
+@contextlib.contextmanager
+def _child_environ(**values):
+    """Temporarily sets environment variables so a spawned child inherits them."""
+    previous = {name: os.environ.get(name) for name in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+def _load_app(name):
+    """Imports the module that provides the scrapers, reusing it if spawn already ran it as __mp_main__."""
+    # spawn, hedef fonksiyondan önce ana betiği __mp_main__ adıyla çalıştırır. Ana betik main.py ise
+    # "import main" modülü ikinci kez yükler: SQLite bağlantıları, metrikler ve global durum iki kez kurulur.
+    mp_main = sys.modules.get("__mp_main__")
+    mp_main_file = getattr(mp_main, "__file__", None) or ""
+    if os.path.splitext(os.path.basename(mp_main_file))[0] == name:
+        sys.modules[name] = mp_main
+        return mp_main
+    return importlib.import_module(name)
+
+def _worker_main(conn, store, app_name):
+    """Entry point of a worker process: owns one browser and serves scrape jobs for one store."""
+    asyncio.run(_serve(_load_app(app_name), conn, store))
+
+async def _serve(main, conn, store):
+    loop = asyncio.get_running_loop()
+    incoming = asyncio.Queue()
+    loop.add_reader(conn.fileno(), lambda: incoming.put_nowait(_recv(conn)))
+    main.browser_supervisor.stores = [store]
+    main.browser_supervisor.start()
+    await main.browser_supervisor.ensure()
+    conn.send(("ready",))
+    logging.info(f"Tarayıcı işçisi hazır: {store} (pid {os.getpid()})")
+
+    scrape = main.BROWSER_SCRAPERS[store]
+    tasks = set()
+
+    async def run_job(job_id, game_name, budget, log_fields):
+        main.current_deadline.set(main.Deadline(budget))
+        result = error = None
+        # Ana süreçteki query_id/store/stage işçinin loglarına da taşınır.
+        with main.log_context(**log_fields):
+            try:
+                result = await scrape(game_name)
+            except Exception as e:
+                logging.error(f"Tarayıcı işi hata verdi: {e}", exc_info=True)
+                error = f"{type(e).__name__}: {e}"
+        try:
+            conn.send(("result", job_id, result, error))
+        except (OSError, ValueError):
+            pass
+
+    try:
+        while True:
+            message = await incoming.get()
+            if message is None or message[0] == "stop":
+                break
+            _, job_id, game_name, budget, log_fields = message
+            task = asyncio.create_task(run_job(job_id, game_name, budget, log_fields))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    finally:
+        loop.remove_reader(conn.fileno())
+        for task in tasks:
+            task.cancel()
+        await main.browser_supervisor.close()
+
+def _recv(conn):
+    try:
+        return conn.recv()
+    except (EOFError, OSError):
+        return None
+
+class BrowserWorker:
+    """Parent-side handle of one worker process."""
+
+    def __init__(self, store, index, app_name):
+        self.store = store
+        self.index = index
+        self.app_name = app_name
+        self.process = None
+        self.conn = None
+        self.pending = {}
+        self.ready = None
+
+    @property
+    def name(self):
+        return f"{self.store}-{self.index}"
+
+    def start(self, mp_context, on_message, on_exit):
+        loop = asyncio.get_running_loop()
+        parent_conn, child_conn = mp_context.Pipe()
+        name = f"browser-{self.name}"
+        self.process = mp_context.Process(target=_worker_main, args=(child_conn, self.store, self.app_name), name=name, daemon=True)
+        # spawn, hedef fonksiyondan önce ana betiği (__mp_main__) yeniden çalıştırır; o da log_pipeline'ı
+        # import edip loglamayı kurar. Bu yüzden ayarlar _worker_main'de değil, süreç başlarken verilmeli:
+        # işçi tekrar işçi açmasın ve her işçi kendi log dosyasına yazsın (aynı dosyayı iki süreç döndürmesin).
+        with _child_environ(
+            BROWSER_WORKERS="0",
+            BROWSER_WORKER_STORE=self.store,
+            LOG_FILE=os.path.join(os.path.dirname(log_pipeline.LOG_FILE), f"{name}.log"),
+        ):
+            self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        self.ready = loop.create_future()
+        self.started_at = time.monotonic()
+
+        def readable():
+            message = _recv(self.conn)
+            if message is None:
+                loop.remove_reader(self.conn.fileno())
+                on_exit(self)
+            else:
+                on_message(self, message)
+        loop.add_reader(self.conn.fileno(), readable)
+
+    def fail_pending(self, exc):
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(exc)
+        self.pending.clear()
+        if self.ready and not self.ready.done():
+            self.ready.cancel()
+        self.ready = None
+
+    def is_ready(self):
+        return self.ready is not None and self.ready.done() and not self.ready.cancelled()
+
+class BrowserWorkerPool:
+    """Routes scrape jobs to per-store worker processes and respawns the ones that die."""
+
+    def __init__(self, stores, workers_per_store=BROWSER_WORKERS, app_name="main"):
+        # fork, Playwright/asyncio durumunu kopyalar; temiz süreç için spawn kullanılır.
+        self._mp = multiprocessing.get_context("spawn")
+        # app_name: işçide browser_supervisor ve BROWSER_SCRAPERS'ı sağlayan modül
+        self.workers = {store: [BrowserWorker(store, i, app_name) for i in range(workers_per_store)] for store in stores}
+        self._job_ids = itertools.count(1)
+        self._backoff = {}
+        self._closing = False
+        self._background_tasks = set()
+
+    async def start(self):
+        all_workers = [worker for workers in self.workers.values() for worker in workers]
+        for worker in all_workers:
+            worker.start(self._mp, self._on_message, self._on_exit)
+        # Chromium açılışları paralel sürer; hazır olmayan işçi havuzda kalır, sonra hazır olunca iş alır.
+        await asyncio.wait([worker.ready for worker in all_workers], timeout=WORKER_READY_TIMEOUT)
+        for worker in all_workers:
+            if not worker.is_ready():
+                logging.error(f"Tarayıcı işçisi {worker.name} {WORKER_READY_TIMEOUT:.0f} sn içinde hazır olmadı.")
+        logging.info(f"✅ Tarayıcı işçi havuzu başlatıldı: {', '.join(f'{s} x{len(w)}' for s, w in self.workers.items())}")
+
+    def handles(self, store):
+        return bool(self.workers.get(store))
+
+    async def run(self, store, game_name, budget, log_fields=None):
+        """Runs the store's browser scraper in a worker and returns its result."""
+        candidates = [w for w in self.workers[store] if w.is_ready()]
+        if not candidates:
+            logging.warning(f"{store} için hazır tarayıcı işçisi yok.")
+            raise WorkerJobFailed(f"{store} için hazır tarayıcı işçisi yok")
+        # En az işi olan işçiye gönder
+        worker = min(candidates, key=lambda w: len(w.pending))
+        job_id = next(self._job_ids)
+        future = asyncio.get_running_loop().create_future()
+        worker.pending[job_id] = future
+        try:
+            worker.conn.send(("job", job_id, game_name, budget, log_fields or {}))
+            return await asyncio.wait_for(future, budget + RESULT_GRACE_SECONDS)
+        finally:
+            # Zaman aşımı/iptalde geç gelen sonuç sessizce düşürülür.
+            worker.pending.pop(job_id, None)
+
+    def _on_message(self, worker, message):
+        if message[0] == "ready":
+            self._backoff.pop(worker.name, None)
+            if worker.ready and not worker.ready.done():
+                worker.ready.set_result(None)
+            return
+        _, job_id, result, error = message
+        future = worker.pending.pop(job_id, None)
+        if future is None or future.done():
+            return
+        if error:
+            logging.error(f"Tarayıcı işçisi {worker.name} işi tamamlayamadı: {error}")
+            future.set_exception(WorkerJobFailed(error))
+        else:
+            future.set_result(result)
+
+    def _on_exit(self, worker):
+        worker.conn.close()
+        worker.process.join(timeout=1)
+        worker.fail_pending(WorkerCrashed(f"Tarayıcı işçisi {worker.name} kapandı (çıkış kodu {worker.process.exitcode})."))
+        if self._closing:
+            return
+        delay = self._backoff.get(worker.name, 0.5)
+        self._backoff[worker.name] = min(delay * 2, RESPAWN_BACKOFF_MAX)
+        logging.error(f"Tarayıcı işçisi {worker.name} çöktü (çıkış kodu {worker.process.exitcode}), {delay:.1f} sn sonra yeniden başlatılıyor.")
+        task = asyncio.create_task(self._respawn(worker, delay))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _respawn(self, worker, delay):
+        await asyncio.sleep(delay)
+        if not self._closing:
+            worker.start(self._mp, self._on_message, self._on_exit)
+
+    def pending_jobs(self):
+        return {(store,): sum(len(w.pending) for w in workers) for store, workers in self.workers.items()}
+
+    async def close(self):
+        self._closing = True
+        for task in self._background_tasks:
+            task.cancel()
+        for workers in self.workers.values():
+            for worker in workers:
+                if worker.process and worker.process.is_alive():
+                    try:
+                        worker.conn.send(("stop",))
+                    except (OSError, ValueError):
+                        pass
+        for workers in self.workers.values():
+            for worker in workers:
+                if worker.process:
+                    await asyncio.to_thread(worker.process.join, 10)
+                    if worker.process.is_alive():
+                        worker.process.kill()
@@ -0,0 +1,133 @@
+# --- Kayıt/Tekrar Oynatma (record/replay) Katmanı ---
+# FIXTURE_MODE=record iken tüm httpx yanıtları ve tarayıcı sayfalarının yüklediği her istek
+# (HTML, gömülü JSON taşıyan script/xhr yanıtları) FIXTURE_DIR altına yazılır.
+# FIXTURE_MODE=replay iken aynı istekler ağa çıkmadan bu dosyalardan cevaplanır; böylece
+# Steam, ITAD, frankfurter, Xbox ve PlayStation sorguları çevrimdışı ve deterministik çalışır.
+#
+# Dosya düzeni: FIXTURE_DIR/<host>/<METHOD>-<anahtar özeti>.json
+import base64
+import hashlib
+import json
+import logging
+import os
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import httpx
+
+FIXTURE_MODE = os.environ.get("FIXTURE_MODE", "off").lower()
+FIXTURE_DIR = os.environ.get("FIXTURE_DIR", "fixtures")
+# Kayda ve anahtara girmeyen sorgu parametreleri (API anahtarı diske yazılmasın)
+SECRET_PARAMS = {"key"}
+# Gövde zaten çözülmüş halde saklandığı için bu başlıklar tekrar oynatmada yanlış olur.
+DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "set-cookie"}
+
+class FixtureMissing(httpx.TransportError):
+    """Raised in replay mode when no recording exists for a request."""
+
+def enabled():
+    return FIXTURE_MODE in ("record", "replay")
+
+def _canonical_url(url):
+    parts = urlsplit(str(url))
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in SECRET_PARAMS)
+    return f"{parts.scheme}://{parts.netloc}{parts.path}" + (f"?{urlencode(query)}" if query else "")
+
+def _canonical_body(body):
+    if not body:
+        return b""
+    try:
+        # ITAD toplu istekleri: aynı id kümesi farklı sırayla gelse de aynı kayıt kullanılsın
+        data = json.loads(body)
+    except ValueError:
+        return body
+    if isinstance(data, list) and all(isinstance(item, str) for item in data):
+        data = sorted(data)
+    return json.dumps(data, sort_keys=True).encode()
+
+def fixture_path(method, url, body=b""):
+    canonical = _canonical_url(url)
+    digest = hashlib.sha1(method.encode() + b" " + canonical.encode() + b"\n" + _canonical_body(body)).hexdigest()[:20]
+    return os.path.join(FIXTURE_DIR, urlsplit(canonical).netloc or "_", f"{method}-{digest}.json")
+
+def save_fixture(method, url, body, status, headers, content):
+    path = fixture_path(method, url, body)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        encoded = {"text": content.decode("utf-8")}
+    except UnicodeDecodeError:
+        encoded = {"base64": base64.b64encode(content).decode("ascii")}
+    record = {
+        "request": {"method": method, "url": _canonical_url(url)},
+        "response": {
+            "status": status,
+            "headers": {k.lower(): v for k, v in headers.items() if k.lower() not in DROPPED_HEADERS},
+            **encoded,
+        },
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(record, f, ensure_ascii=False, indent=1)
+
+def load_fixture(method, url, body=b""):
+    """Returns (status, headers, content) for a recorded request, or None."""
+    path = fixture_path(method, url, body)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        response = json.load(f)["response"]
+    content = response["text"].encode("utf-8") if "text" in response else base64.b64decode(response["base64"])
+    return response["status"], response["headers"], content
+
+class FixtureTransport(httpx.AsyncBaseTransport):
+    """httpx transport that records responses from the wrapped transport, or replays them from disk."""
+
+    def __init__(self, inner=None):
+        self.inner = inner
+
+    async def handle_async_request(self, request):
+        body = await request.aread()
+        if FIXTURE_MODE == "replay":
+            recorded = load_fixture(request.method, request.url, body)
+            if recorded is None:
+                logging.warning(f"Fixture bulunamadı: {request.method} {_canonical_url(request.url)}")
+                raise FixtureMissing(f"Kayıt yok: {request.method} {_canonical_url(request.url)}", request=request)
+            status, headers, content = recorded
+            return httpx.Response(status, headers=headers, content=content, request=request)
+
+        response = await self.inner.handle_async_request(request)
+        content = await response.aread()
+        await response.aclose()
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in DROPPED_HEADERS}
+        save_fixture(request.method, request.url, body, response.status_code, headers, content)
+        return httpx.Response(response.status_code, headers=headers, content=content, request=request)
+
+    async def aclose(self):
+        if self.inner is not None:
+            await self.inner.aclose()
+
+async def attach_to_context(context):
+    """Routes every request of a Playwright context through the fixture store.
+
+    Must be registered before the resource blocker: Playwright runs the most
+    recently added route handler first, and the blocker falls back to this one
+    for the requests it lets through.
+    """
+    await context.route("**/*", _handle_route)
+
+async def _handle_route(route):
+    request = route.request
+    body = request.post_data_buffer or b""
+    if FIXTURE_MODE == "replay":
+        recorded = load_fixture(request.method, request.url, body)
+        if recorded is None:
+            logging.debug(f"Fixture bulunamadı (tarayıcı): {request.method} {_canonical_url(request.url)}")
+            await route.abort("internetdisconnected")
+            return
+        status, headers, content = recorded
+        await route.fulfill(status=status, headers=headers, body=content)
+        return
+
+    response = await route.fetch()
+    content = await response.body()
+    save_fixture(request.method, request.url, body, response.status, response.headers, content)
+    headers = {k: v for k, v in response.headers.items() if k.lower() not in DROPPED_HEADERS}
+    await route.fulfill(status=response.status, headers=headers, body=content)
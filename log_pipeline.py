@@ -0,0 +1,159 @@
+# --- Kuyruk Tabanlı Yapılandırılmış Loglama ---
+# Event loop'taki logging çağrıları sadece kaydı bir kuyruğa bırakır; dosyaya ve konsola yazma
+# QueueListener'ın arka plan thread'inde yapılır. Kuyruk doluysa kayıt beklemeden düşürülür ve
+# sayılır. Dosyaya her satır bir JSON kaydı olarak yazılır ve boyuta göre döndürülür; her
+# kayıt o anki query_id, store ve stage contextvar'larını taşır, böylece tek bir !fiyat sorgusu
+# baştan sona izlenebilir:  grep '"query_id": "<id>"' debug_output/bot.log
+#
+# DEBUG satırları sorgu bazında örneklenir: bir sorgunun DEBUG satırlarının ya hepsi ya da hiçbiri
+# yazılır (LOG_DEBUG_SAMPLE_RATE).
+import atexit
+import contextlib
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import uuid
+import zlib
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FILE = os.environ.get("LOG_FILE", "debug_output/bot.log")
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_MB", 20)) * 1024 * 1024
+LOG_BACKUP_COUNT = int(os.environ.get("LOG_BACKUP_COUNT", 5))
+LOG_QUEUE_SIZE = 10000
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get("LOG_DEBUG_SAMPLE_RATE", 0.1))
+# Tek bir mesaj (ör. ham API cevabı) bu uzunluğu geçerse kısaltılır
+LOG_MAX_MESSAGE = int(os.environ.get("LOG_MAX_MESSAGE", 2000))
+CONSOLE_FORMAT = '%(asctime)s - %(levelname)s - [%(funcName)s]%(context)s - %(message)s'
+
+query_id_var = contextvars.ContextVar("query_id", default=None)
+store_var = contextvars.ContextVar("store", default=None)
+stage_var = contextvars.ContextVar("stage", default=None)
+CONTEXT_FIELDS = (("query_id", query_id_var), ("store", store_var), ("stage", stage_var))
+
+dropped_records = 0
+_listener = None
+
+def new_query_id():
+    return uuid.uuid4().hex[:8]
+
+def current_context():
+    """Returns the log context fields that are set, e.g. to hand them to another process."""
+    return {name: var.get() for name, var in CONTEXT_FIELDS if var.get() is not None}
+
+@contextlib.contextmanager
+def log_context(**fields):
+    """Sets query_id/store/stage for the records logged inside the block."""
+    tokens = [(var, var.set(fields[name])) for name, var in CONTEXT_FIELDS if name in fields]
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+def truncate(text, limit=LOG_MAX_MESSAGE):
+    text = str(text)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... [{len(text) - limit} karakter kısaltıldı]"
+
+class ContextFilter(logging.Filter):
+    """Copies the context fields onto the record on the calling thread, and samples DEBUG records per query."""
+
+    def filter(self, record):
+        for name, var in CONTEXT_FIELDS:
+            setattr(record, name, var.get())
+        parts = [f"{name}={getattr(record, name)}" for name, _ in CONTEXT_FIELDS if getattr(record, name)]
+        record.context = f" [{' '.join(parts)}]" if parts else ""
+        if record.levelno <= logging.DEBUG and LOG_DEBUG_SAMPLE_RATE < 1.0:
+            if record.query_id:
+                # Aynı sorgunun tüm DEBUG satırları için aynı karar
+                keep = zlib.crc32(record.query_id.encode()) % 10000 < LOG_DEBUG_SAMPLE_RATE * 10000
+            else:
+                keep = random.random() < LOG_DEBUG_SAMPLE_RATE
+            if not keep:
+                return False
+        return True
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks: when the queue is full the record is counted and dropped."""
+
+    def prepare(self, record):
+        # Mesaj burada (çağıran thread'de) bir kez biçimlenir; args ve exc_info kuyruğa taşınmaz.
+        # Kısaltma traceback'ten önce yapılır, traceback her zaman tam kalır.
+        record.msg = truncate(record.getMessage())
+        record.args = None
+        return super().prepare(record)
+
+    def enqueue(self, record):
+        global dropped_records
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            dropped_records += 1
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "func": record.funcName,
+            "msg": record.getMessage(),
+        }
+        for name, _ in CONTEXT_FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                entry[name] = value
+        if record.processName != "MainProcess":
+            entry["process"] = record.processName
+        return json.dumps(entry, ensure_ascii=False)
+
+class ConsoleFormatter(logging.Formatter):
+    def format(self, record):
+        if not hasattr(record, "context"):
+            record.context = ""
+        return super().format(record)
+
+def setup_logging():
+    """Installs the queue handler on the root logger and starts the writer thread; safe to call twice."""
+    global _listener
+    if _listener is not None:
+        return _listener
+    directory = os.path.dirname(LOG_FILE)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+    )
+    file_handler.setFormatter(JsonFormatter())
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(ConsoleFormatter(CONSOLE_FORMAT))
+
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(LOG_LEVEL)
+    # Bağımlılıkların DEBUG satırları (httpx, discord gateway) sorgu loglarını boğmasın
+    for noisy in ("httpx", "httpcore", "hpack", "discord", "asyncio"):
+        logging.getLogger(noisy).setLevel(max(logging.INFO, root.level))
+
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _listener
+
+def shutdown_logging():
+    """Flushes the queue and stops the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -2,193 +2,714 @@ import discord
 import os
 from dotenv import load_dotenv
 load_dotenv()
-import requests
 import json
-from flask import Flask
-from threading import Thread
+from aiohttp import web
+from threading import Lock
 from playwright.async_api import async_playwright
 import asyncio
 import time
+import random
 import re
 import logging
-from datetime import datetime
+import contextlib
+import contextvars
+import ipaddress
+import sqlite3
+from collections import OrderedDict, deque
 import httpx
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+from urllib.parse import quote
+from matching import clean_game_name, best_candidate
+from title_index import TitleIndex, parse_app_list
+import fixtures
+import metrics
+import browser_workers
+import artifacts
+import log_pipeline
+from log_pipeline import log_context
 
 # --- YENİ: Debug ve Hata Ayıklama Kurulumu ---
-if not os.path.exists('debug_output'):
-    os.makedirs('debug_output')
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - [%(funcName)s] - %(message)s',
-    handlers=[
-        logging.FileHandler("debug_output/bot.log", encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+# Log ve hata kaydı dizinleri (LOG_FILE, ARTIFACT_DIR) ilk kullanımda kendi modüllerinde oluşturulur.
+# Loglar kuyruk üzerinden arka plan thread'inde yazılır (bkz. log_pipeline.py)
+log_pipeline.setup_logging()
 
 # --- Global Değişkenler ---
 playwright = None
 browser = None
-currency_cache = { "rate": None, "last_fetched": 0 }
 ITAD_API_KEY = os.environ.get('ITAD_API_KEY')
 
-# --- Web Sunucusu ve Keep Alive ---
-app = Flask('')
-@app.route('/')
-def home(): return "Bot Aktif ve Çalışıyor!"
-def run(): app.run(host='0.0.0.0', port=8080)
-def keep_alive():
-    t = Thread(target=run)
-    t.start()
-
-# --- Oyun Adı Temizleme Fonksiyonu (FİNAL VERSİYON: ™, ®, © sembolleri eklendi) ---
-def clean_game_name(game_name):
-    # Romen rakamlarını sayılara çevir, orijinal metni koru
-    name_with_arabic, _ = clean_and_extract_roman(game_name)
-
-    # 1. Adım: TM, R, C ve kesme işaretlerini tamamen kaldır.
-    # Bu, "The Last of Us™" -> "The Last of Us" olmasını sağlar.
-    cleaned_name = name_with_arabic.replace("™", "")
-    cleaned_name = cleaned_name.replace("®", "")
-    cleaned_name = cleaned_name.replace("©", "")
-    cleaned_name = cleaned_name.replace("'", "")
-    cleaned_name = cleaned_name.replace("’", "") # Farklı bir kesme işareti tipi
-
-    # 2. Adım: Kalan özel karakterleri (harf, rakam veya boşluk olmayan her şeyi) boşlukla değiştir.
-    cleaned_name = re.sub(r'[^\w\s]', ' ', cleaned_name, flags=re.UNICODE)
-    cleaned_name = re.sub(r'\s*\(?goty\)?\s*', ' ', cleaned_name, flags=re.I)
-    cleaned_name = re.sub(r'\s*\(?game of the year\)?\s*', ' ', cleaned_name, flags=re.I)
-    cleaned_name = re.sub(r'\s*edition\s*', ' ', cleaned_name, flags=re.I)
-    cleaned_name = re.sub(r'\s*sürümü\s*', ' ', cleaned_name, flags=re.I)
-    cleaned_name = re.sub(r'\s*remastered\s*', ' ', cleaned_name, flags=re.I)
-    cleaned_name = re.sub(r'\s*ultimate\s*', ' ', cleaned_name, flags=re.I)
-    cleaned_name = re.sub(r'\s*deluxe\s*', ' ', cleaned_name, flags=re.I)
-
-    # 3. Adım: Oluşabilecek çoklu boşlukları tek boşluğa indir.
-    cleaned_name = re.sub(r'\s+', ' ', cleaned_name)
-
-    return cleaned_name.strip().lower()
-
-# --- YENİ: Romen Rakamı ve Sayı Çıkarma Yardımcıları ---
-def clean_and_extract_roman(name):
-    """Converts Roman numerals at the end of a string to Arabic numerals."""
-    name = name.upper()
-    roman_map = {'I': 1, 'V': 5, 'X': 10}
-    replacements = {'IV': '4', 'IX': '9', 'V': '5', 'I': '1'} # Order matters
-
-    # Check for specific roman numerals at the end
-    if name.endswith(" IV"): return name.replace(" IV", " 4"), 4
-    if name.endswith(" IX"): return name.replace(" IX", " 9"), 9
-    if name.endswith(" V"): return name.replace(" V", " 5"), 5
-    if name.endswith(" III"): return name.replace(" III", " 3"), 3
-    if name.endswith(" II"): return name.replace(" II", " 2"), 2
-    if name.endswith(" I"): return name.replace(" I", " 1"), 1
-
-    return name.lower(), None # Return original cleaned name if no roman numeral
-
-def extract_numbers_from_title(title):
-    """Extracts all Arabic and Roman numerals from a game title."""
-    # First, find all standard digits
-    numbers = set(map(int, re.findall(r'\d+', title)))
-
-    # Then, check for Roman numerals which are often used for sequels
-    # We check for them as standalone words to avoid matching 'I' in 'is'
-    # Using uppercase for consistency
-    title_upper = f" {title.upper()} "
-    if " II " in title_upper or title_upper.endswith(" II"): numbers.add(2)
-    if " III " in title_upper or title_upper.endswith(" III"): numbers.add(3)
-    if " IV " in title_upper or title_upper.endswith(" IV"): numbers.add(4)
-    if " V " in title_upper or title_upper.endswith(" V"): numbers.add(5)
-
-    return numbers
+# --- YENİ: Metrikler (/metrics) ---
+# Hangi mağazanın p99 gecikmeyi şişirdiğini ve Chromium'un ne zaman bellek sızdırdığını
+# görmek için. Mağaza aşamaları: search, match, navigate, extract; ITAD çağrıları store="itad"
+# altında uç nokta adıyla (search, shops, prices, storelow, subs) tutulur.
+STORE_PHASE_SECONDS = metrics.Histogram(
+    "fiyatbot_store_phase_seconds", "Time spent in one phase of a store lookup.", ["store", "phase"]
+)
+LOOKUP_STAGE_SECONDS = metrics.Histogram("fiyatbot_lookup_stage_seconds", "Run time of a lookup graph stage.", ["stage"])
+LOOKUP_STAGE_TIMEOUTS = metrics.Counter(
+    "fiyatbot_lookup_stage_timeouts_total", "Lookup stages cancelled by the query deadline.", ["stage"]
+)
+LOOKUP_STAGE_ERRORS = metrics.Counter("fiyatbot_lookup_stage_errors_total", "Lookup stages that raised.", ["stage"])
+QUERY_SECONDS = metrics.Histogram("fiyatbot_query_seconds", "End-to-end time of one price lookup.")
+CACHE_REQUESTS = metrics.Counter(
+    "fiyatbot_cache_requests_total", "Price cache lookups by result (hit, stale, miss).", ["store", "result"]
+)
+CACHE_HIT_RATIO = metrics.Gauge(
+    "fiyatbot_cache_hit_ratio", "Share of price cache lookups answered from cache, stale included.", ["store"]
+)
+CACHE_ENTRIES = metrics.Gauge("fiyatbot_cache_entries", "Entries currently held in the price cache.")
+HTTP_REQUEST_SECONDS = metrics.Histogram(
+    "fiyatbot_http_request_seconds", "Upstream HTTP time until response headers.", ["host"]
+)
+HTTP_RESPONSES = metrics.Counter("fiyatbot_http_responses_total", "Upstream HTTP responses by status.", ["host", "status"])
+HTTP_ERRORS = metrics.Counter(
+    "fiyatbot_http_errors_total", "Upstream HTTP requests that failed without a response.", ["host", "error"]
+)
+BROWSER_OPEN_PAGES = metrics.Gauge("fiyatbot_browser_open_pages", "Chromium pages held by each page pool.", ["store"])
+BROWSER_RSS_BYTES = metrics.Gauge("fiyatbot_browser_rss_bytes", "Resident memory of all Chromium processes.")
+LOG_RECORDS_DROPPED = metrics.Gauge(
+    "fiyatbot_log_records_dropped", "Log records dropped because the logging queue was full."
+)
+BROWSER_WORKER_JOBS = metrics.Gauge(
+    "fiyatbot_browser_worker_jobs", "Scrape jobs in flight on browser worker processes.", ["store"]
+)
 
-# --- Döviz Kuru Alma Fonksiyonu ---
-def get_usd_to_try_rate():
-    global currency_cache
-    if time.time() - currency_cache["last_fetched"] > 3600:
+class PhaseTimer:
+    """Times consecutive phases of one store lookup; lap() closes the phase that just ran."""
+
+    def __init__(self, store):
+        self.store = store
+        self._last = time.perf_counter()
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        STORE_PHASE_SECONDS.observe(now - self._last, store=self.store, phase=phase)
+        self._last = now
+
+def cache_hit_ratios():
+    totals = {}
+    for (store, result), count in CACHE_REQUESTS.values().items():
+        hits, total = totals.get(store, (0, 0))
+        totals[store] = (hits + (count if result != "miss" else 0), total + count)
+    return {(store,): hits / total for store, (hits, total) in totals.items() if total}
+
+def chromium_rss_bytes():
+    """Sums the RSS of Chromium processes started under this process, read from /proc (Linux only)."""
+    try:
+        pids = [int(pid) for pid in os.listdir("/proc") if pid.isdigit()]
+    except OSError:
+        return None
+    children = {}; names = {}
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        names[pid] = stat[stat.index("(") + 1:stat.rindex(")")]
+        parent = int(stat[stat.rindex(")") + 2:].split()[1])
+        children.setdefault(parent, []).append(pid)
+    # Chromium, Playwright sürücüsünün (node) alt süreci; tüm torunlar gezilir.
+    rss_pages = 0; stack = list(children.get(os.getpid(), []))
+    while stack:
+        pid = stack.pop()
+        stack.extend(children.get(pid, []))
+        if "chrom" not in names.get(pid, "").lower() and "headless" not in names.get(pid, "").lower():
+            continue
+        try:
+            with open(f"/proc/{pid}/statm") as f:
+                rss_pages += int(f.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+    return rss_pages * os.sysconf("SC_PAGE_SIZE")
+
+CACHE_HIT_RATIO.set_function(cache_hit_ratios)
+CACHE_ENTRIES.set_function(lambda: len(price_cache))
+BROWSER_OPEN_PAGES.set_function(lambda: {(store,): pool.open_pages for store, pool in list(page_pools.items())})
+BROWSER_RSS_BYTES.set_function(chromium_rss_bytes)
+LOG_RECORDS_DROPPED.set_function(lambda: log_pipeline.dropped_records)
+BROWSER_WORKER_JOBS.set_function(lambda: browser_worker_pool.pending_jobs() if browser_worker_pool else None)
+
+# --- YENİ: Paylaşılan HTTP İstemci Havuzu ---
+# Her upstream host için tek bir uzun ömürlü AsyncClient tutulur. Böylece TLS
+# bağlantıları keep-alive ile tekrar kullanılır ve thread havuzu meşgul edilmez.
+try:
+    import h2  # noqa: F401 (httpx[http2] kurulu mu?)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+HTTP_CONNECT_TIMEOUT = 5.0
+# Mağaza sayfaları (Xbox/PS) tarayıcı olmayan istemcilere farklı içerik dönebiliyor.
+BROWSER_LIKE_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "tr-TR,tr;q=0.9,en;q=0.8",
+}
+HTTP_HOST_CONFIG = {
+    "store.steampowered.com": {"max_connections": 10, "timeout": 10.0},
+    "api.steampowered.com": {"max_connections": 1, "timeout": 60.0},
+    "api.isthereanydeal.com": {"max_connections": 10, "timeout": 20.0},
+    "api.frankfurter.app": {"max_connections": 2, "timeout": 5.0},
+    "www.xbox.com": {"max_connections": 6, "timeout": 10.0, "headers": BROWSER_LIKE_HEADERS},
+    "store.playstation.com": {"max_connections": 6, "timeout": 15.0, "headers": BROWSER_LIKE_HEADERS},
+}
+http_clients = {}
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """Wraps a transport and records latency, status codes, timeouts and errors per upstream host."""
+
+    def __init__(self, inner):
+        self.inner = inner
+
+    async def handle_async_request(self, request):
+        host = request.url.host
+        started = time.perf_counter()
+        try:
+            response = await self.inner.handle_async_request(request)
+        except httpx.TimeoutException:
+            HTTP_ERRORS.inc(host=host, error="timeout")
+            raise
+        except httpx.TransportError as e:
+            HTTP_ERRORS.inc(host=host, error=type(e).__name__)
+            raise
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, host=host)
+        HTTP_RESPONSES.inc(host=host, status=response.status_code)
+        return response
+
+    async def aclose(self):
+        await self.inner.aclose()
+
+def get_http_client(host):
+    """Returns the shared, pooled AsyncClient for the given upstream host."""
+    http_client = http_clients.get(host)
+    if http_client is None or http_client.is_closed:
+        config = HTTP_HOST_CONFIG.get(host, {})
+        max_connections = config.get("max_connections", 5)
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=60.0,
+        )
+        # HTTP/2 ALPN ile anlaşılır, desteklemeyen host'larda HTTP/1.1'e düşülür.
+        transport = httpx.AsyncHTTPTransport(http2=HTTP2_AVAILABLE, limits=limits)
+        if fixtures.enabled():
+            # Kayıt/tekrar modunda istekler fixture katmanından geçer (bkz. fixtures.py)
+            transport = fixtures.FixtureTransport(transport)
+        http_client = httpx.AsyncClient(
+            base_url=f"https://{host}",
+            timeout=httpx.Timeout(config.get("timeout", 10.0), connect=HTTP_CONNECT_TIMEOUT),
+            headers=config.get("headers"),
+            transport=InstrumentedTransport(transport),
+        )
+        http_clients[host] = http_client
+    return http_client
+
+# --- YENİ: Sorgu Süre Bütçesi (deadline) ---
+# Her !fiyat sorgusunun tek bir bitiş zamanı vardır. Sorgu içinde başlatılan tüm görevler
+# bu contextvar'ı miras alır; mağaza çağrıları sabit timeout'lar yerine kalan süreden pay alır.
+QUERY_DEADLINE_SECONDS = float(os.environ.get("QUERY_DEADLINE_SECONDS", 30))
+current_deadline = contextvars.ContextVar("current_deadline", default=None)
+
+class Deadline:
+    def __init__(self, seconds):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+def budget_seconds(default, share=1.0):
+    """Returns the default timeout capped by the current query's remaining budget."""
+    deadline = current_deadline.get()
+    if deadline is None:
+        return default
+    return max(min(default, deadline.remaining() * share), 0.001)
+
+def budget_ms(default_ms, share=1.0):
+    return int(budget_seconds(default_ms / 1000, share) * 1000)
+
+# --- YENİ: Hedged İstekler ---
+# Steam storesearch ve ITAD search gibi dalgalı upstream'lerde, ilk istek geçmiş gecikmelerin
+# HEDGE_PERCENTILE yüzdelik dilimini aşarsa aynı istek bir kez daha gönderilir; önce gelen
+# kazanır, diğeri iptal edilir. Yeterli örnek toplanana kadar hedge yapılmaz.
+HEDGE_ENABLED = os.environ.get("HEDGE_ENABLED", "1") != "0"
+HEDGE_PERCENTILE = float(os.environ.get("HEDGE_PERCENTILE", 0.9))
+HEDGE_MIN_SAMPLES = 20
+
+class LatencyTracker:
+    def __init__(self, max_samples=200):
+        self._samples = deque(maxlen=max_samples)
+
+    def add(self, seconds):
+        self._samples.append(seconds)
+
+    def percentile(self, p):
+        if len(self._samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+latency_trackers = {}
+
+async def hedged_get(host, url, hedge_key, params=None, timeout=10.0):
+    """GET through the pooled client, firing one duplicate request if the first is slower than usual."""
+    http_client = get_http_client(host)
+    tracker = latency_trackers.setdefault(hedge_key, LatencyTracker())
+    threshold = tracker.percentile(HEDGE_PERCENTILE) if HEDGE_ENABLED else None
+    started = time.monotonic()
+
+    def send():
+        return asyncio.create_task(http_client.get(url, params=params, timeout=budget_seconds(timeout)))
+
+    tasks = [send()]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=threshold)
+        if not done:
+            logging.info(f"{hedge_key} isteği {threshold:.2f}s eşiğini aştı, hedge isteği gönderiliyor.")
+            tasks.append(send())
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    tracker.add(time.monotonic() - started)
+                    return task.result()
+        # Hepsi hata verdiyse ilk isteğin hatasını yükselt
+        return tasks[0].result()
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+# --- YENİ: Mağaza Başına Eşzamanlılık Sınırları ---
+# Aynı anda kaç sorgu çalışırsa çalışsın her upstream'e giden eşzamanlı iş sayısı sınırlıdır.
+# Önbellekten dönen sonuçlar slot tutmaz; sadece gerçek ağ/tarayıcı işi sınıra tabidir.
+STORE_CONCURRENCY = {
+    "steam": int(os.environ.get("STEAM_CONCURRENCY", 6)),
+    "itad": int(os.environ.get("ITAD_CONCURRENCY", 4)),
+    "xbox": int(os.environ.get("XBOX_CONCURRENCY", 3)),
+    "playstation": int(os.environ.get("PS_CONCURRENCY", 3)),
+}
+store_semaphores = {store: asyncio.Semaphore(limit) for store, limit in STORE_CONCURRENCY.items()}
+# Yoğunlukta kabul edilen sorgular tarayıcıya düşmeden sadece API/HTTP yollarıyla çalışır.
+api_only_lookup = contextvars.ContextVar("api_only_lookup", default=False)
+
+class BrowserSkipped(Exception):
+    """Raised instead of a browser fallback in api_only lookups, so the miss never reaches the price cache."""
+
+async def run_limited(store, coro):
+    with log_context(store=store):
+        async with store_semaphores[store]:
+            return await coro
+
+# --- YENİ: Fiyat Sonucu Önbelleği (TTL + LRU + stale-while-revalidate) ---
+# Anahtar (mağaza, clean_game_name ile normalize edilmiş başlık) ikilisidir.
+# Süresi dolan kayıt, PRICE_CACHE_STALE_TTL boyunca hemen döndürülür ve arkada yenilenir.
+# Boş sonuçlar ("mağazada bulunamadı") daha kısa süreyle negatif olarak saklanır. Mağazaya
+# ulaşılamadığında (zaman aşımı, 5xx, 429, bozuk cevap) fetcher'lar StoreUnavailable fırlatır;
+# hata hiçbir zaman "bulunamadı" olarak saklanmaz ve arka plan yenilemesi eski fiyatı silmez.
+PRICE_CACHE_MAX_ENTRIES = int(os.environ.get("PRICE_CACHE_MAX_ENTRIES", 2000))
+PRICE_CACHE_TTL = {
+    "steam": 10 * 60,           # Steam API verisi daha sık değişiyor
+    "itad_id": 24 * 3600,
+    "itad_shops": 24 * 3600,
+    "itad_prices": 15 * 60,
+    "itad_lows": 6 * 3600,
+    "itad_subs": 6 * 3600,
+    "xbox": 60 * 60,            # Scrape edilen konsol fiyatları pahalı, daha uzun tutulur
+    "playstation": 60 * 60,
+}
+PRICE_CACHE_DEFAULT_TTL = 15 * 60
+PRICE_CACHE_NEGATIVE_TTL = 5 * 60
+PRICE_CACHE_STALE_TTL = 60 * 60
+
+class StoreUnavailable(Exception):
+    """Raised by store fetchers when the upstream failed, as opposed to returning None for "not found"."""
+
+class PriceCache:
+    """In-memory TTL + LRU cache that serves stale entries while refreshing them in the background."""
+
+    def __init__(self, max_entries, ttls, default_ttl, negative_ttl, stale_ttl):
+        self.max_entries = max_entries
+        self.ttls = ttls
+        self.default_ttl = default_ttl
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl
+        self._entries = OrderedDict()  # (store, key) -> (value, expires_at, stale_until)
+        self._refreshing = {}
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def set(self, store, key, value):
+        now = time.monotonic()
+        ttl = self.ttls.get(store, self.default_ttl) if value else self.negative_ttl
+        self._entries[(store, key)] = (value, now + ttl, now + ttl + self.stale_ttl)
+        self._entries.move_to_end((store, key))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_fetch(self, store, key, fetcher):
+        cache_key = (store, key)
+        entry = self._entries.get(cache_key)
+        if entry:
+            value, expires_at, stale_until = entry
+            now = time.monotonic()
+            if now < expires_at:
+                self.stats["hits"] += 1
+                CACHE_REQUESTS.inc(store=store, result="hit")
+                self._entries.move_to_end(cache_key)
+                return value
+            if now < stale_until:
+                self.stats["stale_hits"] += 1
+                CACHE_REQUESTS.inc(store=store, result="stale")
+                self._entries.move_to_end(cache_key)
+                self._schedule_refresh(cache_key, fetcher)
+                return value
+            del self._entries[cache_key]
+
+        self.stats["misses"] += 1
+        CACHE_REQUESTS.inc(store=store, result="miss")
+        value = await fetcher()
+        self.set(store, key, value)
+        return value
+
+    def _schedule_refresh(self, cache_key, fetcher):
+        if cache_key in self._refreshing:
+            return
+        task = asyncio.create_task(self._refresh(cache_key, fetcher))
+        self._refreshing[cache_key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(cache_key, None))
+
+    async def _refresh(self, cache_key, fetcher):
+        # Arka plan yenilemesi, onu tetikleyen sorgunun süre bütçesine bağlı olmamalı.
+        current_deadline.set(None)
         try:
-            response = requests.get("https://api.frankfurter.app/latest?from=USD&to=TRY")
-            if response.status_code == 200:
-                rate = response.json().get("rates", {}).get("TRY")
-                if rate:
-                    currency_cache["rate"] = rate
-                    currency_cache["last_fetched"] = time.time()
-                    logging.info(f"Yeni USD/TRY kuru alındı: {rate}")
-                    return rate
-            logging.warning(f"Döviz kuru alınamadı. Status Code: {response.status_code}")
-            return currency_cache["rate"]
+            value = await fetcher()
         except Exception as e:
-            logging.error(f"Döviz kuru alınırken hata: {e}")
-            return currency_cache["rate"]
-    else: return currency_cache["rate"]
+            # Yenileme başarısız olursa eski kayıt stale süresi boyunca kullanılmaya devam eder.
+            logging.warning(f"Önbellek yenilemesi başarısız {cache_key}: {e}")
+            return
+        entry = self._entries.get(cache_key)
+        if not value and entry and entry[0]:
+            # Bulunan bir fiyat arka planda boş sonuçla ezilmez; stale süresi bitince
+            # gelen ilk sorgu mağazaya tekrar sorar ve "bulunamadı" o zaman saklanır.
+            logging.debug(f"Önbellek yenilemesi boş döndü, eski kayıt korunuyor {cache_key}")
+            return
+        self.set(*cache_key, value)
+
+price_cache = PriceCache(
+    PRICE_CACHE_MAX_ENTRIES,
+    PRICE_CACHE_TTL,
+    PRICE_CACHE_DEFAULT_TTL,
+    PRICE_CACHE_NEGATIVE_TTL,
+    PRICE_CACHE_STALE_TTL,
+)
+
+# --- YENİ: Kalıcı Başlık -> Mağaza ID Çözümleme Deposu (SQLite) ---
+# Normalize edilmiş sorgudan her mağazanın ürün ID'sine ve kanonik URL'sine giden eşleşme
+# diskte tutulur. Çözümlenmiş bir başlık için arama sayfaları tamamen atlanır.
+RESOLUTION_DB_PATH = os.environ.get("RESOLUTION_DB_PATH", "data/resolutions.sqlite3")
+RESOLUTION_MIN_CONFIDENCE = 50
+RESOLUTION_MAX_AGE = 30 * 24 * 3600  # Bu süre boyunca doğrulanmayan kayıt yeniden aranır
+
+class ResolutionStore:
+    """SQLite-backed mapping from a normalized query to per-store ids and canonical URLs."""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS resolutions (
+                    query TEXT NOT NULL,
+                    store TEXT NOT NULL,
+                    store_id TEXT NOT NULL,
+                    canonical_url TEXT,
+                    canonical_name TEXT,
+                    confidence REAL NOT NULL,
+                    last_verified REAL NOT NULL,
+                    PRIMARY KEY (query, store)
+                )"""
+            )
+
+    def _get(self, query, store):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM resolutions WHERE query = ? AND store = ?", (query, store)
+            ).fetchone()
+        if not row or row["confidence"] < RESOLUTION_MIN_CONFIDENCE:
+            return None
+        if time.time() - row["last_verified"] > RESOLUTION_MAX_AGE:
+            return None
+        return dict(row)
+
+    def _put(self, query, store, store_id, canonical_url, canonical_name, confidence):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO resolutions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (query, store, str(store_id), canonical_url, canonical_name, confidence, time.time()),
+            )
+
+    def _touch(self, query, store):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE resolutions SET last_verified = ? WHERE query = ? AND store = ?",
+                (time.time(), query, store),
+            )
+
+    def _forget(self, query, store):
+        with self._lock:
+            self._conn.execute("DELETE FROM resolutions WHERE query = ? AND store = ?", (query, store))
+
+    async def get(self, query, store):
+        return await asyncio.to_thread(self._get, query, store)
+
+    async def put(self, query, store, store_id, canonical_url, canonical_name, confidence):
+        await asyncio.to_thread(self._put, query, store, store_id, canonical_url, canonical_name, confidence)
+
+    async def touch(self, query, store):
+        await asyncio.to_thread(self._touch, query, store)
+
+    async def forget(self, query, store):
+        await asyncio.to_thread(self._forget, query, store)
+
+resolution_store = ResolutionStore(RESOLUTION_DB_PATH)
+
+# --- Döviz Kuru Alma Fonksiyonu ---
+# --- YENİ: Arka Plan Döviz Kuru Servisi ---
+# frankfurter.app'ten USD bazlı tüm kur tablosu tek istekle alınır; herhangi iki para birimi
+# arasındaki kur bu tablodan çapraz hesaplanır. Tablo süresi dolmadan arka planda yenilenir ve
+# diske yazılır; yeniden başlatmada diskteki son kurlar hemen kullanılır. Sorgular kuru her
+# zaman bellekten okur, kur API'si yavaşlasa da beklemez.
+EXCHANGE_RATE_PATH = os.environ.get("EXCHANGE_RATE_PATH", "data/exchange_rates.json")
+EXCHANGE_RATE_REFRESH_INTERVAL = float(os.environ.get("EXCHANGE_RATE_REFRESH_INTERVAL", 3600))
+EXCHANGE_RATE_BASE = "USD"
+# Bu yaştan eski kurlar yine kullanılır ama uyarı loglanır.
+EXCHANGE_RATE_STALE_AFTER = 24 * 3600
+EXCHANGE_RATE_RETRY_MAX = 600.0
+
+EXCHANGE_RATE_AGE = metrics.Gauge("fiyatbot_exchange_rate_age_seconds", "Age of the exchange rate table in use.")
+
+class ExchangeRateService:
+    """In-memory exchange rate table that is refreshed in the background and persisted to disk."""
+
+    def __init__(self, path, base=EXCHANGE_RATE_BASE, refresh_interval=EXCHANGE_RATE_REFRESH_INTERVAL):
+        self.path = path
+        self.base = base
+        self.refresh_interval = refresh_interval
+        self.rates = {}  # para birimi -> 1 base kaç birim
+        self.fetched_at = 0.0
+        self._task = None
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("base") == self.base and data.get("rates"):
+                self.rates = data["rates"]
+                self.fetched_at = data.get("fetched_at", 0.0)
+                logging.info(f"Döviz kurları diskten yüklendi ({len(self.rates)} para birimi, {self.age() / 60:.0f} dk önce alınmış).")
+        except (OSError, ValueError):
+            pass
+
+    def _save(self, rates, fetched_at):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"base": self.base, "fetched_at": fetched_at, "rates": rates}, f)
+        os.replace(self.path + ".tmp", self.path)
+
+    def age(self):
+        return time.time() - self.fetched_at if self.fetched_at else None
+
+    def rate(self, from_currency, to_currency):
+        """Returns how many to_currency one from_currency buys, or None if unknown. Never waits."""
+        self.start()
+        if from_currency == to_currency:
+            return 1.0
+        from_rate, to_rate = self.rates.get(from_currency), self.rates.get(to_currency)
+        if not from_rate or not to_rate:
+            return None
+        return to_rate / from_rate
+
+    def start(self):
+        # İlk çağrıda (on_ready, CLI ya da ilk sorgu) arka plan döngüsü başlar; tekrar çağrılar bir şey yapmaz.
+        if self._task is None or self._task.done():
+            with contextlib.suppress(RuntimeError):  # Event loop dışından çağrıldıysa
+                self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def refresh(self):
+        response = await get_http_client("api.frankfurter.app").get("/latest", params={"from": self.base})
+        if response.status_code != 200:
+            raise httpx.HTTPStatusError(f"Status Code: {response.status_code}", request=response.request, response=response)
+        rates = dict(response.json().get("rates") or {})
+        if not rates:
+            raise ValueError("Kur tablosu boş geldi.")
+        rates[self.base] = 1.0
+        fetched_at = time.time()
+        await asyncio.to_thread(self._save, rates, fetched_at)
+        self.rates, self.fetched_at = rates, fetched_at
+        logging.info(f"Döviz kurları güncellendi ({len(rates)} para birimi), USD/TRY: {rates.get('TRY')}")
+
+    async def _loop(self):
+        retry_delay = 30.0
+        while True:
+            # Tablo süresi dolmadan, aralığın %90'ında yenilenir.
+            age = self.age()
+            due_in = 0 if age is None else self.refresh_interval * 0.9 - age
+            if due_in > 0:
+                await asyncio.sleep(due_in)
+            try:
+                await self.refresh()
+                retry_delay = 30.0
+            except Exception as e:
+                age = self.age()
+                if age is not None and age > EXCHANGE_RATE_STALE_AFTER:
+                    logging.warning(f"Döviz kurları {age / 3600:.0f} saattir güncellenemedi: {e}")
+                else:
+                    logging.error(f"Döviz kuru alınırken hata: {e}")
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, EXCHANGE_RATE_RETRY_MAX)
+
+exchange_rates = ExchangeRateService(EXCHANGE_RATE_PATH)
+EXCHANGE_RATE_AGE.set_function(exchange_rates.age)
+
+async def get_usd_to_try_rate():
+    # Geriye dönük uyumluluk için async; kur bellekten okunur, ağ beklenmez.
+    return exchange_rates.rate("USD", "TRY")
 
 # --- Steam Fiyat ve Link Alma Fonksiyonu (YENİ: Akıllı Puanlama Sistemiyle) ---
-def get_steam_price(game_name):
+# --- YENİ: Yerel Steam Başlık İndeksi ---
+# Steam uygulama listesinin anlık görüntüsünden diskte bir trigram indeksi tutulur
+# (bkz. title_index.py). Açılışta yüklenir, STEAM_TITLE_INDEX_REFRESH_HOURS aralıkla yeni
+# listeyle artımlı olarak güncellenir. İndeks hazır değilse storesearch kullanılır.
+STEAM_APP_LIST_URL = os.environ.get("STEAM_APP_LIST_URL", "https://api.steampowered.com/ISteamApps/GetAppList/v2/")
+STEAM_TITLE_INDEX_DIR = os.environ.get("STEAM_TITLE_INDEX_DIR", "data/steam_title_index")
+STEAM_TITLE_INDEX_REFRESH_HOURS = float(os.environ.get("STEAM_TITLE_INDEX_REFRESH_HOURS", 24))
+steam_title_index = None
+steam_title_index_task = None
+
+def lookup_steam_title_index(game_name):
+    """Returns (app id, canonical name, score) from the local index, or None when it has no good match."""
+    if steam_title_index is None:
+        return None
+    try:
+        return steam_title_index.lookup(game_name)
+    except Exception as e:
+        logging.error(f"Steam başlık indeksi sorgusu başarısız: {e}", exc_info=True)
+        return None
+
+def build_steam_title_index(content, current):
+    """Decodes a GetAppList body and builds the next index; returns None for an empty list. Runs in a thread."""
+    apps = parse_app_list(json.loads(content))
+    if not apps:
+        return None
+    if current is None:
+        return TitleIndex.build(STEAM_TITLE_INDEX_DIR, apps)
+    return current.with_snapshot(apps)
+
+async def refresh_steam_title_index():
+    global steam_title_index
+    response = await get_http_client("api.steampowered.com").get(STEAM_APP_LIST_URL)
+    response.raise_for_status()
+    # ~200 bin kayıtlık JSON'u çözmek ve gezmek de event loop dışında yapılır.
+    index = await asyncio.to_thread(build_steam_title_index, response.content, steam_title_index)
+    if index is None:
+        logging.warning("Steam uygulama listesi boş geldi, indeks güncellenmedi.")
+        return
+    steam_title_index = index
+    logging.info(f"Steam başlık indeksi güncellendi: {len(steam_title_index)} uygulama.")
+
+async def steam_title_index_loop():
+    global steam_title_index
+    steam_title_index = await asyncio.to_thread(TitleIndex.open, STEAM_TITLE_INDEX_DIR)
+    if steam_title_index:
+        logging.info(f"Steam başlık indeksi diskten yüklendi: {len(steam_title_index)} uygulama.")
+    refresh_interval = STEAM_TITLE_INDEX_REFRESH_HOURS * 3600
+    while True:
+        age = time.time() - steam_title_index.built_at if steam_title_index else refresh_interval
+        if age < refresh_interval:
+            await asyncio.sleep(refresh_interval - age)
+        try:
+            await refresh_steam_title_index()
+        except Exception as e:
+            logging.error(f"Steam başlık indeksi güncellenemedi: {e}", exc_info=True)
+            # Başarısız denemeden sonra bir saat bekle; eski indeks kullanılmaya devam eder.
+            await asyncio.sleep(min(refresh_interval, 3600))
+
+def start_steam_title_index():
+    global steam_title_index_task
+    # on_ready yeniden bağlanmalarda tekrar çağrılabilir; tek bir döngü yeterli.
+    if steam_title_index_task is None or steam_title_index_task.done():
+        steam_title_index_task = asyncio.create_task(steam_title_index_loop())
+
+async def get_steam_price(game_name, indexed=None):
+    """indexed: a title index hit the caller already looked up for game_name, so it isn't searched twice."""
     try:
-        # 1. Kullanıcının arama terimindeki sayıyı bul
-        user_query_numbers = extract_numbers_from_title(game_name)
-        # Eğer kullanıcı 'Red Dead Redemption' yazdıysa bu set boş olacak.
-        # Eğer 'Red Dead Redemption 2' yazdıysa {2} olacak.
-
-        search_url = f"https://store.steampowered.com/api/storesearch/?term={requests.utils.quote(game_name)}&l=turkish&cc=TR"
-        response = requests.get(search_url)
-        if response.status_code != 200 or not response.json().get('items'):
+        # 0. Bu sorgu daha önce bir app id'ye çözümlendiyse aramayı atla
+        query_key = clean_game_name(game_name)
+        resolved = await resolution_store.get(query_key, "steam")
+        if resolved:
+            phases = PhaseTimer("steam")
+            result = await get_steam_app_price(resolved["store_id"])
+            phases.lap("extract")
+            if result:
+                await resolution_store.touch(query_key, "steam")
+                return result
+            await resolution_store.forget(query_key, "steam")
+
+        # 1. Yerel başlık indeksi: ağa çıkmadan app id'yi bul, fiyatı appdetails'ten al
+        phases = PhaseTimer("steam")
+        if indexed is None:
+            indexed = lookup_steam_title_index(game_name)
+            phases.lap("match")
+        if indexed:
+            app_id, canonical_name, score = indexed
+            result = await get_steam_app_price(app_id)
+            phases.lap("extract")
+            if result:
+                # storesearch yolundaki gibi: bir sonraki sorgu indekse de bakmadan çözülür
+                await resolution_store.put(query_key, "steam", app_id, result["link"], result.get("name") or canonical_name, score)
+                return result
+
+        # 2. Yedek: Steam storesearch
+        response = await hedged_get(
+            "store.steampowered.com", "/api/storesearch/", "steam_search",
+            params={"term": game_name, "l": "turkish", "cc": "TR"},
+        )
+        phases.lap("search")
+        if response.status_code != 200:
             logging.warning(f"Steam araması başarısız oldu. Status Code: {response.status_code}, Game: {game_name}")
-            return None
+            raise StoreUnavailable(f"Steam storesearch HTTP {response.status_code}")
 
         search_results = response.json().get('items', [])
         if not search_results:
             logging.info(f"Steam'de '{game_name}' için sonuç bulunamadı.")
             return None
 
-        best_match = None
-        highest_score = -1
-
-        # 2. Tüm sonuçları gez ve puanla
-        for item in search_results:
-            item_name = item.get('name', '')
-            cleaned_item_name = clean_game_name(item_name)
-
-            # Puanlama Başlangıcı
-            current_score = 0
-
-            # Metinsel Benzerlik Puanı (Temel Puan)
-            # Bu, "Bioshock" ile "Bioshock Remastered" eşleşmesini sağlar.
-            # rapidfuzz kütüphanesi bu iş için harikadır ama basit bir `in` kontrolü de iş görür.
-            # Daha basit ve hatasız olması için `in` kullanalım.
-            if game_name in cleaned_item_name:
-                current_score += 90
-            elif cleaned_item_name in game_name:
-                current_score += 85
-            else: # Eğer temel isim bile eşleşmiyorsa, bu sonucu atla
-                continue
-
-            # Sayısal Eşleşme Puanı (Filtreleme)
-            result_numbers = extract_numbers_from_title(cleaned_item_name)
-
-            if user_query_numbers: # Kullanıcı bir sayı belirtti (örn: RDR 2)
-                if not user_query_numbers.intersection(result_numbers):
-                    current_score -= 100 # Yanlış devam oyunu, puanı düşürerek ele
-            else: # Kullanıcı sayı belirtmedi (örn: RDR)
-                # Sonuçta 1'den büyük bir sayı varsa (örn: RDR 2), bu istenmeyen bir devam oyunudur.
-                if any(n > 1 for n in result_numbers):
-                    current_score -= 100 # İstenmeyen devam oyunu, puanı düşürerek ele
-
-            # En yüksek skorlu sonucu sakla
-            if current_score > highest_score:
-                highest_score = current_score
-                best_match = item
-
-        # 3. Yeterince iyi bir eşleşme bulunduysa devam et
-        if not best_match or highest_score < 50:
+        # Tüm sonuçlar tek seferde puanlanır (bkz. matching.py); yeterince iyi eşleşme yoksa dur
+        match = best_candidate(game_name, [item.get('name', '') for item in search_results], "steam")
+        phases.lap("match")
+        if not match:
              logging.info(f"Steam'de '{game_name}' için yeterli doğrulukta bir eşleşme bulunamadı.")
              return None
+        logging.debug(f"Steam eşleşmesi: {match.title} ({match.score}) - {'; '.join(match.reasons)}")
+        best_match = search_results[match.index]
+        highest_score = match.score
 
         link = f"https://store.steampowered.com/app/{best_match.get('id')}"
         game_name_from_steam = best_match.get('name')
         price_data = best_match.get('price')
+        await resolution_store.put(query_key, "steam", best_match.get('id'), link, game_name_from_steam, highest_score)
 
         if not price_data:
             if best_match.get('unpurchaseable'):
@@ -207,308 +728,1018 @@ def get_steam_price(game_name):
         else:
             return {"price": "Fiyat bilgisi yok.", "link": link, "name": game_name_from_steam}
 
+    except StoreUnavailable:
+        raise
     except Exception as e:
         logging.error(f"STEAM HATA: {e}", exc_info=True)
-        return None
-
-# YENİ: Hata durumunda ekran görüntüsü VE HTML KAYDEDEN yardımcı fonksiyon
-async def take_screenshot_on_error(page, platform_name, game_name):
-    if not page or page.is_closed():
-        logging.warning(f"{platform_name} için hata ayıklama verisi kaydedilemedi, sayfa kapalı.")
-        return
+        raise StoreUnavailable(f"Steam: {e}") from e
 
+# YENİ: Çözümlenmiş bir app id için fiyatı doğrudan appdetails uç noktasından alır.
+async def get_steam_app_price(app_id):
     try:
-        # Dosyalar için benzersiz bir zaman damgası oluştur
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        safe_game_name = re.sub(r'[^\w-]', '_', game_name) # Dosya adında sorun yaratacak karakterleri temizle
-
-        # 1. Ekran Görüntüsünü Kaydet
-        screenshot_path = f"debug_output/error_{platform_name}_{safe_game_name}_{timestamp}.png"
-        await page.screenshot(path=screenshot_path)
-        logging.info(f"Hata ekran görüntüsü kaydedildi: {screenshot_path}")
-
-        # 2. Sayfanın HTML İçeriğini Kaydet
-        html_path = f"debug_output/error_{platform_name}_{safe_game_name}_{timestamp}.html"
-        html_content = await page.content()
-        with open(html_path, "w", encoding="utf-8") as f:
-            f.write(html_content)
-        logging.info(f"Hata anındaki sayfa HTML'i kaydedildi: {html_path}")
+        response = await get_http_client("store.steampowered.com").get(
+            "/api/appdetails",
+            params={"appids": app_id, "cc": "TR", "l": "turkish", "filters": "basic,price_overview"},
+            timeout=budget_seconds(10.0),
+        )
+        if response.status_code != 200:
+            logging.warning(f"Steam appdetails başarısız oldu. Status Code: {response.status_code}, App ID: {app_id}")
+            raise StoreUnavailable(f"Steam appdetails HTTP {response.status_code}")
 
-    except Exception as e:
-        logging.error(f"Hata ayıklama verileri kaydedilirken bir sorun oluştu: {e}")
+        app_entry = (response.json() or {}).get(str(app_id), {})
+        if not app_entry.get("success"):
+            return None
 
-async def get_xbox_price(game_name_clean):
-    global browser
-    if not browser or not browser.is_connected():
-        logging.warning("Xbox fiyatı alınamıyor: Tarayıcı bağlı değil.")
-        return None
-    page = None
-    try:
-        page = await browser.new_page()
-        page.set_default_timeout(8000)
-        search_url = f"https://www.xbox.com/tr-TR/Search/Results?q={requests.utils.quote(game_name_clean)}"
-        logging.info(f"Xbox için gidiliyor: {search_url}")
-
-        await page.goto(search_url)
-        await page.wait_for_selector('div[class*="ProductCard-module"]')
-
-        # ... (En iyi eşleşmeyi bulma mantığı aynı) ...
-        all_results = await page.query_selector_all('a[class*="commonStyles-module__basicButton"]')
-        if not all_results:
-            await page.close(); return None
-        user_query_numbers = extract_numbers_from_title(game_name_clean)
-        best_match_element = None; highest_score = -1
-        for result in all_results:
-            full_aria_label = await result.get_attribute("aria-label") or ""
-            if not full_aria_label: continue
-            item_name = full_aria_label.split(',')[0].strip()
-            cleaned_item_name = clean_game_name(item_name)
-            current_score = 0
-            if game_name_clean in cleaned_item_name: current_score += 90
-            elif cleaned_item_name in game_name_clean: current_score += 85
-            else: continue
-            result_numbers = extract_numbers_from_title(cleaned_item_name)
-            if user_query_numbers:
-                if not user_query_numbers.intersection(result_numbers): current_score -= 100
-            else:
-                if any(n > 1 for n in result_numbers): current_score -= 100
-            if current_score > highest_score:
-                highest_score = current_score; best_match_element = result
-        if not best_match_element or highest_score < 50:
-            await page.close(); return None
+        data = app_entry.get("data", {})
+        link = f"https://store.steampowered.com/app/{app_id}"
+        game_name_from_steam = data.get("name")
+        price_data = data.get("price_overview")
+
+        if not price_data:
+            if data.get("is_free"):
+                return {"price": "Ücretsiz!", "link": link, "name": game_name_from_steam}
+            return {"price": "Fiyat bilgisi yok.", "link": link, "name": game_name_from_steam}
 
-        await best_match_element.click()
-        await page.wait_for_load_state('domcontentloaded', timeout=10000)
-        link = page.url
+        final_price = price_data.get("final")
+        if isinstance(final_price, int):
+            return {"price": (final_price / 100.0, price_data.get("currency", "USD")), "link": link, "name": game_name_from_steam}
+        return {"price": "Fiyat bilgisi yok.", "link": link, "name": game_name_from_steam}
 
-        price_info = "Fiyat bilgisi yok."
-        subscriptions = []
-        platform_info = None
+    except StoreUnavailable:
+        raise
+    except Exception as e:
+        logging.error(f"STEAM APPDETAILS HATA: {e}", exc_info=True)
+        raise StoreUnavailable(f"Steam appdetails: {e}") from e
+
+# --- YENİ: Tarayıcı Context ve Sayfa Havuzu ---
+# Her mağaza için önceden açılmış context'ler tutulur. Sayfalar havuzdan alınır,
+# iş bitince about:blank'e döndürülerek tekrar kullanılır. Havuz boyutu aynı anda
+# açık olabilecek sayfa sayısının da üst sınırıdır.
+BROWSER_POOL_CONFIG = {
+    "xbox": {
+        "size": int(os.environ.get("XBOX_PAGE_POOL_SIZE", 3)),
+        "locale": "tr-TR",
+        "viewport": {"width": 1366, "height": 900},
+        "timeout": 8000,
+        "navigation_timeout": 10000,
+    },
+    "playstation": {
+        "size": int(os.environ.get("PS_PAGE_POOL_SIZE", 3)),
+        "locale": "tr-TR",
+        "viewport": {"width": 1366, "height": 900},
+        "timeout": 90000,
+        "navigation_timeout": 90000,
+    },
+}
+page_pools = {}
+
+# --- YENİ: Scraper Sayfaları İçin Ağ Kaynağı Engelleme ---
+# Scraper'lar sadece metin, aria-label ve __PRELOADED_STATE__ okuyor. Görsel, medya,
+# font ve analitik script'leri indirmek sadece süre ve bellek harcıyor.
+# allow_patterns her zaman önceliklidir; BLOCK_RESOURCES=0 ile tamamen kapatılabilir.
+BLOCK_RESOURCES = os.environ.get("BLOCK_RESOURCES", "1") != "0"
+COMMON_TRACKER_PATTERNS = [
+    r"google-analytics\.com",
+    r"googletagmanager\.com",
+    r"doubleclick\.net",
+    r"facebook\.(?:net|com)/tr",
+    r"\.omtrdc\.net",
+    r"\.demdex\.net",
+    r"\.adobedtm\.com",
+    r"\.nr-data\.net",
+]
+RESOURCE_BLOCK_RULES = {
+    "xbox": {
+        "block_types": ["image", "media", "font"],
+        "block_patterns": COMMON_TRACKER_PATTERNS + [
+            r"\.clarity\.ms",
+            r"bat\.bing\.com",
+            r"js\.monitor\.azure\.com",
+            r"browser\.events\.data\.microsoft\.com",
+        ],
+        "allow_patterns": [],
+    },
+    "playstation": {
+        "block_types": ["image", "media", "font"],
+        "block_patterns": COMMON_TRACKER_PATTERNS + [
+            r"smetrics\.",
+            r"\.branch\.io",
+            r"\.tiqcdn\.com",
+        ],
+        "allow_patterns": [],
+    },
+}
+
+class ResourceBlocker:
+    """Aborts requests a scraper page does not need, based on per-store type and URL rules."""
+
+    def __init__(self, store, block_types=(), block_patterns=(), allow_patterns=()):
+        self.store = store
+        self.block_types = set(block_types)
+        self._block_re = re.compile("|".join(block_patterns)) if block_patterns else None
+        self._allow_re = re.compile("|".join(allow_patterns)) if allow_patterns else None
+        # Engellenen istekler hiç indirilmediği için boyutları bilinemez; izin verilenlerin
+        # byte'ları sayılır, böylece engelleme açık/kapalı karşılaştırması yapılabilir.
+        self.stats = {
+            "blocked_requests": 0,
+            "blocked_by_type": {},
+            "allowed_requests": 0,
+            "allowed_bytes": 0,
+        }
 
-        # --- YENİ VE KESİN ABONELİK TESPİTİ (JSON'DAN OKUMA) ---
+    def should_block(self, resource_type, url):
+        if self._allow_re and self._allow_re.search(url):
+            return False
+        if resource_type in self.block_types:
+            return True
+        return bool(self._block_re and self._block_re.search(url))
+
+    async def attach(self, context):
+        await context.route("**/*", self._handle_route)
+        context.on("response", self._on_response)
+
+    async def _handle_route(self, route):
+        request = route.request
+        if self.should_block(request.resource_type, request.url):
+            self.stats["blocked_requests"] += 1
+            by_type = self.stats["blocked_by_type"]
+            by_type[request.resource_type] = by_type.get(request.resource_type, 0) + 1
+            await route.abort("blockedbyclient")
+        else:
+            self.stats["allowed_requests"] += 1
+            # fallback: varsa önceki route'a (fixture katmanı) bırak, yoksa ağa devam et
+            await route.fallback()
+
+    def _on_response(self, response):
+        content_length = response.headers.get("content-length")
+        if content_length and content_length.isdigit():
+            self.stats["allowed_bytes"] += int(content_length)
+
+class BrowserPagePool:
+    """Pre-created browser contexts for one store, handing out pages with bounded concurrency."""
+
+    def __init__(self, store, size, locale, viewport, timeout, navigation_timeout, blocker=None):
+        self.store = store
+        self.size = size
+        self.locale = locale
+        self.viewport = viewport
+        self.timeout = timeout
+        self.navigation_timeout = navigation_timeout
+        self.blocker = blocker
+        self._browser = None
+        # Kuyrukta ya hazır bir sayfa ya da yeniden oluşturulması gereken boş slot (None) bulunur.
+        self._idle = asyncio.Queue()
+        self._background_tasks = set()
+        self.open_pages = 0
+        # Tarayıcı denetçisi bu sayaçlarla geri dönüşüm kararı verir ve boşalmayı bekler.
+        self.in_use = 0
+        self.pages_served = 0
+        self._drained = asyncio.Event()
+        self._drained.set()
+
+    async def start(self, browser):
+        self._browser = browser
+        for _ in range(self.size):
+            try:
+                self._idle.put_nowait(await self._new_page())
+            except Exception as e:
+                logging.error(f"{self.store} için sayfa havuzu ısıtılamadı: {e}")
+                self._idle.put_nowait(None)
+        logging.info(f"✅ {self.store} sayfa havuzu hazır ({self.size} context).")
+
+    async def _new_page(self):
+        context = await self._browser.new_context(locale=self.locale, viewport=self.viewport)
+        context.set_default_timeout(self.timeout)
+        context.set_default_navigation_timeout(self.navigation_timeout)
+        if fixtures.enabled():
+            await fixtures.attach_to_context(context)
+        if self.blocker:
+            await self.blocker.attach(context)
+        page = await context.new_page()
+        self.open_pages += 1
+        return page
+
+    @contextlib.asynccontextmanager
+    async def page(self):
+        page = await self._idle.get()
+        if page is None:
+            try:
+                page = await self._new_page()
+            except BaseException:
+                self._idle.put_nowait(None)
+                raise
+        self.in_use += 1
+        self.pages_served += 1
+        self._drained.clear()
         try:
-            # Sayfanın URL'sinden ürün ID'sini al (örn: 9NWQ4TJKPJ7B)
-            product_id_match = re.search(r'/([A-Z0-9]{12})', link)
-            if product_id_match:
-                product_id = product_id_match.group(1)
-                logging.info(f"Xbox Ürün ID'si bulundu: {product_id}")
-
-                # Sayfanın içine gömülü olan veri script'ini çek
-                script_selector = 'script:has-text("__PRELOADED_STATE__")'
-                script_content = await page.locator(script_selector).inner_text()
-
-                # Script içeriğini temizleyip JSON'a çevir
-                json_str = script_content.replace("window.__PRELOADED_STATE__ = ", "").rstrip(";")
-                preloaded_data = json.loads(json_str)
-
-                # JSON verisi içinde ürünün abonelik bilgilerini kontrol et
-                product_summary = preloaded_data.get("core2", {}).get("products", {}).get("productSummaries", {}).get(product_id, {})
-
-                if product_summary:
-                    # Bu liste doluysa, oyun en az bir aboneliğe dahildir.
-                    included_passes = product_summary.get("includedWithPassesProductIds", [])
-                    if included_passes:
-                        # Hangi abonelik olduğunu da bulabiliriz ama şimdilik dahil olması yeterli.
-                        # EA Play ID: CFQ7TTC0K5DH, Game Pass ID'leri: CFQ7TTC0KHS0, CFQ7TTC0KGQ8...
-                        is_ea_play = "CFQ7TTC0K5DH" in included_passes
-                        is_game_pass = any(p != "CFQ7TTC0K5DH" for p in included_passes)
-
-                        if is_game_pass:
-                            subscriptions.append("Game Pass'e Dahil")
-                        if is_ea_play:
-                            subscriptions.append("EA Play'e Dahil")
-                        logging.info(f"JSON verisinden abonelikler bulundu: {subscriptions}")
+            yield page
+        finally:
+            try:
+                await self._release(page)
+            finally:
+                self.in_use -= 1
+                if self.in_use == 0:
+                    self._drained.set()
+
+    async def drain(self, timeout):
+        """Waits until no page of this pool is in use; returns False if the timeout passed first."""
+        try:
+            await asyncio.wait_for(self._drained.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
 
+    async def _release(self, page):
+        reusable = None
+        try:
+            if not page.is_closed():
+                # Scraper'ın değiştirmiş olabileceği ayarları geri al ve sayfayı boşalt.
+                # Context (ve dolayısıyla çerez onayı) korunur.
+                page.set_default_timeout(self.timeout)
+                page.set_default_navigation_timeout(self.navigation_timeout)
+                await page.goto("about:blank")
+                reusable = page
         except Exception as e:
-            logging.error(f"Xbox JSON abonelik verisi okunurken hata (Görsel arama denenecek): {e}")
-
-        # Fiyat ve Platform tespiti (Bu kısımlar zaten sağlam, aynı kalıyor)
+            logging.warning(f"{self.store} sayfası sıfırlanamadı, context yeniden oluşturulacak: {e}")
+        finally:
+            if reusable is None:
+                self._discard(page)
+            self._idle.put_nowait(reusable)
+
+    def _discard(self, page):
+        self.open_pages -= 1
+        task = asyncio.create_task(self._close_context(page.context))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _close_context(self, context):
         try:
-            price_selector_A = 'span[class*="Price-module__boldText"]'
-            price_element_A = page.locator(price_selector_A).first
-            await price_element_A.wait_for(state="visible", timeout=7000)
-            price_info = await price_element_A.inner_text()
+            await context.close()
         except Exception:
-            try:
-                price_selector_B = 'button[aria-label*="satın al"] span[class*="Price-module__boldText"]'
-                price_element_B = page.locator(price_selector_B).first
-                await price_element_B.wait_for(state="visible", timeout=7000)
-                price_info = await price_element_B.inner_text()
-            except Exception:
-                try:
-                    button_selector_C = 'button[aria-label*="fiyatı"]'
-                    button_element_C = page.locator(button_selector_C).first
-                    await button_element_C.wait_for(state="visible", timeout=7000)
-                    aria_label = await button_element_C.get_attribute("aria-label")
-                    price_match = re.search(r'(\d{1,3}(?:\.\d{3})*,\d{2}\s*₺)', aria_label)
-                    if price_match: price_info = price_match.group(1)
-                except Exception as e:
-                    logging.error(f"Xbox fiyatı 3 yöntemle de bulunamadı: {e}")
-                    await take_screenshot_on_error(page, "xbox_price_error", game_name_clean)
+            pass
+
+    async def close(self):
+        while not self._idle.empty():
+            page = self._idle.get_nowait()
+            if page is not None:
+                self.open_pages -= 1
+                await self._close_context(page.context)
+
+async def start_page_pools(browser, stores=None):
+    for store, config in BROWSER_POOL_CONFIG.items():
+        if stores is not None and store not in stores:
+            continue
+        blocker = None
+        if BLOCK_RESOURCES and store in RESOURCE_BLOCK_RULES:
+            blocker = ResourceBlocker(store, **RESOURCE_BLOCK_RULES[store])
+        pool = BrowserPagePool(store, blocker=blocker, **config)
+        await pool.start(browser)
+        page_pools[store] = pool
+
+# --- YENİ: Tarayıcı Yaşam Döngüsü Denetçisi ---
+# Tarayıcı ilk ihtiyaçta başlatılır (tekrar çağrılar aynı tarayıcıyı döndürür). Arka plandaki
+# sağlık kontrolü kopan ya da yanıt vermeyen tarayıcıyı yeniden başlatır; BROWSER_RECYCLE_PAGES
+# sayfa sunulduktan sonra veya Chromium'un belleği BROWSER_RECYCLE_RSS_MB'yi geçince tarayıcı,
+# kullanımdaki sayfaların bitmesi beklenerek yenisiyle değiştirilir.
+BROWSER_HEALTH_INTERVAL = float(os.environ.get("BROWSER_HEALTH_INTERVAL", 30))
+BROWSER_RECYCLE_PAGES = int(os.environ.get("BROWSER_RECYCLE_PAGES", 500))
+BROWSER_RECYCLE_RSS_MB = int(os.environ.get("BROWSER_RECYCLE_RSS_MB", 1500))
+BROWSER_DRAIN_TIMEOUT = 60.0
+BROWSER_PROBE_TIMEOUT = 10.0
+
+BROWSER_LAUNCHES = metrics.Counter(
+    "fiyatbot_browser_launches_total", "Chromium launches by reason (initial, disconnected, unhealthy, pages, memory).", ["reason"]
+)
+
+class BrowserSupervisor:
+    """Owns the Playwright browser: lazy idempotent launch, health checks, relaunch and recycling."""
+
+    def __init__(self, stores=None):
+        self.stores = stores
+        self.playwright = None
+        self.browser = None
+        self._lock = asyncio.Lock()
+        self._recycling = False
+        self._closing = False
+        self._health_task = None
+        self._background_tasks = set()
+
+    def alive(self):
+        return self.browser is not None and self.browser.is_connected()
+
+    def start(self):
+        """Starts the health check loop; safe to call again on reconnect."""
+        self._closing = False
+        if self._health_task is None or self._health_task.done():
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def ensure(self, reason="initial"):
+        """Returns a connected browser, launching one if needed."""
+        if self.alive() and not self._recycling:
+            return self.browser
+        async with self._lock:
+            if not self.alive():
+                await self._shutdown()
+                await self._launch(reason)
+        return self.browser
+
+    async def pool(self, store):
+        """Returns the store's page pool on a live browser, or None if the browser cannot be started."""
+        if self._closing:
+            return None
         try:
-            platform_list_locator = page.locator('h2:has-text("Platformlar") + ul')
-            if await platform_list_locator.count() > 0:
-                all_platforms_text = await platform_list_locator.first.inner_text()
-                has_pc = "Bilgisayar" in all_platforms_text
-                has_xbox = "Xbox" in all_platforms_text
-                if has_pc and has_xbox: platform_info = "PC & Konsol"
-                elif has_xbox: platform_info = "Konsol"
-        except Exception:
-            logging.info("Xbox platform bilgisi alınamadı.")
+            await self.ensure()
+        except Exception as e:
+            logging.error(f"❌ HATA: Playwright tarayıcısı başlatılamadı: {e}", exc_info=True)
+            return None
+        return page_pools.get(store)
 
-        await page.close()
+    async def _launch(self, reason):
+        global playwright, browser
+        self.playwright = await async_playwright().start()
+        # headless=False yaparak tarayıcıyı Replit'te VNC ile görebilirsiniz (debug için faydalı olabilir)
+        self.browser = await self.playwright.chromium.launch(headless=True)
+        self.browser.on("disconnected", self._on_disconnected)
+        playwright, browser = self.playwright, self.browser
+        BROWSER_LAUNCHES.inc(reason=reason)
+        logging.info(f"✅ Tarayıcı (PS & Xbox için) başarıyla başlatıldı! (neden: {reason})")
+        await start_page_pools(self.browser, self.stores)
+
+    async def _shutdown(self):
+        global playwright, browser
+        pools = list(page_pools.values())
+        page_pools.clear()
+        for pool in pools:
+            with contextlib.suppress(Exception):
+                await pool.close()
+        old_browser, old_playwright = self.browser, self.playwright
+        self.browser = self.playwright = None
+        playwright = browser = None
+        if old_browser:
+            with contextlib.suppress(Exception):
+                await old_browser.close()
+        if old_playwright:
+            with contextlib.suppress(Exception):
+                await old_playwright.stop()
+
+    async def recycle(self, reason):
+        """Replaces the browser after the pages in use have been released."""
+        async with self._lock:
+            self._recycling = True
+            try:
+                pools = list(page_pools.values())
+                # Yeni istekler kilitte bekler; kullanımdaki sayfaların işi bitsin.
+                for pool in pools:
+                    if not await pool.drain(BROWSER_DRAIN_TIMEOUT):
+                        logging.warning(f"{pool.store} sayfa havuzu {BROWSER_DRAIN_TIMEOUT:.0f} sn'de boşalmadı, yine de kapatılıyor.")
+                logging.info(f"Tarayıcı geri dönüştürülüyor: {reason}")
+                await self._shutdown()
+                if not self._closing:
+                    await self._launch(reason)
+            finally:
+                self._recycling = False
+
+    def _on_disconnected(self, disconnected_browser):
+        if self._closing or disconnected_browser is not self.browser:
+            return
+        logging.error("Tarayıcı bağlantısı koptu, yeniden başlatılıyor.")
+        task = asyncio.create_task(self._relaunch("disconnected"))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
 
-        # Sonuçları birleştir
-        display_lines = []
-        first_line_parts = []
-        if not (price_info == "Fiyat bilgisi yok." and subscriptions):
-            first_line_parts.append(price_info)
-        if platform_info:
-            first_line_parts.append(f"({platform_info})")
-        if first_line_parts:
-            display_lines.append(" ".join(first_line_parts))
-        if subscriptions:
-            display_lines.append("*" + " veya ".join(subscriptions) + "*")
-        final_display_text = "\n".join(display_lines)
+    async def _relaunch(self, reason):
+        try:
+            await self.ensure(reason)
+        except Exception as e:
+            logging.error(f"Tarayıcı yeniden başlatılamadı: {e}", exc_info=True)
 
-        return {"price": final_display_text.strip(), "link": link}
+    async def _probe(self):
+        context = await self.browser.new_context()
+        await context.close()
 
-    except Exception as e:
-        logging.error(f"XBOX HATA (Genel Fonksiyon Hatası): {e}", exc_info=True)
-        await take_screenshot_on_error(page, "xbox_general_error", game_name_clean)
-        if page and not page.is_closed(): await page.close()
-        return None
+    async def _health_loop(self):
+        while not self._closing:
+            await asyncio.sleep(BROWSER_HEALTH_INTERVAL)
+            if self.browser is None and self.playwright is None:
+                continue  # Henüz hiç ihtiyaç olmadı
+            try:
+                if not self.alive():
+                    await self._relaunch("disconnected")
+                    continue
+                try:
+                    await asyncio.wait_for(self._probe(), BROWSER_PROBE_TIMEOUT)
+                except Exception as e:
+                    logging.error(f"Tarayıcı sağlık kontrolü başarısız: {e}")
+                    await self.recycle("unhealthy")
+                    continue
+                served = sum(pool.pages_served for pool in page_pools.values())
+                rss = chromium_rss_bytes()
+                if BROWSER_RECYCLE_PAGES and served >= BROWSER_RECYCLE_PAGES:
+                    await self.recycle("pages")
+                elif BROWSER_RECYCLE_RSS_MB and rss and rss > BROWSER_RECYCLE_RSS_MB * 1024 * 1024:
+                    logging.warning(f"Chromium belleği {rss // (1024 * 1024)} MB, sınır {BROWSER_RECYCLE_RSS_MB} MB.")
+                    await self.recycle("memory")
+            except Exception as e:
+                logging.error(f"Tarayıcı denetçisi hatası: {e}", exc_info=True)
 
+    async def close(self):
+        self._closing = True
+        if self._health_task:
+            self._health_task.cancel()
+        for task in self._background_tasks:
+            task.cancel()
+        async with self._lock:
+            await self._shutdown()
 
-# --- PlayStation Store Fiyat ve Link Alma Fonksiyonu (YENİ: Doğrudan Arama Sonucundan Veri Çekme) ---
-async def get_playstation_price(game_name):
-    global browser
-    if not browser or not browser.is_connected():
-        logging.warning("PlayStation fiyatı alınamıyor: Tarayıcı bağlı değil.")
-        return None
-    page = None
-    try:
-        page = await browser.new_page()
-        page.set_default_timeout(90000)
-        search_url = f"https://store.playstation.com/tr-tr/search/{requests.utils.quote(game_name)}"
-        logging.info(f"PlayStation için gidiliyor: {search_url}")
+browser_supervisor = BrowserSupervisor()
 
-        # Olası cookie/pop-up'ları önceden ele almak için bir kerelik bekleme
-        await page.goto(search_url, wait_until='domcontentloaded')
+# YENİ: Hata durumunda ekran görüntüsü VE HTML KAYDEDEN yardımcı fonksiyon
+# Kayıtlar artifacts.py'deki depodan geçer: aynı hata kısa sürede tekrar kaydedilmez,
+# dosyalar arka planda yazılır ve toplam boyut sınırlıdır.
+artifact_store = artifacts.ArtifactStore()
 
+async def take_screenshot_on_error(page, platform_name, game_name, error=None):
+    if not page or page.is_closed():
+        logging.warning(f"{platform_name} için hata ayıklama verisi kaydedilemedi, sayfa kapalı.")
+        return
+    await artifact_store.capture_page(page, platform_name, game_name, error)
+
+# --- YENİ: Xbox Yardımcıları ---
+XBOX_EA_PLAY_ID = "CFQ7TTC0K5DH"
+XBOX_PRELOADED_STATE_RE = re.compile(r'window\.__PRELOADED_STATE__\s*=\s*')
+
+def parse_xbox_preloaded_state(script_content):
+    """Decodes the JSON object assigned to window.__PRELOADED_STATE__ in a script body."""
+    match = XBOX_PRELOADED_STATE_RE.search(script_content)
+    start = match.end() if match else 0
+    preloaded_data, _ = json.JSONDecoder().raw_decode(script_content, start)
+    return preloaded_data
+
+def xbox_subscriptions_from_summary(product_summary):
+    subscriptions = []
+    # Bu liste doluysa, oyun en az bir aboneliğe dahildir.
+    included_passes = product_summary.get("includedWithPassesProductIds", [])
+    if included_passes:
+        # Hangi abonelik olduğunu da bulabiliriz ama şimdilik dahil olması yeterli.
+        # EA Play ID: CFQ7TTC0K5DH, Game Pass ID'leri: CFQ7TTC0KHS0, CFQ7TTC0KGQ8...
+        is_ea_play = XBOX_EA_PLAY_ID in included_passes
+        is_game_pass = any(p != XBOX_EA_PLAY_ID for p in included_passes)
+
+        if is_game_pass:
+            subscriptions.append("Game Pass'e Dahil")
+        if is_ea_play:
+            subscriptions.append("EA Play'e Dahil")
+    return subscriptions
+
+def format_xbox_display(price_info, platform_info, subscriptions):
+    display_lines = []
+    first_line_parts = []
+    if not (price_info == "Fiyat bilgisi yok." and subscriptions):
+        first_line_parts.append(price_info)
+    if platform_info:
+        first_line_parts.append(f"({platform_info})")
+    if first_line_parts:
+        display_lines.append(" ".join(first_line_parts))
+    if subscriptions:
+        display_lines.append("*" + " veya ".join(subscriptions) + "*")
+    return "\n".join(display_lines).strip()
+
+async def get_xbox_price_browser(game_name_clean):
+    pool = await browser_supervisor.pool("xbox")
+    if not pool:
+        logging.warning("Xbox fiyatı alınamıyor: Tarayıcı bağlı değil.")
+        raise StoreUnavailable("Xbox: tarayıcı yok")
+    async with pool.page() as page:
+        page.set_default_timeout(budget_ms(pool.timeout))
+        page.set_default_navigation_timeout(budget_ms(pool.navigation_timeout))
         try:
-            # Cookie banner'ını veya diğer pop-up'ları arayıp tıkla
-            cookie_button = page.locator('button:has-text("Accept All Cookies"), button:has-text("Tümünü Kabul Et")')
-            if await cookie_button.count() > 0:
-                logging.info("Cookie banner'ı bulundu ve tıklandı.")
-                await cookie_button.first.click(timeout=5000)
-                # Tıkladıktan sonra sonuçların yüklenmesi için kısa bir bekleme
-                await page.wait_for_timeout(2000)
-        except Exception:
-            logging.info("Cookie banner'ı bulunamadı veya tıklanamadı, devam ediliyor.")
+            resolved = await resolution_store.get(game_name_clean, "xbox")
+            phases = PhaseTimer("xbox_browser")
+            if resolved:
+                # Daha önce çözümlenmiş ürün: arama sayfasını atlayıp doğrudan ürün sayfasına git
+                logging.debug(f"Xbox için kayıtlı ürün sayfasına gidiliyor: {resolved['canonical_url']}")
+                await page.goto(resolved["canonical_url"], wait_until='domcontentloaded', timeout=budget_ms(10000))
+                phases.lap("navigate")
+            else:
+                search_url = f"https://www.xbox.com/tr-TR/Search/Results?q={quote(game_name_clean)}"
+                logging.debug(f"Xbox için gidiliyor: {search_url}")
+
+                await page.goto(search_url)
+                await page.wait_for_selector('div[class*="ProductCard-module"]')
+                phases.lap("search")
+
+                # ... (En iyi eşleşmeyi bulma mantığı aynı) ...
+                all_results = await page.query_selector_all('a[class*="commonStyles-module__basicButton"]')
+                if not all_results:
+                    return None
+                candidates = []
+                for result in all_results:
+                    full_aria_label = await result.get_attribute("aria-label") or ""
+                    if not full_aria_label: continue
+                    candidates.append((result, full_aria_label.split(',')[0].strip()))
+                match = best_candidate(game_name_clean, [item_name for _, item_name in candidates], "xbox")
+                phases.lap("match")
+                if not match:
+                    return None
+                best_match_element = candidates[match.index][0]
+                best_item_name = match.title; highest_score = match.score
+
+                await best_match_element.click()
+                await page.wait_for_load_state('domcontentloaded', timeout=budget_ms(10000))
+                phases.lap("navigate")
+            link = page.url
+
+            if not resolved:
+                store_id_match = re.search(r'/([A-Z0-9]{12})', link)
+                if store_id_match:
+                    await resolution_store.put(
+                        game_name_clean, "xbox", store_id_match.group(1), link, best_item_name, highest_score
+                    )
+
+            price_info = "Fiyat bilgisi yok."
+            subscriptions = []
+            platform_info = None
+
+            # --- YENİ VE KESİN ABONELİK TESPİTİ (JSON'DAN OKUMA) ---
+            try:
+                # Sayfanın URL'sinden ürün ID'sini al (örn: 9NWQ4TJKPJ7B)
+                product_id_match = re.search(r'/([A-Z0-9]{12})', link)
+                if product_id_match:
+                    product_id = product_id_match.group(1)
+                    logging.debug(f"Xbox Ürün ID'si bulundu: {product_id}")
+
+                    # Sayfanın içine gömülü olan veri script'ini çek
+                    script_selector = 'script:has-text("__PRELOADED_STATE__")'
+                    script_content = await page.locator(script_selector).inner_text()
+
+                    # Script içeriğini temizleyip JSON'a çevir
+                    preloaded_data = parse_xbox_preloaded_state(script_content)
 
-        results_selector = 'div[data-qa^="search#productTile"]'
-        await page.wait_for_selector(results_selector, timeout=20000)
+                    # JSON verisi içinde ürünün abonelik bilgilerini kontrol et
+                    product_summary = preloaded_data.get("core2", {}).get("products", {}).get("productSummaries", {}).get(product_id, {})
 
-        all_results = await page.locator(results_selector).all()
-        if not all_results:
-            await page.close(); return None
+                    if product_summary:
+                        subscriptions = xbox_subscriptions_from_summary(product_summary)
+                        if subscriptions:
+                            logging.debug(f"JSON verisinden abonelikler bulundu: {subscriptions}")
+
+            except Exception as e:
+                logging.error(f"Xbox JSON abonelik verisi okunurken hata (Görsel arama denenecek): {e}")
 
-        # Puanlama ile en iyi eşleşmeyi bulma...
-        user_query_numbers = extract_numbers_from_title(game_name)
-        best_match_element = None; highest_score = -1
-        for result in all_results:
+            # Fiyat ve Platform tespiti (Bu kısımlar zaten sağlam, aynı kalıyor)
             try:
-                title_element = result.locator('span[data-qa$="product-name"]')
-                if await title_element.count() == 0: continue
-                item_name = await title_element.inner_text()
-                cleaned_item_name = clean_game_name(item_name)
-
-                base_score = 100; current_score = 0
-                if cleaned_item_name.startswith(game_name): current_score = base_score - 5
-                elif game_name in cleaned_item_name: current_score = base_score - 10
-                else: continue
-                length_penalty = len(cleaned_item_name) - len(game_name)
-                current_score -= length_penalty
-
-                result_numbers = extract_numbers_from_title(cleaned_item_name)
-                if user_query_numbers:
-                    if not user_query_numbers.intersection(result_numbers): current_score = -1
+                price_selector_A = 'span[class*="Price-module__boldText"]'
+                price_element_A = page.locator(price_selector_A).first
+                await price_element_A.wait_for(state="visible", timeout=budget_ms(7000))
+                price_info = await price_element_A.inner_text()
+            except Exception:
+                try:
+                    price_selector_B = 'button[aria-label*="satın al"] span[class*="Price-module__boldText"]'
+                    price_element_B = page.locator(price_selector_B).first
+                    await price_element_B.wait_for(state="visible", timeout=budget_ms(7000))
+                    price_info = await price_element_B.inner_text()
+                except Exception:
+                    try:
+                        button_selector_C = 'button[aria-label*="fiyatı"]'
+                        button_element_C = page.locator(button_selector_C).first
+                        await button_element_C.wait_for(state="visible", timeout=budget_ms(7000))
+                        aria_label = await button_element_C.get_attribute("aria-label")
+                        price_match = re.search(r'(\d{1,3}(?:\.\d{3})*,\d{2}\s*₺)', aria_label)
+                        if price_match: price_info = price_match.group(1)
+                    except Exception as e:
+                        logging.error(f"Xbox fiyatı 3 yöntemle de bulunamadı: {e}")
+                        await take_screenshot_on_error(page, "xbox_price_error", game_name_clean, e)
+            try:
+                platform_list_locator = page.locator('h2:has-text("Platformlar") + ul')
+                if await platform_list_locator.count() > 0:
+                    all_platforms_text = await platform_list_locator.first.inner_text()
+                    has_pc = "Bilgisayar" in all_platforms_text
+                    has_xbox = "Xbox" in all_platforms_text
+                    if has_pc and has_xbox: platform_info = "PC & Konsol"
+                    elif has_xbox: platform_info = "Konsol"
+            except Exception:
+                logging.debug("Xbox platform bilgisi alınamadı.")
+
+            # Sonuçları birleştir
+            final_display_text = format_xbox_display(price_info, platform_info, subscriptions)
+            phases.lap("extract")
+
+            if resolved:
+                if price_info == "Fiyat bilgisi yok." and not subscriptions:
+                    # Kayıtlı sayfa artık işe yaramıyor; bir sonraki sorguda tekrar aranacak.
+                    await resolution_store.forget(game_name_clean, "xbox")
                 else:
-                    # YENİ: PS4, PS5 gibi platform ibarelerini ayırt etmek için
-                    is_platform_version = any(platform_str in cleaned_item_name for platform_str in ['ps4', 'ps5'])
-                    if not is_platform_version and any(n > 1 for n in result_numbers): 
-                        current_score = -1
-
-                if current_score > highest_score:
-                    highest_score = current_score; best_match_element = result
-            except Exception: continue
-
-        if not best_match_element or highest_score < 50:
-            await page.close(); return None
-
-        # --- YENİ MANTIK: Veriyi doğrudan bulunan karttan çek ---
-        price_info = "Fiyat bilgisi yok."
-        subscriptions = []
-
-        # Kartın içindeki metnin tamamını al
-        card_text = await best_match_element.inner_text()
-
-        # Fiyatı ara (örn: "1.399,00 TL")
-        price_match = re.search(r'(\d{1,3}(?:\.\d{3})*,\d{2}\s*TL)', card_text)
-        if price_match:
-            price_info = price_match.group(1)
-
-        # Abonelikleri ara
-        if "Extra" in card_text or "Premium" in card_text or "Deluxe" in card_text:
-            subscriptions.append("PS Plus'a Dahil")
-        if "GTA+" in card_text:
-            subscriptions.append("GTA+'a Dahil")
-        if "EA Play" in card_text:
-            subscriptions.append("EA Play'e Dahil")
+                    await resolution_store.touch(game_name_clean, "xbox")
 
-        # Link'i al
-        link_element = best_match_element.locator('a.psw-link').first
-        href = await link_element.get_attribute('href')
-        link = "https://store.playstation.com" + href
-
-        # Sonuçları Birleştir
-        final_display_text = price_info
-        if subscriptions:
-            # Eğer bir abonelik varsa ama fiyat bulunamadıysa, fiyat yerine "Dahil" yazabiliriz.
-            if final_display_text == "Fiyat bilgisi yok.":
-                final_display_text = "Dahil"
-
-            subscription_text = "\n*" + " & ".join(sorted(subscriptions)) + "*"
-            # Eğer fiyat zaten Dahil ise, tekrar ekleme yapma
-            if "Dahil" in final_display_text:
-                 final_display_text = "*" + " & ".join(sorted(subscriptions)) + "*"
-            else:
-                 final_display_text = (final_display_text + subscription_text).strip()
+            return {"price": final_display_text, "link": link}
+
+        except Exception as e:
+            logging.error(f"XBOX HATA (Genel Fonksiyon Hatası): {e}", exc_info=True)
+            await take_screenshot_on_error(page, "xbox_general_error", game_name_clean, e)
+            await resolution_store.forget(game_name_clean, "xbox")
+            raise StoreUnavailable(f"Xbox: {e}") from e
+
+# --- YENİ: Tarayıcısız Xbox Hızlı Yolu ---
+# Arama ve ürün sayfaları sunucu tarafında __PRELOADED_STATE__ JSON'unu gömüyor. Başlık,
+# fiyat, platform ve abonelik bilgisi buradan okunur; Chromium sadece bu JSON
+# çözümlenemediğinde (sayfa yapısı değiştiğinde) kullanılır.
+XBOX_STORE_BASE = "https://www.xbox.com/tr-TR"
+
+class XboxParseError(Exception):
+    pass
+
+async def fetch_xbox_state(url, params=None, game_name=""):
+    response = await get_http_client("www.xbox.com").get(url, params=params, timeout=budget_seconds(10.0))
+    if response.status_code != 200:
+        raise XboxParseError(f"Xbox sayfası alınamadı. Status: {response.status_code}")
+    soup = BeautifulSoup(response.text, "html.parser", parse_only=SoupStrainer("script"))
+    script = soup.find("script", string=lambda text: text and "__PRELOADED_STATE__" in text)
+    if not script:
+        take_html_on_error(response, "xbox_http", game_name, "__PRELOADED_STATE__ bulunamadı.")
+        raise XboxParseError("__PRELOADED_STATE__ bulunamadı.")
+    try:
+        return parse_xbox_preloaded_state(script.string)
+    except ValueError as e:
+        take_html_on_error(response, "xbox_http", game_name, e)
+        raise XboxParseError(f"__PRELOADED_STATE__ çözümlenemedi: {e}")
+
+def xbox_search_product_ids(preloaded_data):
+    """Returns the product ids of a search page in result order."""
+    core2 = preloaded_data.get("core2", {})
+    product_ids = []
+    for channel in (core2.get("channels", {}).get("channelData", {}) or {}).values():
+        products = ((channel or {}).get("data") or {}).get("products") or []
+        for product in products:
+            product_id = product.get("productId") if isinstance(product, dict) else None
+            if product_id and product_id not in product_ids:
+                product_ids.append(product_id)
+    if not product_ids:
+        product_ids = list(core2.get("products", {}).get("productSummaries", {}).keys())
+    return product_ids
+
+def xbox_summary_price(product_summary):
+    for offer in (product_summary.get("specificPrices") or {}).get("purchaseable", []) or []:
+        list_price = offer.get("listPrice")
+        if isinstance(list_price, (int, float)) and list_price > 0:
+            return f"{list_price:,.2f} ₺".replace(",", "X").replace(".", ",").replace("X", ".")
+    return "Fiyat bilgisi yok."
+
+def xbox_summary_platform(product_summary):
+    available_on = product_summary.get("availableOn") or []
+    has_pc = "PC" in available_on
+    has_xbox = any(platform.startswith("Xbox") for platform in available_on)
+    if has_pc and has_xbox: return "PC & Konsol"
+    if has_xbox: return "Konsol"
+    return None
+
+def xbox_product_link(product_id, title):
+    slug = re.sub(r'[^a-z0-9]+', '-', (title or "").lower()).strip('-') or "game"
+    return f"{XBOX_STORE_BASE}/games/store/{slug}/{product_id}"
+
+async def get_xbox_price_http(game_name_clean):
+    resolved = await resolution_store.get(game_name_clean, "xbox")
+    phases = PhaseTimer("xbox")
+    if resolved:
+        product_id = resolved["store_id"]
+        link = resolved["canonical_url"]
+        preloaded_data = await fetch_xbox_state(link, game_name=game_name_clean)
+        phases.lap("navigate")
+        summaries = preloaded_data.get("core2", {}).get("products", {}).get("productSummaries", {})
+        product_summary = summaries.get(product_id)
+        if not product_summary:
+            raise XboxParseError(f"Ürün sayfasında {product_id} özeti yok.")
+        await resolution_store.touch(game_name_clean, "xbox")
+    else:
+        preloaded_data = await fetch_xbox_state(
+            "/tr-TR/Search/Results", params={"q": game_name_clean}, game_name=game_name_clean
+        )
+        phases.lap("search")
+        summaries = preloaded_data.get("core2", {}).get("products", {}).get("productSummaries", {})
+        if not summaries:
+            raise XboxParseError("Arama sayfasında ürün özeti yok.")
+
+        candidates = [summaries.get(product_id) for product_id in xbox_search_product_ids(preloaded_data)]
+        candidates = [summary for summary in candidates if summary and summary.get("title")]
+        match = best_candidate(game_name_clean, [summary["title"] for summary in candidates], "xbox")
+        phases.lap("match")
+        if not match:
+            # JSON okundu ama eşleşme yok: tarayıcıya düşmeye gerek yok.
+            return None
+        product_summary = candidates[match.index]; highest_score = match.score
+
+        product_id = product_summary.get("productId")
+        if not product_id:
+            raise XboxParseError("Eşleşen ürünün productId alanı yok.")
+        link = xbox_product_link(product_id, product_summary.get("title"))
+        await resolution_store.put(game_name_clean, "xbox", product_id, link, product_summary.get("title"), highest_score)
 
-        await page.close()
-        return {"price": final_display_text, "link": link}
+    price_info = xbox_summary_price(product_summary)
+    platform_info = xbox_summary_platform(product_summary)
+    subscriptions = xbox_subscriptions_from_summary(product_summary)
+    phases.lap("extract")
+    logging.info(f"Xbox fiyatı HTTP yolundan alındı: {price_info} {subscriptions} - {link}")
+    return {"price": format_xbox_display(price_info, platform_info, subscriptions), "link": link}
 
+async def get_xbox_price(game_name_clean):
+    try:
+        return await get_xbox_price_http(game_name_clean)
     except Exception as e:
-        logging.error(f"PLAYSTATION HATA: {e}", exc_info=True)
-        await take_screenshot_on_error(page, "playstation", game_name)
-        if page and not page.is_closed(): await page.close()
+        if api_only_lookup.get():
+            logging.warning(f"Xbox HTTP yolu başarısız, yoğunluk nedeniyle tarayıcı denenmiyor: {e}")
+            # None dönülürse "bulunamadı" olarak önbelleğe yazılır ve normal sorgular da onu görür.
+            raise BrowserSkipped("xbox") from e
+        logging.warning(f"Xbox HTTP yolu başarısız, tarayıcı yöntemine geçiliyor: {e}")
+        return await scrape_with_browser("xbox", game_name_clean)
+
+# --- YENİ: PlayStation Yardımcıları ---
+async def dismiss_playstation_cookie_banner(page):
+    try:
+        # Cookie banner'ını veya diğer pop-up'ları arayıp tıkla
+        cookie_button = page.locator('button:has-text("Accept All Cookies"), button:has-text("Tümünü Kabul Et")')
+        if await cookie_button.count() > 0:
+            logging.debug("Cookie banner'ı bulundu ve tıklandı.")
+            await cookie_button.first.click(timeout=budget_ms(5000))
+            # Tıkladıktan sonra sonuçların yüklenmesi için kısa bir bekleme
+            await page.wait_for_timeout(2000)
+    except Exception:
+        logging.debug("Cookie banner'ı bulunamadı veya tıklanamadı, devam ediliyor.")
+
+def parse_playstation_card_text(card_text):
+    """Extracts the TL price and subscription badges from a PlayStation tile or offer text."""
+    price_info = "Fiyat bilgisi yok."
+    subscriptions = []
+
+    # Fiyatı ara (örn: "1.399,00 TL")
+    price_match = re.search(r'(\d{1,3}(?:\.\d{3})*,\d{2}\s*TL)', card_text)
+    if price_match:
+        price_info = price_match.group(1)
+
+    # Abonelikleri ara
+    if "Extra" in card_text or "Premium" in card_text or "Deluxe" in card_text:
+        subscriptions.append("PS Plus'a Dahil")
+    if "GTA+" in card_text:
+        subscriptions.append("GTA+'a Dahil")
+    if "EA Play" in card_text:
+        subscriptions.append("EA Play'e Dahil")
+
+    return price_info, subscriptions
+
+def format_playstation_display(price_info, subscriptions):
+    final_display_text = price_info
+    if subscriptions:
+        # Eğer bir abonelik varsa ama fiyat bulunamadıysa, fiyat yerine "Dahil" yazabiliriz.
+        if final_display_text == "Fiyat bilgisi yok.":
+            final_display_text = "Dahil"
+
+        subscription_text = "\n*" + " & ".join(sorted(subscriptions)) + "*"
+        # Eğer fiyat zaten Dahil ise, tekrar ekleme yapma
+        if "Dahil" in final_display_text:
+             final_display_text = "*" + " & ".join(sorted(subscriptions)) + "*"
+        else:
+             final_display_text = (final_display_text + subscription_text).strip()
+    return final_display_text
+
+# --- PlayStation Store Fiyat ve Link Alma Fonksiyonu (YENİ: Doğrudan Arama Sonucundan Veri Çekme) ---
+async def get_playstation_price_browser(game_name):
+    pool = await browser_supervisor.pool("playstation")
+    if not pool:
+        logging.warning("PlayStation fiyatı alınamıyor: Tarayıcı bağlı değil.")
         return None
+    async with pool.page() as page:
+        page.set_default_timeout(budget_ms(pool.timeout))
+        page.set_default_navigation_timeout(budget_ms(pool.navigation_timeout))
+        try:
+            resolved = await resolution_store.get(game_name, "playstation")
+            phases = PhaseTimer("playstation_browser")
+            if resolved:
+                # Daha önce çözümlenmiş ürün: arama sayfası yerine doğrudan ürün sayfasındaki teklifi oku
+                link = resolved["canonical_url"]
+                logging.debug(f"PlayStation için kayıtlı ürün sayfasına gidiliyor: {link}")
+                await page.goto(link, wait_until='domcontentloaded')
+                await dismiss_playstation_cookie_banner(page)
+
+                offer_selector = '[data-qa^="mfeCtaMain#offer"]'
+                await page.wait_for_selector(offer_selector, timeout=budget_ms(20000))
+                phases.lap("navigate")
+                final_price = page.locator('[data-qa="mfeCtaMain#offer0#finalPrice"]')
+                offer_texts = await final_price.all_inner_texts() + await page.locator(offer_selector).all_inner_texts()
+                card_text = "\n".join(offer_texts)
+            else:
+                search_url = f"https://store.playstation.com/tr-tr/search/{quote(game_name)}"
+                logging.debug(f"PlayStation için gidiliyor: {search_url}")
+
+                # Olası cookie/pop-up'ları önceden ele almak için bir kerelik bekleme
+                await page.goto(search_url, wait_until='domcontentloaded')
+                await dismiss_playstation_cookie_banner(page)
+
+                results_selector = 'div[data-qa^="search#productTile"]'
+                await page.wait_for_selector(results_selector, timeout=budget_ms(20000))
+                phases.lap("search")
+
+                all_results = await page.locator(results_selector).all()
+                if not all_results:
+                    return None
+
+                # Puanlama ile en iyi eşleşmeyi bulma...
+                candidates = []
+                for result in all_results:
+                    try:
+                        title_element = result.locator('span[data-qa$="product-name"]')
+                        if await title_element.count() == 0: continue
+                        candidates.append((result, await title_element.inner_text()))
+                    except Exception: continue
+
+                match = best_candidate(game_name, [item_name for _, item_name in candidates], "playstation")
+                phases.lap("match")
+                if not match:
+                    return None
+                best_match_element = candidates[match.index][0]
+                best_item_name = match.title; highest_score = match.score
+
+                # --- YENİ MANTIK: Veriyi doğrudan bulunan karttan çek ---
+                # Kartın içindeki metnin tamamını al
+                card_text = await best_match_element.inner_text()
+
+                # Link'i al
+                link_element = best_match_element.locator('a.psw-link').first
+                href = await link_element.get_attribute('href')
+                link = "https://store.playstation.com" + href
+
+                store_id = href.rstrip('/').split('/')[-1]
+                await resolution_store.put(game_name, "playstation", store_id, link, best_item_name, highest_score)
+
+            price_info, subscriptions = parse_playstation_card_text(card_text)
+            phases.lap("extract")
+
+            if resolved:
+                if price_info == "Fiyat bilgisi yok." and not subscriptions:
+                    await resolution_store.forget(game_name, "playstation")
+                else:
+                    await resolution_store.touch(game_name, "playstation")
 
-# YENİ: Hata anında HTML ve ekran görüntüsü kaydetme
-async def take_html_on_error(response, platform_name, game_name):
-    if not os.path.exists('debug_output'):
-        os.makedirs('debug_output')
-    try:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        safe_game_name = re.sub(r'[^\w-]', '_', game_name)
-        html_path = f"debug_output/error_{platform_name}_{safe_game_name}_{timestamp}.html"
+            # Sonuçları Birleştir
+            return {"price": format_playstation_display(price_info, subscriptions), "link": link}
 
-        with open(html_path, "w", encoding="utf-8") as f:
-            f.write(response.text)
-        logging.info(f"Hata anındaki sayfa HTML'i kaydedildi: {html_path}")
+        except Exception as e:
+            logging.error(f"PLAYSTATION HATA: {e}", exc_info=True)
+            await take_screenshot_on_error(page, "playstation", game_name, e)
+            await resolution_store.forget(game_name, "playstation")
+            raise StoreUnavailable(f"PlayStation: {e}") from e
+
+# --- YENİ: Tarayıcısız PlayStation Store Hızlı Yolu ---
+# Arama ve ürün sayfaları sunucu tarafında render edilip Apollo önbelleğini
+# <script type="application/json"> blokları olarak gömüyor. Ürün adları, fiyatlar ve
+# abonelik etiketleri buradan okunur; Playwright sadece bu veri çözümlenemezse kullanılır.
+PS_STORE_BASE = "https://store.playstation.com"
+PS_ENTITY_TYPES = ("Product", "Concept")
+
+class PlayStationParseError(Exception):
+    pass
+
+def iter_json_dicts(node):
+    """Yields every dict inside a decoded JSON document in document order."""
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, dict):
+            yield current
+            stack.extend(reversed(list(current.values())))
+        elif isinstance(current, list):
+            stack.extend(reversed(current))
+
+def extract_playstation_entities(blobs):
+    # Apollo referanslarını ({"__ref": "Price:..."}) çözebilmek için önce tüm normalize kayıtları topla
+    refs = {}
+    for blob in blobs:
+        for node in iter_json_dicts(blob):
+            for key, value in node.items():
+                if isinstance(value, dict) and "__typename" in value and ":" in key:
+                    refs[key] = value
+
+    def resolve(value):
+        if isinstance(value, dict) and set(value) == {"__ref"}:
+            return refs.get(value["__ref"], {})
+        return value or {}
+
+    entities = []; seen = set()
+    for blob in blobs:
+        for node in iter_json_dicts(blob):
+            if node.get("__typename") not in PS_ENTITY_TYPES or not node.get("name") or not node.get("id"):
+                continue
+            entity_key = (node["__typename"], node["id"])
+            if entity_key in seen: continue
+            seen.add(entity_key)
+            entities.append({
+                "type": node["__typename"],
+                "id": node["id"],
+                "name": node["name"],
+                "price": resolve(node.get("price")),
+            })
+    return entities
+
+def playstation_entity_text(entity):
+    """Builds the same kind of text a search tile shows, so parse_playstation_card_text can be reused."""
+    price = entity.get("price") or {}
+    parts = [price.get("discountedPrice"), price.get("basePrice"), price.get("upsellText"), price.get("discountText")]
+    brandings = set(price.get("serviceBranding") or []) | set(price.get("upsellServiceBranding") or [])
+    if "EA_ACCESS" in brandings: parts.append("EA Play")
+    if "GTA_PLUS" in brandings: parts.append("GTA+")
+    return "\n".join(str(part) for part in parts if part)
+
+def playstation_entity_link(entity):
+    kind = "concept" if entity["type"] == "Concept" else "product"
+    return f"{PS_STORE_BASE}/tr-tr/{kind}/{entity['id']}"
+
+async def fetch_playstation_entities(url, game_name):
+    response = await get_http_client("store.playstation.com").get(url, timeout=budget_seconds(15.0))
+    if response.status_code != 200:
+        raise PlayStationParseError(f"PlayStation sayfası alınamadı. Status: {response.status_code}")
+    soup = BeautifulSoup(response.text, "html.parser", parse_only=SoupStrainer("script", type="application/json"))
+    blobs = []
+    for script in soup.find_all("script"):
+        try:
+            blobs.append(json.loads(script.string or ""))
+        except ValueError:
+            continue
+    entities = extract_playstation_entities(blobs)
+    if not entities:
+        take_html_on_error(response, "playstation_http", game_name, "Gömülü JSON'da ürün bulunamadı.")
+        raise PlayStationParseError("Gömülü JSON'da ürün bulunamadı.")
+    return entities
+
+async def get_playstation_price_http(game_name):
+    resolved = await resolution_store.get(game_name, "playstation")
+    phases = PhaseTimer("playstation")
+    if resolved:
+        link = resolved["canonical_url"]
+        entities = await fetch_playstation_entities(link, game_name)
+        phases.lap("navigate")
+        best_entity = next((e for e in entities if e["id"] == resolved["store_id"]), None)
+        if not best_entity:
+            raise PlayStationParseError(f"Ürün sayfasında {resolved['store_id']} bulunamadı.")
+    else:
+        entities = await fetch_playstation_entities(f"/tr-tr/search/{quote(game_name)}", game_name)
+        phases.lap("search")
+
+        match = best_candidate(game_name, [entity["name"] for entity in entities], "playstation")
+        phases.lap("match")
+        if not match:
+            # JSON okundu ama eşleşme yok: tarayıcıya düşmeye gerek yok.
+            return None
+        best_entity = entities[match.index]; highest_score = match.score
+
+        link = playstation_entity_link(best_entity)
+        await resolution_store.put(game_name, "playstation", best_entity["id"], link, best_entity["name"], highest_score)
+
+    price_info, subscriptions = parse_playstation_card_text(playstation_entity_text(best_entity))
+    phases.lap("extract")
+    if resolved:
+        if price_info == "Fiyat bilgisi yok." and not subscriptions:
+            raise PlayStationParseError("Kayıtlı ürün için fiyat okunamadı.")
+        await resolution_store.touch(game_name, "playstation")
+    logging.info(f"PlayStation fiyatı HTTP yolundan alındı: {price_info} {subscriptions} - {link}")
+    return {"price": format_playstation_display(price_info, subscriptions), "link": link}
+
+async def get_playstation_price(game_name):
+    try:
+        return await get_playstation_price_http(game_name)
     except Exception as e:
-        logging.error(f"Hata ayıklama HTML'i kaydedilirken sorun oluştu: {e}")
+        if api_only_lookup.get():
+            logging.warning(f"PlayStation HTTP yolu başarısız, yoğunluk nedeniyle tarayıcı denenmiyor: {e}")
+            # None dönülürse "bulunamadı" olarak önbelleğe yazılır ve normal sorgular da onu görür.
+            raise BrowserSkipped("playstation") from e
+        logging.warning(f"PlayStation HTTP yolu başarısız, tarayıcı yöntemine geçiliyor: {e}")
+        return await scrape_with_browser("playstation", game_name)
+
+# --- YENİ: Tarayıcı İşlerinin Yönlendirilmesi ---
+# BROWSER_WORKERS > 0 ise scrape'ler ayrı işçi süreçlerinde çalışır (bkz. browser_workers.py);
+# aksi halde bu süreçteki tarayıcı ve sayfa havuzları kullanılır.
+BROWSER_SCRAPERS = {
+    "xbox": get_xbox_price_browser,
+    "playstation": get_playstation_price_browser,
+}
+browser_worker_pool = None
+
+async def scrape_with_browser(store, game_name):
+    if browser_worker_pool and browser_worker_pool.handles(store):
+        try:
+            return await browser_worker_pool.run(
+                store, game_name, budget_seconds(QUERY_DEADLINE_SECONDS), log_pipeline.current_context()
+            )
+        except (browser_workers.WorkerCrashed, browser_workers.WorkerJobFailed, asyncio.TimeoutError) as e:
+            logging.error(f"{store} tarayıcı işi başarısız: {e}")
+            raise StoreUnavailable(f"{store}: {e}") from e
+    return await BROWSER_SCRAPERS[store](game_name)
+
+async def start_browser_workers():
+    global browser_worker_pool
+    if browser_worker_pool is None:
+        browser_worker_pool = browser_workers.BrowserWorkerPool(list(BROWSER_SCRAPERS))
+        await browser_worker_pool.start()
+
+# YENİ: Hata anında HTML ve ekran görüntüsü kaydetme
+def take_html_on_error(response, platform_name, game_name, error=None):
+    artifact_store.capture_response(response, platform_name, game_name, error)
 
 # KODDAN ÇIKARILACAK FONKSİYONLAR
 # --- GÜNCELLENMİŞ: Xbox Fiyat ve Platform Fonksiyonu ---
@@ -521,34 +1752,142 @@ async def take_html_on_error(response, platform_name, game_name):
 
 # --- GÜNCELLENMİŞ: IsThereAnyDeal (ITAD) API Fonksiyonları ---
 
+# --- YENİ: ITAD Toplu İstek (micro-batching) Dağıtıcısı ---
+# prices/v3, subs/v1 ve storelow/v2 uç noktaları bir oyun ID dizisi alıyor. Eşzamanlı
+# sorgulardan gelen ID'ler kısa bir pencere boyunca toplanır, her uç nokta için tek istek
+# gönderilir ve cevap ID'ye göre bekleyen çağırıcılara dağıtılır.
+ITAD_BATCH_WINDOW = float(os.environ.get("ITAD_BATCH_WINDOW_MS", 50)) / 1000
+ITAD_BATCH_MAX_SIZE = int(os.environ.get("ITAD_BATCH_MAX_SIZE", 100))
+
+class ItadBatchError(Exception):
+    def __init__(self, status_code, body, headers=None):
+        super().__init__(f"ITAD status {status_code}")
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+
+async def post_itad_batch(path, params, game_ids, timeout=20):
+    """Posts a list of game ids to an ITAD endpoint and returns the response entries keyed by id."""
+    async with store_semaphores["itad"]:
+        phases = PhaseTimer("itad")
+        response = await get_http_client("api.isthereanydeal.com").post(
+            path, params={"key": ITAD_API_KEY, **params}, json=list(game_ids), timeout=timeout
+        )
+    phases.lap(path.strip("/").split("/")[1])  # /games/prices/v3 -> prices
+    if response.status_code != 200:
+        raise ItadBatchError(response.status_code, response.text, response.headers)
+    return {entry.get("id"): entry for entry in response.json() or [] if isinstance(entry, dict)}
+
+class ItadBatcher:
+    """Coalesces game ids from concurrent callers into one request per ITAD endpoint."""
+
+    def __init__(self, path, params, window=ITAD_BATCH_WINDOW, max_size=ITAD_BATCH_MAX_SIZE):
+        self.path = path
+        self.params = params
+        self.window = window
+        self.max_size = max_size
+        self._pending = {}  # game_id -> [Future, ...]
+        self._timer = None
+        self._background_tasks = set()
+
+    async def fetch(self, game_id):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(game_id, []).append(future)
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            task = asyncio.create_task(self._send(batch))
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
+
+    async def _send(self, batch):
+        try:
+            entries = await post_itad_batch(self.path, self.params, batch.keys())
+            if len(batch) > 1:
+                logging.info(f"ITAD {self.path} için {len(batch)} oyun tek istekte sorgulandı.")
+        except Exception as e:
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done(): future.set_exception(e)
+            return
+        for game_id, futures in batch.items():
+            for future in futures:
+                if not future.done(): future.set_result(entries.get(game_id))
+
+itad_batchers = {}
+
+def get_itad_batcher(path, params):
+    key = (path, tuple(sorted(params.items())))
+    if key not in itad_batchers:
+        itad_batchers[key] = ItadBatcher(path, params)
+    return itad_batchers[key]
+
 # BU FONKSİYONU EKLEYİN
 async def get_itad_game_id(game_name):
     if not ITAD_API_KEY:
         logging.error("ITAD API anahtarı bulunamadı.")
         return None
     try:
-        search_url = f"https://api.isthereanydeal.com/games/search/v1?key={ITAD_API_KEY}&title={requests.utils.quote(game_name)}"
-        response = await asyncio.to_thread(requests.get, search_url)
+        query_key = clean_game_name(game_name)
+        resolved = await resolution_store.get(query_key, "itad")
+        if resolved:
+            return resolved["store_id"]
+
+        async with store_semaphores["itad"]:
+            phases = PhaseTimer("itad")
+            response = await hedged_get(
+                "api.isthereanydeal.com", "/games/search/v1", "itad_search",
+                params={"key": ITAD_API_KEY, "title": game_name},
+                timeout=20.0,
+            )
+        phases.lap("search")
         if response.status_code == 200:
-            results = response.json()
+            results = [result for result in response.json() or [] if isinstance(result, dict) and result.get('id')]
             if results:
-                # Genellikle ilk sonuç en doğrusudur.
+                # Diğer mağazalarla aynı puanlama; sadece güvenilir eşleşme kalıcı olarak kaydedilir.
+                match = best_candidate(query_key, [result.get('title', '') for result in results], "steam")
+                if match and match.score >= RESOLUTION_MIN_CONFIDENCE:
+                    best = results[match.index]
+                    await resolution_store.put(
+                        query_key, "itad", best['id'], f"https://isthereanydeal.com/game/{best.get('slug', '')}/",
+                        best.get('title'), match.score
+                    )
+                    return best['id']
+                # Zayıf eşleşme: ITAD'ın ilk sonucu kullanılır ama bir sonraki sorguda tekrar aranır.
+                logging.info(f"ITAD'da '{game_name}' için güvenilir eşleşme yok, ilk sonuç kaydedilmeden kullanılıyor: {results[0].get('title')}")
                 return results[0]['id']
-        logging.warning(f"ITAD'da '{game_name}' için oyun ID'si bulunamadı. Status Code: {response.status_code}")
-        return None
+            logging.warning(f"ITAD'da '{game_name}' için oyun ID'si bulunamadı.")
+            return None
+        logging.warning(f"ITAD oyun araması başarısız oldu. Status Code: {response.status_code}, Game: {game_name}")
+        raise StoreUnavailable(f"ITAD search HTTP {response.status_code}")
+    except StoreUnavailable:
+        raise
     except Exception as e:
         logging.error(f"ITAD OYUN ID ALMA HATA: {e}", exc_info=True)
-        return None
+        raise StoreUnavailable(f"ITAD search: {e}") from e
 
 # YENİ: Ana mağazalar dışındaki tüm CD-Key satıcılarının ID'lerini dinamik olarak alır.
 async def get_itad_shop_ids():
     if not ITAD_API_KEY:
         return ""
     try:
-        shops_url = f"https://api.isthereanydeal.com/service/shops/v1?key={ITAD_API_KEY}"
-        response = await asyncio.to_thread(requests.get, shops_url)
+        async with store_semaphores["itad"]:
+            phases = PhaseTimer("itad")
+            response = await get_http_client("api.isthereanydeal.com").get(
+                "/service/shops/v1", params={"key": ITAD_API_KEY}
+            )
+        phases.lap("shops")
         if response.status_code != 200:
-            return ""
+            raise StoreUnavailable(f"ITAD shops HTTP {response.status_code}")
 
         all_shops = response.json()
         # DEĞİŞİKLİK: CD-Key sitelerini hariç tutma filtresi kaldırıldı.
@@ -559,34 +1898,35 @@ async def get_itad_shop_ids():
         cdkey_shop_ids = [str(shop['id']) for shop in all_shops if shop['title'] not in excluded_shops]
 
         return ",".join(cdkey_shop_ids)
+    except StoreUnavailable:
+        raise
     except Exception as e:
         logging.error(f"ITAD Mağaza ID'leri alınırken hata: {e}")
-        return "" # Hata durumunda boş string dön, böylece program çökmez
+        raise StoreUnavailable(f"ITAD shops: {e}") from e
 
 async def get_itad_subscriptions(game_id):
     if not ITAD_API_KEY or not game_id:
         return []
 
     try:
-        url = f"https://api.isthereanydeal.com/games/subs/v1?key={ITAD_API_KEY}&country=TR"
-        payload = [game_id]
-        response = await asyncio.to_thread(requests.post, url, json=payload)
-
-        if response.status_code != 200:
-            logging.warning(f"ITAD abonelik bilgisi alınamadı. Status: {response.status_code}, Game ID: {game_id}")
-            return []
+        try:
+            game_data = await get_itad_batcher("/games/subs/v1", {"country": "TR"}).fetch(game_id)
+        except ItadBatchError as e:
+            logging.warning(f"ITAD abonelik bilgisi alınamadı. Status: {e.status_code}, Game ID: {game_id}")
+            raise StoreUnavailable(str(e)) from e
 
-        data = response.json()
-        if not data or not data[0].get('subs'):
+        if not game_data or not game_data.get('subs'):
             return []
 
-        subscription_names = [sub['name'] for sub in data[0]['subs']]
-        logging.info(f"ITAD'dan bulunan abonelikler: {subscription_names} (Game ID: {game_id})")
+        subscription_names = [sub['name'] for sub in game_data['subs']]
+        logging.debug(f"ITAD'dan bulunan abonelikler: {subscription_names} (Game ID: {game_id})")
         return subscription_names
 
+    except StoreUnavailable:
+        raise
     except Exception as e:
         logging.error(f"ITAD Abonelik Alma Hatası: {e}", exc_info=True)
-        return []
+        raise StoreUnavailable(f"ITAD subs: {e}") from e
 
 # GÜNCELLENDİ: Artık DRM bilgisini de alıyor ve detaylı loglama yapıyor.
 async def get_itad_prices(game_id, cdkey_shop_ids):
@@ -598,24 +1938,20 @@ async def get_itad_prices(game_id, cdkey_shop_ids):
     all_shop_ids_to_check = "48,16," + cdkey_shop_ids
 
     try:
-        prices_url = f"https://api.isthereanydeal.com/games/prices/v3?key={ITAD_API_KEY}&country=TR&shops={all_shop_ids_to_check}"
-        payload = [game_id]
-
-        logging.info(f"ITAD Fiyat Sorgusu Başlatıldı. ID: {game_id}, Shops: {all_shop_ids_to_check}")
-
-        response = await asyncio.to_thread(requests.post, prices_url, json=payload, timeout=20)
-
-        if response.status_code != 200:
-            logging.error(f"ITAD fiyat bilgisi alınamadı. Status: {response.status_code}, Ham Cevap: {response.text}")
-            return None
-
-        data = response.json()
+        logging.debug(f"ITAD Fiyat Sorgusu Başlatıldı. ID: {game_id}, Shops: {all_shop_ids_to_check}")
 
-        if not data or not data[0]:
+        try:
+            game_data = await get_itad_batcher(
+                "/games/prices/v3", {"country": "TR", "shops": all_shop_ids_to_check}
+            ).fetch(game_id)
+        except ItadBatchError as e:
+            logging.error(f"ITAD fiyat bilgisi alınamadı. Status: {e.status_code}, Ham Cevap: {log_pipeline.truncate(e.body, 300)}")
+            raise StoreUnavailable(str(e)) from e
+
+        if not game_data:
             logging.warning(f"ITAD'dan beklenen veri gelmedi. Game ID: {game_id}")
             return None
 
-        game_data = data[0]
         deals = game_data.get('deals', [])
         current_prices = game_data.get('current', [])
 
@@ -644,7 +1980,7 @@ async def get_itad_prices(game_id, cdkey_shop_ids):
                 epic_result = {"price": formatted_price, "link": link, "shop": shop_name}
             elif shop_id == 48 and not xbox_result: # ID 48 kullanılıyor
                 xbox_result = {"price": formatted_price, "link": link, "shop": shop_name}
-                logging.info(f"✅ ITAD Xbox Fiyatı (Deals) Bulundu: {formatted_price} - {link}")
+                logging.debug(f"✅ ITAD Xbox Fiyatı (Deals) Bulundu: {formatted_price} - {link}")
             else:
                 if price_amount < lowest_cdkey_price:
                     lowest_cdkey_price = price_amount
@@ -669,7 +2005,7 @@ async def get_itad_prices(game_id, cdkey_shop_ids):
                     epic_result = {"price": formatted_price, "link": link, "shop": shop_name}
                 elif shop_id == 48 and not xbox_result: # ID 48 kullanılıyor
                     xbox_result = {"price": formatted_price, "link": link, "shop": shop_name}
-                    logging.info(f"✅ ITAD Xbox Fiyatı (Current) Bulundu: {formatted_price} - {link}")
+                    logging.debug(f"✅ ITAD Xbox Fiyatı (Current) Bulundu: {formatted_price} - {link}")
 
         if not xbox_result:
             logging.warning(f"ITAD'da Microsoft Store (ID 48) için ne indirimli ne de güncel fiyat bulunamadı. Oyun ID: {game_id}")
@@ -679,9 +2015,11 @@ async def get_itad_prices(game_id, cdkey_shop_ids):
 
         return {"epic": epic_result, "xbox": xbox_result, "cdkey": best_cdkey_result}
 
+    except StoreUnavailable:
+        raise
     except Exception as e:
         logging.error(f"ITAD FİYAT ALMA KRİTİK HATA: {e}", exc_info=True)
-        return None
+        raise StoreUnavailable(f"ITAD prices: {e}") from e
 
 # YENİ: Belirtilen mağazalar için tarihi en düşük fiyatları alır.
 async def get_historical_lows(game_id):
@@ -692,20 +2030,20 @@ async def get_historical_lows(game_id):
     shop_ids_for_lows = "61,16,48"
 
     try:
-        url = f"https://api.isthereanydeal.com/games/storelow/v2?key={ITAD_API_KEY}&country=TR&shops={shop_ids_for_lows}"
-        payload = [game_id]
-        response = await asyncio.to_thread(requests.post, url, json=payload)
-
-        if response.status_code != 200:
-            return {}
-
-        data = response.json()
-        if not data or not data[0].get('lows'):
+        try:
+            game_data = await get_itad_batcher(
+                "/games/storelow/v2", {"country": "TR", "shops": shop_ids_for_lows}
+            ).fetch(game_id)
+        except ItadBatchError as e:
+            logging.warning(f"ITAD tarihi en düşük fiyatları alınamadı. Status: {e.status_code}, Game ID: {game_id}")
+            raise StoreUnavailable(str(e)) from e
+
+        if not game_data or not game_data.get('lows'):
             return {}
 
         # Sonuçları mağaza ID'sine göre map'leyelim
         historical_lows = {}
-        for low in data[0]['lows']:
+        for low in game_data['lows']:
             shop_id = low.get('shop', {}).get('id')
             price_info = low.get('price')
             if shop_id and price_info:
@@ -716,24 +2054,1295 @@ async def get_historical_lows(game_id):
 
         return historical_lows
 
+    except StoreUnavailable:
+        raise
     except Exception as e:
         logging.error(f"ITAD Tarihi Düşük Fiyat Alma Hatası: {e}", exc_info=True)
-        return {}
+        raise StoreUnavailable(f"ITAD storelow: {e}") from e
+
+# --- YENİ: Önbelleğe Alınabilir Sorgu Yardımcıları ---
+async def get_best_steam_result(oyun_adi_orjinal, oyun_adi_temiz):
+    # Yerel indeks temizlenmiş adı çözebiliyorsa tek bir appdetails çağrısı yeterli
+    indexed = lookup_steam_title_index(oyun_adi_temiz)
+    if indexed:
+        steam_sonucu = await get_steam_price(oyun_adi_temiz, indexed)
+        if isinstance(steam_sonucu, dict) and steam_sonucu.get("name"):
+            return steam_sonucu
+    # Orijinal (temizlenmemiş) ve temizlenmiş adla Steam'i aynı anda sorgula
+    steam_sonucu_orjinal, steam_sonucu_temiz = await asyncio.gather(
+        get_steam_price(oyun_adi_orjinal), get_steam_price(oyun_adi_temiz), return_exceptions=True
+    )
+
+    # En iyi Steam sonucunu belirle
+    if isinstance(steam_sonucu_orjinal, dict) and steam_sonucu_orjinal.get("name"):
+        # Orijinal isimle bir sonuç bulunduysa bunu kullan
+        return steam_sonucu_orjinal
+    if isinstance(steam_sonucu_temiz, dict) and steam_sonucu_temiz.get("name"):
+        # Orijinal isimle bulunamadıysa temizlenmiş olanı kullan
+        return steam_sonucu_temiz
+    # İkisi de sonuçsuz: en az biri mağaza hatasıysa "bulunamadı" denemez
+    for sonuc in (steam_sonucu_orjinal, steam_sonucu_temiz):
+        if isinstance(sonuc, BaseException):
+            raise sonuc
+    return None
+
+async def get_cached_itad_game_id(game_name):
+    return await price_cache.get_or_fetch("itad_id", clean_game_name(game_name), lambda: get_itad_game_id(game_name))
+
+# --- YENİ: Bağımlılık Grafı Zamanlayıcısı ---
+# Sorgu aşamaları isimli düğümler olarak tanımlanır; her düğüm bağımlı olduğu düğümler
+# biter bitmez başlar. Böylece toplam süre aşamaların toplamı değil en uzun yol olur.
+class LookupGraph:
+    """Runs named async stages as soon as the stages they depend on have finished."""
+
+    def __init__(self, deadline=None):
+        self.deadline = deadline
+        self.timed_out = set()
+        self.timings = {}  # name -> aşamanın kendi çalışma süresi (bağımlılık beklemesi hariç)
+        self._stages = {}  # name -> (deps, fn, share)
+        self._tasks = {}
+        self._listeners = []
+
+    def add(self, name, fn, deps=(), share=1.0):
+        # share: aşama başladığında kalan süre bütçesinin ne kadarını kullanabileceği
+        self._stages[name] = (tuple(deps), fn, share)
+
+    def on_stage_done(self, callback):
+        self._listeners.append(callback)
+
+    def task(self, name):
+        if name not in self._tasks:
+            deps, fn, share = self._stages[name]
+            dep_tasks = [self.task(dep) for dep in deps]
+            self._tasks[name] = asyncio.create_task(self._run(name, dep_tasks, fn, share))
+        return self._tasks[name]
+
+    async def _run(self, name, dep_tasks, fn, share):
+        # Her aşama kendi görevinde çalışır; bu görevdeki tüm loglar stage alanını taşır.
+        log_pipeline.stage_var.set(name)
+        dep_results = await asyncio.gather(*dep_tasks)
+        timed_out = False
+        started = time.monotonic()
+        try:
+            timeout = self.deadline.remaining() * share if self.deadline else None
+            result = await asyncio.wait_for(fn(*dep_results), timeout=timeout)
+        except asyncio.TimeoutError:
+            # Süresi dolan aşama iptal edilir (sayfası havuza döner), sorgu kısmi sonuçla biter.
+            logging.warning(f"Sorgu aşaması '{name}' süre bütçesini aştı, iptal edildi.")
+            LOOKUP_STAGE_TIMEOUTS.inc(stage=name)
+            self.timed_out.add(name)
+            timed_out = True
+            result = None
+        except StoreUnavailable as e:
+            # Mağaza hatası fetcher'da zaten loglandı; sonuç "yok" sayılır ama önbelleğe yazılmadı.
+            logging.warning(f"Sorgu aşaması '{name}' mağazaya ulaşamadı: {e}")
+            LOOKUP_STAGE_ERRORS.inc(stage=name)
+            result = None
+        except Exception as e:
+            # Bir aşamanın hatası ona bağlı aşamaları durdurmasın, sonuç "yok" sayılır.
+            logging.error(f"Sorgu aşaması '{name}' hata verdi: {e}", exc_info=True)
+            LOOKUP_STAGE_ERRORS.inc(stage=name)
+            result = None
+        self.timings[name] = time.monotonic() - started
+        LOOKUP_STAGE_SECONDS.observe(self.timings[name], stage=name)
+        for callback in self._listeners:
+            try:
+                callback(name, result, timed_out)
+            except Exception as e:
+                logging.error(f"Aşama dinleyicisi hata verdi ({name}): {e}", exc_info=True)
+        return result
+
+    async def run(self):
+        names = list(self._stages)
+        try:
+            results = await asyncio.gather(*(self.task(name) for name in names))
+        finally:
+            self.cancel()
+        return dict(zip(names, results))
+
+    def cancel(self):
+        for task in self._tasks.values():
+            if not task.done():
+                task.cancel()
+
+async def race_xbox_sources(itad_prices_task, scrape_coro):
+    """Runs the Xbox scrape speculatively next to the ITAD prices call and keeps the first usable result."""
+    scrape_task = asyncio.create_task(scrape_coro)
+    pending = {itad_prices_task, scrape_task}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            if itad_prices_task in done:
+                itad_all_prices = itad_prices_task.result()
+                if isinstance(itad_all_prices, dict) and itad_all_prices.get("xbox"):
+                    logging.info("Xbox fiyatı ITAD'dan geldi, paralel tarama iptal ediliyor.")
+                    return itad_all_prices["xbox"]
+                logging.info("ITAD'dan Xbox fiyatı alınamadı, yedek yöntemin sonucu bekleniyor.")
+            if scrape_task in done:
+                xbox_yedek_sonuc = None if scrape_task.exception() else scrape_task.result()
+                if xbox_yedek_sonuc:
+                    logging.info("✅ Yedek yöntemle Xbox fiyatı başarıyla alındı.")
+                    return xbox_yedek_sonuc
+                if scrape_task.exception() and not isinstance(scrape_task.exception(), BrowserSkipped):
+                    logging.error(f"Xbox yedek yöntemi çalışırken hata oluştu: {scrape_task.exception()}")
+        logging.warning("❌ Yedek yöntem de Xbox fiyatı bulamadı.")
+        return None
+    finally:
+        # ITAD görevi grafın kendisine ait (Epic/CD-Key için de lazım); sadece tarama iptal edilir.
+        if not scrape_task.done():
+            scrape_task.cancel()
+
+# --- YENİ: Fiyat Sorgu Hattı ---
+# on_message'dan ayrıldı; böylece aynı sorgu birden fazla kullanıcı arasında paylaşılabilir.
+async def lookup_prices(oyun_adi_orjinal, progress=None, api_only=False):
+    oyun_adi_temiz = clean_game_name(oyun_adi_orjinal)
+    logging.info(f"Fiyat sorgusu başlatıldı: '{oyun_adi_orjinal}' (Temizlenmiş: '{oyun_adi_temiz}')")
+
+    query_started = time.monotonic()
+    deadline = Deadline(QUERY_DEADLINE_SECONDS)
+    # Bu görevden türeyen tüm aşamalar ve mağaza çağrıları aynı bitiş zamanını görür.
+    current_deadline.set(deadline)
+    api_only_lookup.set(api_only)
+    graph = LookupGraph(deadline)
+    if progress:
+        graph.on_stage_done(progress.stage_done)
+
+    async def steam_stage():
+        return await price_cache.get_or_fetch(
+            "steam", oyun_adi_temiz, lambda: run_limited("steam", get_best_steam_result(oyun_adi_orjinal, oyun_adi_temiz))
+        )
+
+    async def names_stage(steam_sonucu):
+        # Diğer API'ler için referans adı belirle
+        if isinstance(steam_sonucu, dict) and steam_sonucu.get("name"):
+            return steam_sonucu['name'], clean_game_name(steam_sonucu['name'])
+        return oyun_adi_orjinal, oyun_adi_temiz
+
+    async def itad_id_original_stage():
+        # Adım 1: Orijinal oyun adıyla ITAD ID'sini almaya çalış (Steam'i beklemeye gerek yok)
+        return await get_cached_itad_game_id(oyun_adi_orjinal)
+
+    async def itad_id_stage(itad_game_id, names):
+        # Adım 2: Eğer orijinal adla ID bulunamadıysa, referans adla tekrar dene
+        if not itad_game_id:
+            itad_game_id = await get_cached_itad_game_id(names[1])
+        if not itad_game_id:
+            logging.warning("ITAD ID bulunamadığı için ilgili görevler başlatılmadı.")
+        return itad_game_id
+
+    async def shops_stage():
+        return await price_cache.get_or_fetch("itad_shops", "all", get_itad_shop_ids)
+
+    async def ps_stage(names):
+        try:
+            return await price_cache.get_or_fetch(
+                "playstation", names[1], lambda: run_limited("playstation", get_playstation_price(names[1]))
+            )
+        except BrowserSkipped:
+            return None
+
+    async def itad_prices_stage(itad_game_id, cdkey_shop_ids):
+        if not itad_game_id: return None
+        return await price_cache.get_or_fetch(
+            "itad_prices", itad_game_id, lambda: get_itad_prices(itad_game_id, cdkey_shop_ids or "")
+        )
+
+    async def lows_stage(itad_game_id):
+        if not itad_game_id: return {}
+        return await price_cache.get_or_fetch("itad_lows", itad_game_id, lambda: get_historical_lows(itad_game_id))
+
+    async def subs_stage(itad_game_id):
+        if not itad_game_id: return []
+        return await price_cache.get_or_fetch("itad_subs", itad_game_id, lambda: get_itad_subscriptions(itad_game_id))
+
+    async def xbox_stage(names):
+        return await race_xbox_sources(
+            graph.task("itad_prices"),
+            price_cache.get_or_fetch("xbox", names[1], lambda: run_limited("xbox", get_xbox_price(names[1]))),
+        )
+
+    # Konsol mağazaları Steam'den gelen referans adı beklediği için Steam ve ITAD ID
+    # aşamaları bütçenin yarısıyla sınırlandı; kalan süre sonraki aşamalara kalır.
+    graph.add("steam", steam_stage, share=0.5)
+    graph.add("names", names_stage, deps=["steam"])
+    graph.add("itad_id_original", itad_id_original_stage, share=0.5)
+    graph.add("itad_id", itad_id_stage, deps=["itad_id_original", "names"])
+    graph.add("itad_shops", shops_stage)
+    graph.add("ps", ps_stage, deps=["names"])
+    graph.add("itad_prices", itad_prices_stage, deps=["itad_id", "itad_shops"])
+    graph.add("historical_lows", lows_stage, deps=["itad_id"])
+    graph.add("itad_subscriptions", subs_stage, deps=["itad_id"])
+    graph.add("xbox", xbox_stage, deps=["names"])
+
+    results = await graph.run()
+    QUERY_SECONDS.observe(time.monotonic() - query_started)
+    logging.debug("Aşama süreleri: " + ", ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in graph.timings.items()))
+
+    display_game_name = results["names"][0] if results["names"] else oyun_adi_orjinal
+    itad_all_prices = results["itad_prices"] if isinstance(results["itad_prices"], dict) else {}
+    sonuclar = {
+        "steam": results["steam"],
+        "ps": results["ps"],
+        "xbox": results["xbox"],
+        "epic": itad_all_prices.get("epic"),
+        "cdkey": itad_all_prices.get("cdkey"),
+        "historical_lows": results["historical_lows"] or {},
+        "itad_subscriptions": results["itad_subscriptions"] or [],
+        "timed_out": timed_out_fields(graph.timed_out),
+        "api_only": api_only,
+    }
+    return display_game_name, sonuclar
+
+# --- YENİ: Aşamalı Embed Güncellemesi ---
+# Her mağaza alanı sonucu gelir gelmez gösterilir, bekleyenler "kontrol ediliyor" yazar.
+# Düzenlemeler EMBED_EDIT_MIN_INTERVAL aralığıyla birleştirilerek Discord'un mesaj
+# düzenleme limitlerinin altında kalınır.
+CHECKING_TEXT = "*Kontrol ediliyor…*"
+TIMED_OUT_TEXT = "*Mağaza zamanında yanıt vermedi.*"
+EMBED_EDIT_MIN_INTERVAL = float(os.environ.get("EMBED_EDIT_MIN_INTERVAL", 1.0))
+EMBED_FIELDS_BY_STAGE = {
+    "steam": ("steam",),
+    "ps": ("ps",),
+    "xbox": ("xbox",),
+    "itad_prices": ("epic", "cdkey"),
+}
+
+def timed_out_fields(stage_names):
+    return {field for stage in stage_names for field in EMBED_FIELDS_BY_STAGE.get(stage, ())}
+
+class LookupProgress:
+    """Partial results of one running lookup, fanned out to every message waiting on it."""
+
+    def __init__(self, display_game_name):
+        self.display_game_name = display_game_name
+        self.sonuclar = {"historical_lows": {}, "itad_subscriptions": [], "timed_out": set()}
+        self.pending = {"steam", "xbox", "ps", "epic", "cdkey"}
+        self._listeners = []
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+        listener(self.snapshot())
+
+    def snapshot(self):
+        sonuclar = dict(self.sonuclar)
+        sonuclar["timed_out"] = set(sonuclar["timed_out"])
+        return self.display_game_name, sonuclar, set(self.pending)
+
+    def stage_done(self, name, result, timed_out=False):
+        if timed_out:
+            self.sonuclar["timed_out"] |= timed_out_fields([name])
+        if name == "names":
+            if result: self.display_game_name = result[0]
+        elif name == "itad_prices":
+            itad_all_prices = result if isinstance(result, dict) else {}
+            self.sonuclar["epic"] = itad_all_prices.get("epic")
+            self.sonuclar["cdkey"] = itad_all_prices.get("cdkey")
+        elif name in ("historical_lows", "itad_subscriptions"):
+            self.sonuclar[name] = result or ({} if name == "historical_lows" else [])
+        elif name in EMBED_FIELDS_BY_STAGE:
+            self.sonuclar[name] = result
+        else:
+            return
+        self.pending.difference_update(EMBED_FIELDS_BY_STAGE.get(name, ()))
+        for listener in self._listeners:
+            listener(self.snapshot())
+
+class EmbedStreamer:
+    """Debounces and coalesces progressive embed edits for one Discord message."""
+
+    def __init__(self, msg, min_interval=EMBED_EDIT_MIN_INTERVAL):
+        self.msg = msg
+        self.min_interval = min_interval
+        self._latest = None
+        self._final = False
+        self._dirty = asyncio.Event()
+        self._last_edit = 0.0
+        self._last_snapshot = None
+        self._task = None
+
+    def push(self, snapshot):
+        self._latest = snapshot
+        self._dirty.set()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def finish(self, display_game_name, sonuclar):
+        self._final = True
+        self.push((display_game_name, sonuclar, set()))
+        await self._task
+
+    async def _run(self):
+        while True:
+            await self._dirty.wait()
+            wait = self._last_edit + self.min_interval - time.monotonic()
+            if wait > 0:
+                # Bu süre içinde gelen diğer sonuçlar da aynı düzenlemeye dahil olur.
+                await asyncio.sleep(wait)
+            self._dirty.clear()
+            is_final = self._final
+            snapshot = self._latest
+            if snapshot != self._last_snapshot:
+                try:
+                    embed = await build_price_embed(*snapshot)
+                    await self.msg.edit(content=None, embed=embed)
+                except Exception as e:
+                    logging.error(f"Embed güncellenemedi: {e}")
+                self._last_snapshot = snapshot
+                self._last_edit = time.monotonic()
+            if is_final and not self._dirty.is_set():
+                return
+
+# --- YENİ: Eşzamanlı Aynı Sorguların Birleştirilmesi (single-flight) ---
+# Aynı normalize başlık için zaten çalışan bir sorgu varsa yenisi başlatılmaz;
+# sonradan gelenler mevcut sorgunun sonucunu bekler, her biri kendi mesajını düzenler.
+# Anahtar (başlık, api_only): normal bir sorgu yoğunlukta başlatılmış eksik bir sorguya
+# katılmaz; eksik sorgu ise çalışan tam bir sorgu varsa onun sonucunu alır.
+inflight_lookups = {}
+
+def find_inflight_lookup(oyun_adi_orjinal, api_only=False):
+    key = clean_game_name(oyun_adi_orjinal)
+    entry = inflight_lookups.get((key, False))
+    if entry is None and api_only:
+        entry = inflight_lookups.get((key, True))
+    return entry
+
+async def lookup_prices_coalesced(oyun_adi_orjinal, on_progress=None, api_only=False):
+    key = (clean_game_name(oyun_adi_orjinal), api_only)
+    entry = find_inflight_lookup(oyun_adi_orjinal, api_only)
+    if entry is None:
+        progress = LookupProgress(oyun_adi_orjinal)
+        task = asyncio.create_task(lookup_prices(oyun_adi_orjinal, progress, api_only))
+        inflight_lookups[key] = (task, progress)
+        task.add_done_callback(
+            lambda t: inflight_lookups.pop(key, None) if inflight_lookups.get(key, (None,))[0] is t else None
+        )
+    else:
+        task, progress = entry
+        logging.info(f"'{oyun_adi_orjinal}' için devam eden sorguya katılındı.")
+    if on_progress:
+        progress.subscribe(on_progress)
+    # shield: bekleyenlerden biri iptal edilirse ortak sorgu diğerleri için devam eder.
+    return await asyncio.shield(task)
+
+# --- YENİ: Kabul Kontrollü Adil Sorgu Kuyruğu ---
+# En fazla MAX_ACTIVE_LOOKUPS sorgu aynı anda çalışır; fazlası kuyrukta bekler. Sıradaki iş
+# sunucular (guild) arasında, her sunucuda da kullanıcılar arasında sırayla seçilir; böylece
+# tek bir kanaldaki istek yağmuru diğerlerini aç bırakmaz. Kuyruk LOOKUP_QUEUE_DEGRADE_DEPTH'e
+# ulaşınca yeni sorgular beklemeden sadece önbellek/API ile cevaplanır, LOOKUP_QUEUE_MAX_DEPTH'te
+# reddedilir. Zaten çalışan bir sorguya katılmak kuyruğa girmez.
+MAX_ACTIVE_LOOKUPS = int(os.environ.get("MAX_ACTIVE_LOOKUPS", 4))
+LOOKUP_QUEUE_DEGRADE_DEPTH = int(os.environ.get("LOOKUP_QUEUE_DEGRADE_DEPTH", 15))
+LOOKUP_QUEUE_MAX_DEPTH = int(os.environ.get("LOOKUP_QUEUE_MAX_DEPTH", 40))
+MAX_QUEUED_PER_USER = int(os.environ.get("MAX_QUEUED_PER_USER", 2))
+# Sıra bildirimi mesaj düzenlemesi demek; ilk sıralar dışında bu aralıktan sık güncellenmez.
+QUEUE_POSITION_EDIT_INTERVAL = 10.0
+
+LOOKUP_ADMISSIONS = metrics.Counter(
+    "fiyatbot_lookup_admissions_total", "Price lookups by admission decision.", ["result"]
+)
+LOOKUP_QUEUE_DEPTH = metrics.Gauge("fiyatbot_lookup_queue_depth", "Price lookups waiting for a slot.")
+LOOKUP_ACTIVE = metrics.Gauge("fiyatbot_lookup_active", "Price lookups currently running.")
+
+class LookupRejected(Exception):
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+class QueuedLookup:
+    def __init__(self, guild_id, user_id, on_position):
+        self.guild_id = guild_id
+        self.user_id = user_id
+        self.on_position = on_position
+        self.slot = asyncio.get_running_loop().create_future()
+        self.notified_position = None
+        self.notified_at = 0.0
+
+class LookupScheduler:
+    """Admission control and guild/user round-robin ordering in front of the lookup pipeline."""
+
+    def __init__(self, max_active, degrade_depth, max_depth, max_per_user):
+        self.max_active = max_active
+        self.degrade_depth = degrade_depth
+        self.max_depth = max_depth
+        self.max_per_user = max_per_user
+        self.active = 0
+        self._queues = OrderedDict()  # guild_id -> OrderedDict(user_id -> deque[QueuedLookup])
+        self._background_tasks = set()
+
+    @property
+    def depth(self):
+        return sum(len(jobs) for users in self._queues.values() for jobs in users.values())
+
+    def _queued_for_user(self, guild_id, user_id):
+        return len(self._queues.get(guild_id, {}).get(user_id, ()))
+
+    def fair_order(self):
+        """Returns the waiting jobs in the order they would be started."""
+        queues = OrderedDict((g, OrderedDict((u, deque(jobs)) for u, jobs in users.items())) for g, users in self._queues.items())
+        order = []
+        while queues:
+            guild_id, users = next(iter(queues.items()))
+            user_id, jobs = next(iter(users.items()))
+            order.append(jobs.popleft())
+            users.move_to_end(user_id)
+            if not jobs: del users[user_id]
+            queues.move_to_end(guild_id)
+            if not users: del queues[guild_id]
+        return order
+
+    async def run(self, oyun_adi_orjinal, guild_id, user_id, on_progress=None, on_position=None):
+        if find_inflight_lookup(oyun_adi_orjinal):
+            LOOKUP_ADMISSIONS.inc(result="joined")
+            return await lookup_prices_coalesced(oyun_adi_orjinal, on_progress)
+
+        if self.active < self.max_active and not self._queues:
+            LOOKUP_ADMISSIONS.inc(result="started")
+            self.active += 1
+        else:
+            depth = self.depth
+            if depth >= self.max_depth:
+                LOOKUP_ADMISSIONS.inc(result="rejected")
+                raise LookupRejected("full")
+            if self._queued_for_user(guild_id, user_id) >= self.max_per_user:
+                LOOKUP_ADMISSIONS.inc(result="rejected")
+                raise LookupRejected("user")
+            if depth >= self.degrade_depth:
+                # Slot beklemeden, tarayıcı kullanmadan: mağaza semaforları yine de korur.
+                LOOKUP_ADMISSIONS.inc(result="degraded")
+                logging.warning(f"Kuyruk derin ({depth}), '{oyun_adi_orjinal}' sadece API ile cevaplanıyor.")
+                return await lookup_prices_coalesced(oyun_adi_orjinal, on_progress, api_only=True)
+            LOOKUP_ADMISSIONS.inc(result="queued")
+            await self._wait_for_slot(guild_id, user_id, on_position)
+
+        try:
+            return await lookup_prices_coalesced(oyun_adi_orjinal, on_progress)
+        finally:
+            self._release()
+
+    async def _wait_for_slot(self, guild_id, user_id, on_position):
+        job = QueuedLookup(guild_id, user_id, on_position)
+        self._queues.setdefault(guild_id, OrderedDict()).setdefault(user_id, deque()).append(job)
+        self._notify_positions()
+        try:
+            await job.slot
+        except asyncio.CancelledError:
+            if job.slot.done() and not job.slot.cancelled():
+                # Slot tam iptal anında verilmişti; başkasına devret.
+                self._release()
+            else:
+                self._remove(job)
+            raise
+
+    def _remove(self, job):
+        users = self._queues.get(job.guild_id, {})
+        jobs = users.get(job.user_id)
+        if jobs and job in jobs:
+            jobs.remove(job)
+            if not jobs: del users[job.user_id]
+            if not users: del self._queues[job.guild_id]
+
+    def _release(self):
+        order = self.fair_order()
+        if not order:
+            self.active -= 1
+            return
+        # Slot doğrudan sıradaki işe devredilir; active sayısı değişmez.
+        job = order[0]
+        self._remove(job)
+        guild_users = self._queues.get(job.guild_id)
+        if guild_users is not None:
+            self._queues.move_to_end(job.guild_id)
+            if job.user_id in guild_users: guild_users.move_to_end(job.user_id)
+        job.slot.set_result(None)
+        self._notify_positions()
+
+    def _notify_positions(self):
+        now = time.monotonic()
+        for position, job in enumerate(self.fair_order(), start=1):
+            if job.on_position is None or position == job.notified_position:
+                continue
+            if position > 3 and now - job.notified_at < QUEUE_POSITION_EDIT_INTERVAL:
+                continue
+            job.notified_position = position; job.notified_at = now
+            task = asyncio.create_task(job.on_position(position))
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
+
+lookup_scheduler = LookupScheduler(MAX_ACTIVE_LOOKUPS, LOOKUP_QUEUE_DEGRADE_DEPTH, LOOKUP_QUEUE_MAX_DEPTH, MAX_QUEUED_PER_USER)
+LOOKUP_QUEUE_DEPTH.set_function(lambda: lookup_scheduler.depth)
+LOOKUP_ACTIVE.set_function(lambda: lookup_scheduler.active)
+
+async def build_price_embed(display_game_name, sonuclar, pending=()):
+    subscriptions = sonuclar.get("itad_subscriptions", [])
+    historical_lows = sonuclar.get("historical_lows", {})
+
+    # Embed oluştur
+    embed = discord.Embed(title=f"🎮 {display_game_name} Fiyat Bilgisi ve Linkler V.0.97", color=discord.Color.from_rgb(16, 124, 16))
+    embed.set_footer(text="Fiyatlar anlık olarak mağazalardan ve bazı API'lerden çekilmektedir.")
+    if sonuclar.get("api_only"):
+        embed.set_footer(text="Yoğunluk nedeniyle sadece önbellek ve API sonuçları gösteriliyor; konsol mağazaları eksik olabilir.")
+
+    def get_not_found_text(platform_name):
+        return f"*Mağazada bulunamadı ya da satışta değil.*"
+
+    timed_out = sonuclar.get("timed_out", ())
+
+    # ... (Steam, Xbox, PlayStation, Epic Games, CD-Key alanlarını işleyen kod aynen kalıyor)
+    # Sadece get_xbox_price ve on_message fonksiyonlarının kod içindeki yerlerini doğru ayarladığınızdan emin olun.
+    # ... (Geri kalan kodunuz)
+
+    # --- Steam için alan ekle ---
+    steam_result = sonuclar.get("steam")
+    steam_price_info = steam_result.get("price", "N/A") if steam_result else "N/A"
+    steam_link = steam_result.get("link", "#") if steam_result else "#"
+
+    display_text_steam = "N/A"
+    if isinstance(steam_price_info, tuple):
+        price, currency = steam_price_info
+        try_rate = await get_usd_to_try_rate()
+        if try_rate and currency == "USD":
+            tl_price = price * try_rate
+            display_text_steam = f"${price:,.2f} {currency}\n(≈ {tl_price:,.2f} TL)".replace(",", "X").replace(".", ",").replace("X", ".")
+        else:
+            display_text_steam = f"{price} {currency}"
+    elif steam_price_info != "N/A":
+        display_text_steam = str(steam_price_info)
+
+    if display_text_steam == "N/A":
+         field_value_steam = get_not_found_text("Steam")
+    else:
+        low_price_steam = historical_lows.get(61)
+        if low_price_steam:
+            display_text_steam += f"\n*En Düşük Fiyat: {low_price_steam}*"
+        field_value_steam = f"[{display_text_steam}]({steam_link})"
+    if "steam" in timed_out: field_value_steam = TIMED_OUT_TEXT
+    if "steam" in pending: field_value_steam = CHECKING_TEXT
+    embed.add_field(name="Steam", value=field_value_steam, inline=True)
+
+    # --- Xbox için alan ekle (ITAD veya Yedekten çekilen) ---
+    xbox_result = sonuclar.get("xbox")
+    xbox_price = xbox_result.get("price") if xbox_result else None
+    xbox_link = xbox_result.get("link", "#") if xbox_result else "#"
+
+    display_text_xbox = None 
+
+    if xbox_price:
+        display_text_xbox = xbox_price
+
+    subs_to_show = []
+    if any("Game Pass" in s for s in subscriptions): subs_to_show.append("Game Pass'e Dahil")
+    if any("EA Play" in s for s in subscriptions): subs_to_show.append("EA Play'e Dahil")
+
+    if display_text_xbox:
+        if subs_to_show:
+            display_text_xbox += "\n*" + " & ".join(subs_to_show) + "*"
+        low_price_xbox = historical_lows.get(15)
+        if low_price_xbox:
+            display_text_xbox += f"\n*En Düşük Fiyat: {low_price_xbox}*"
+        field_value_xbox = f"[{display_text_xbox}]({xbox_link})"
+    elif subs_to_show:
+        display_text_xbox = "Fiyat Bulunamadı."
+        display_text_xbox += "\n*" + " & ".join(subs_to_show) + "*"
+        field_value_xbox = f"[{display_text_xbox}]({xbox_link})"
+    else:
+        field_value_xbox = get_not_found_text("Xbox")
+
+    if "xbox" in timed_out: field_value_xbox = TIMED_OUT_TEXT
+    if "xbox" in pending: field_value_xbox = CHECKING_TEXT
+    embed.add_field(name="Xbox", value=field_value_xbox, inline=True)
+
+    # --- PlayStation için alan ekle ---
+    ps_result = sonuclar.get("ps")
+    ps_price = ps_result.get("price") if ps_result and ps_result.get("price") else None
+    ps_link = ps_result.get("link", "#") if ps_result else "#"
+
+    if ps_price:
+        field_value_ps = f"[{ps_price}]({ps_link})"
+    else:
+        field_value_ps = get_not_found_text("PlayStation")
+    if "ps" in timed_out: field_value_ps = TIMED_OUT_TEXT
+    if "ps" in pending: field_value_ps = CHECKING_TEXT
+    embed.add_field(name="PlayStation", value=field_value_ps, inline=True)
+
+    # --- Epic Games için alan ekle ---
+    epic_result = sonuclar.get("epic")
+    epic_price = epic_result.get("price") if epic_result else None
+    epic_link = epic_result.get("link", "#") if epic_result else "#"
+
+    if epic_price:
+        display_text_epic = epic_price
+        low_price_epic = historical_lows.get(16)
+        if low_price_epic:
+            display_text_epic += f"\n*En Düşük Fiyat: {low_price_epic}*"
+        field_value_epic = f"[{display_text_epic}]({epic_link})"
+    else:
+        field_value_epic = get_not_found_text("Epic Games")
+    if "epic" in timed_out: field_value_epic = TIMED_OUT_TEXT
+    if "epic" in pending: field_value_epic = CHECKING_TEXT
+    embed.add_field(name="Epic Games", value=field_value_epic, inline=True)
+
+    # --- CD-Key için alan ekle ---
+    cdkey_result = sonuclar.get("cdkey")
+    cdkey_price = cdkey_result.get("price") if cdkey_result else None
+    cdkey_link = cdkey_result.get("link", "#") if cdkey_result else "#"
+    cdkey_drm = cdkey_result.get("drm") if cdkey_result else None
+
+    if cdkey_price:
+        display_text_cdkey = cdkey_price
+        if cdkey_drm:
+            display_text_cdkey += f" - {cdkey_drm}"
+        field_value_cdkey = f"[{display_text_cdkey}]({cdkey_link})"
+    else:
+        field_value_cdkey = "*CD-Key mağazalarında indirimli bulunamadı.*"
+    if "cdkey" in timed_out: field_value_cdkey = TIMED_OUT_TEXT
+    if "cdkey" in pending: field_value_cdkey = CHECKING_TEXT
+    embed.add_field(name="En Ucuz CD-Key", value=field_value_cdkey, inline=True)
+
+    return embed
+
+# --- YENİ: Takip Listesi ve Fiyat Düşüşü Bildirimleri ---
+# !takip ile eklenen her oyun, kaç kullanıcı takip ederse etsin tek satırdır (watched_games);
+# kullanıcıların hedef fiyatları ayrı tutulur (watches). Arka plandaki yenileyici tüm oyunları
+# toplu günceller: ITAD prices/v3 ve Steam appdetails tek istekte WATCHLIST_BATCH_SIZE oyun
+# sorgular, konsol mağazaları her turda sırayla en fazla WATCHLIST_CONSOLE_PER_CYCLE oyun için
+# kayıtlı ürün sayfalarından (havuzdaki sayfalarla) yenilenir. Böylece maliyet takip edilen oyun
+# sayısıyla değil, parti sayısıyla büyür. Fiyatlar karşılaştırma için TL'ye çevrilir.
+WATCHLIST_DB_PATH = os.environ.get("WATCHLIST_DB_PATH", "data/watchlist.sqlite3")
+WATCHLIST_REFRESH_INTERVAL = float(os.environ.get("WATCHLIST_REFRESH_INTERVAL", 3 * 3600))
+WATCHLIST_JITTER = 0.2  # Yenileme aralığı ±%20 oynatılır
+WATCHLIST_BATCH_SIZE = int(os.environ.get("WATCHLIST_BATCH_SIZE", 100))
+WATCHLIST_BATCH_PAUSE = 1.0  # Partiler arasında bekleme; interaktif sorgulara yer açar
+WATCHLIST_CONSOLE_PER_CYCLE = int(os.environ.get("WATCHLIST_CONSOLE_PER_CYCLE", 30))
+WATCHLIST_RESOLVE_CONCURRENCY = 4
+WATCHLIST_RATE_LIMIT_RETRIES = 2  # 429 alan parti Retry-After beklendikten sonra en fazla bu kadar tekrar denenir
+WATCHLIST_MIN_DROP = 0.01  # Hedefsiz takiplerde en az %1 düşüş bildirilir
+MAX_WATCHES_PER_USER = int(os.environ.get("MAX_WATCHES_PER_USER", 25))
+# Bir kaynaktan (itad, steam, xbox, playstation) bu süredir başarılı cevap alınamadıysa
+# o kaynağın son fiyatları en iyi fiyat hesabına katılmaz; biten bir indirim sonsuza kadar kalmasın.
+WATCHLIST_OFFER_MAX_AGE = float(os.environ.get("WATCHLIST_OFFER_MAX_AGE", 24 * 3600))
+# Steam (61), Epic Games (16), Microsoft Store (48)
+ITAD_WATCH_SHOPS = "61,16,48"
+WATCH_THOUSANDS_RE = re.compile(r'\d{1,3}(?:\.\d{3})+')
+TRY_PRICE_RE = re.compile(r'(\d{1,3}(?:\.\d{3})*(?:,\d{2})?)\s*(?:TL|₺)|₺\s*(\d{1,3}(?:\.\d{3})*(?:,\d{2})?)')
+
+WATCHLIST_REFRESHES = metrics.Counter(
+    "fiyatbot_watchlist_refresh_requests_total", "Upstream requests made by the watchlist refresher.", ["store"]
+)
+WATCHLIST_ALERTS = metrics.Counter("fiyatbot_watchlist_alerts_total", "Price drop DMs sent.", ["result"])
+
+class WatchlistStore:
+    """SQLite tables for watched games, their last known prices, and each user's target price."""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS watched_games (
+                    query TEXT PRIMARY KEY,
+                    display_name TEXT NOT NULL,
+                    itad_id TEXT,
+                    steam_appid INTEGER,
+                    prices TEXT NOT NULL DEFAULT '{}',
+                    best_price REAL,
+                    checked_at REAL NOT NULL DEFAULT 0,
+                    console_checked_at REAL NOT NULL DEFAULT 0
+                )"""
+            )
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS watches (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    query TEXT NOT NULL REFERENCES watched_games(query),
+                    target_price REAL,
+                    notified_price REAL,
+                    created_at REAL NOT NULL,
+                    UNIQUE (user_id, query)
+                )"""
+            )
+
+    def _add(self, user_id, query, display_name, target_price):
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM watches WHERE user_id = ?", (user_id,)).fetchone()[0]
+            exists = self._conn.execute("SELECT 1 FROM watches WHERE user_id = ? AND query = ?", (user_id, query)).fetchone()
+            if count >= MAX_WATCHES_PER_USER and not exists:
+                return None
+            self._conn.execute(
+                "INSERT OR IGNORE INTO watched_games (query, display_name) VALUES (?, ?)", (query, display_name)
+            )
+            # Aynı oyun tekrar eklenirse sadece hedef fiyat güncellenir.
+            self._conn.execute(
+                """INSERT INTO watches (user_id, query, target_price, notified_price, created_at) VALUES (?, ?, ?, NULL, ?)
+                   ON CONFLICT (user_id, query) DO UPDATE SET target_price = excluded.target_price, notified_price = NULL""",
+                (user_id, query, target_price, time.time()),
+            )
+            return self._conn.execute("SELECT id FROM watches WHERE user_id = ? AND query = ?", (user_id, query)).fetchone()[0]
+
+    def _list_for_user(self, user_id):
+        with self._lock:
+            rows = self._conn.execute(
+                """SELECT w.id, w.target_price, g.display_name, g.best_price FROM watches w
+                   JOIN watched_games g ON g.query = w.query WHERE w.user_id = ? ORDER BY w.id""",
+                (user_id,),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def _remove(self, user_id, watch_id):
+        with self._lock:
+            row = self._conn.execute("SELECT query FROM watches WHERE id = ? AND user_id = ?", (watch_id, user_id)).fetchone()
+            if not row:
+                return False
+            self._conn.execute("DELETE FROM watches WHERE id = ?", (watch_id,))
+            # Artık kimsenin takip etmediği oyun yenilenmesin
+            self._conn.execute(
+                "DELETE FROM watched_games WHERE query = ? AND NOT EXISTS (SELECT 1 FROM watches WHERE query = ?)",
+                (row["query"], row["query"]),
+            )
+            return True
+
+    def _games(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM watched_games").fetchall()
+        games = []
+        for row in rows:
+            game = dict(row)
+            game["prices"] = json.loads(game["prices"])
+            if any(not isinstance(source, dict) for source in game["prices"].values()):
+                # Eski düz {mağaza: [fiyat, link]} biçimi; ilk yenilemede kaynak bazında yeniden dolar.
+                game["prices"] = {}
+            games.append(game)
+        return games
+
+    def _save_game(self, game):
+        with self._lock:
+            self._conn.execute(
+                """UPDATE watched_games SET itad_id = ?, steam_appid = ?, prices = ?, best_price = ?,
+                   checked_at = ?, console_checked_at = ? WHERE query = ?""",
+                (game["itad_id"], game["steam_appid"], json.dumps(game["prices"]), game["best_price"],
+                 game["checked_at"], game["console_checked_at"], game["query"]),
+            )
+
+    def _watches_for(self, query):
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM watches WHERE query = ?", (query,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def _mark_notified(self, watch_id, price):
+        with self._lock:
+            self._conn.execute("UPDATE watches SET notified_price = ? WHERE id = ?", (price, watch_id))
+
+    async def add(self, user_id, query, display_name, target_price):
+        return await asyncio.to_thread(self._add, user_id, query, display_name, target_price)
+
+    async def list_for_user(self, user_id):
+        return await asyncio.to_thread(self._list_for_user, user_id)
+
+    async def remove(self, user_id, watch_id):
+        return await asyncio.to_thread(self._remove, user_id, watch_id)
+
+    async def games(self):
+        return await asyncio.to_thread(self._games)
+
+    async def save_game(self, game):
+        await asyncio.to_thread(self._save_game, game)
+
+    async def watches_for(self, query):
+        return await asyncio.to_thread(self._watches_for, query)
+
+    async def mark_notified(self, watch_id, price):
+        await asyncio.to_thread(self._mark_notified, watch_id, price)
+
+watchlist_store = WatchlistStore(WATCHLIST_DB_PATH)
+
+def to_try(amount, currency, usd_rate):
+    if currency == "TRY":
+        return amount
+    if currency == "USD" and usd_rate:
+        return amount * usd_rate
+    return None
+
+def parse_try_price(text):
+    """Reads the first TL amount ("1.299,00 TL", "₺1.299,00") from a store's display text."""
+    match = TRY_PRICE_RE.search(text or "")
+    if not match:
+        return None
+    return float((match.group(1) or match.group(2)).replace(".", "").replace(",", "."))
+
+def format_try(amount):
+    return f"{amount:,.2f} TL".replace(",", "X").replace(".", ",").replace("X", ".")
+
+def set_source_offers(game, source, offers, now=None):
+    """Replaces everything known from one source with the offers of its latest successful fetch."""
+    game["prices"][source] = {"checked_at": now if now is not None else time.time(), "offers": offers}
+
+def chunked(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+async def watchlist_backoff(response_or_error):
+    """Sleeps for the upstream's Retry-After (or a minute) after a 429."""
+    retry_after = 60.0
+    headers = getattr(response_or_error, "headers", None) or {}
+    with contextlib.suppress(TypeError, ValueError):
+        retry_after = float(headers.get("retry-after", retry_after))
+    logging.warning(f"Takip listesi yenilemesi hız sınırına takıldı, {retry_after:.0f} sn bekleniyor.")
+    await asyncio.sleep(retry_after)
+
+class WatchlistRefresher:
+    """Refreshes every watched game in batches on a jittered interval and DMs users about drops."""
+
+    def __init__(self, store):
+        self.store = store
+        self._task = None
+
+    def start(self):
+        # on_ready yeniden bağlanmalarda tekrar çağrılabilir; tek bir döngü yeterli.
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def _loop(self):
+        # Yeniden başlatmalarda tüm örnekler aynı anda yenilemesin
+        await asyncio.sleep(random.uniform(30, 300))
+        while True:
+            try:
+                await self.refresh_all()
+            except Exception as e:
+                logging.error(f"Takip listesi yenilenemedi: {e}", exc_info=True)
+            await asyncio.sleep(WATCHLIST_REFRESH_INTERVAL * random.uniform(1 - WATCHLIST_JITTER, 1 + WATCHLIST_JITTER))
+
+    async def refresh_all(self):
+        games = await self.store.games()
+        if not games:
+            return
+        started = time.monotonic()
+        await self._resolve_ids(games)
+        usd_rate = await get_usd_to_try_rate()
+        await self._refresh_itad(games, usd_rate)
+        await self._refresh_steam(games, usd_rate)
+        await self._refresh_consoles(games)
+        now = time.time()
+        # Konsol fiyatları sırayla yenilendiği için bir oyuna birkaç turda bir bakılır.
+        console_rounds = -(-len(games) // WATCHLIST_CONSOLE_PER_CYCLE)
+        max_ages = {"console": WATCHLIST_OFFER_MAX_AGE + console_rounds * WATCHLIST_REFRESH_INTERVAL * (1 + WATCHLIST_JITTER)}
+        alerts = 0
+        for game in games:
+            previous_best = game["best_price"]
+            best = self._best_price(game, now, max_ages)
+            game["best_price"] = best[0] if best else None
+            game["checked_at"] = now
+            await self.store.save_game(game)
+            if best:
+                alerts += await self._notify(game, best, previous_best)
+        logging.info(f"Takip listesi yenilendi: {len(games)} oyun, {alerts} bildirim, {time.monotonic() - started:.1f} sn.")
+
+    async def _resolve_ids(self, games):
+        # ITAD ve Steam kimlikleri oyun başına bir kez çözülür, sonra hep toplu sorgulanır.
+        semaphore = asyncio.Semaphore(WATCHLIST_RESOLVE_CONCURRENCY)
+
+        async def resolve_ids(game):
+            if not game["itad_id"]:
+                game["itad_id"] = await get_cached_itad_game_id(game["display_name"])
+            if not game["steam_appid"]:
+                indexed = lookup_steam_title_index(game["query"])
+                if indexed:
+                    game["steam_appid"] = indexed[0]
+                else:
+                    steam_result = await get_best_steam_result(game["display_name"], game["query"])
+                    app_match = re.search(r'/app/(\d+)', (steam_result or {}).get("link", ""))
+                    if app_match:
+                        game["steam_appid"] = int(app_match.group(1))
+
+        async def resolve(game):
+            async with semaphore:
+                try:
+                    await resolve_ids(game)
+                except StoreUnavailable as e:
+                    # Çözülemeyen kimlik bir sonraki turda tekrar denenir.
+                    logging.warning(f"Takip listesi kimlikleri çözülemedi ('{game['query']}'): {e}")
+        await asyncio.gather(*(resolve(game) for game in games if not game["itad_id"] or not game["steam_appid"]))
+
+    async def _refresh_itad(self, games, usd_rate):
+        by_id = {}
+        for game in games:
+            if game["itad_id"]:
+                by_id.setdefault(game["itad_id"], []).append(game)
+        for batch in chunked(list(by_id), WATCHLIST_BATCH_SIZE):
+            entries = None
+            for attempt in range(WATCHLIST_RATE_LIMIT_RETRIES + 1):
+                try:
+                    WATCHLIST_REFRESHES.inc(store="itad")
+                    entries = await post_itad_batch("/games/prices/v3", {"country": "TR", "shops": ITAD_WATCH_SHOPS}, batch)
+                    break
+                except ItadBatchError as e:
+                    if e.status_code == 429 and attempt < WATCHLIST_RATE_LIMIT_RETRIES:
+                        await watchlist_backoff(e)
+                        continue
+                    logging.warning(f"Takip listesi ITAD partisi alınamadı. Status: {e.status_code}")
+                    break
+                except Exception as e:
+                    logging.warning(f"Takip listesi ITAD partisi alınamadı: {e}")
+                    break
+            if entries is None:
+                continue
+            for itad_id in batch:
+                offers = {}
+                for deal in (entries.get(itad_id) or {}).get("deals", []):
+                    price = deal.get("price") or {}
+                    amount = to_try(price.get("amount"), price.get("currency"), usd_rate) if price.get("amount") is not None else None
+                    shop_name = deal.get("shop", {}).get("name") or "ITAD"
+                    if amount is not None and (shop_name not in offers or amount < offers[shop_name][0]):
+                        offers[shop_name] = [amount, deal.get("url")]
+                for game in by_id[itad_id]:
+                    set_source_offers(game, "itad", dict(offers))
+            await asyncio.sleep(WATCHLIST_BATCH_PAUSE)
+
+    async def _refresh_steam(self, games, usd_rate):
+        by_appid = {}
+        for game in games:
+            if game["steam_appid"]:
+                by_appid.setdefault(game["steam_appid"], []).append(game)
+        for batch in chunked(list(by_appid), WATCHLIST_BATCH_SIZE):
+            response = None
+            for attempt in range(WATCHLIST_RATE_LIMIT_RETRIES + 1):
+                # Steam birden fazla appid'yi sadece filters=price_overview ile kabul ediyor.
+                async with store_semaphores["steam"]:
+                    WATCHLIST_REFRESHES.inc(store="steam")
+                    try:
+                        response = await get_http_client("store.steampowered.com").get(
+                            "/api/appdetails",
+                            params={"appids": ",".join(map(str, batch)), "cc": "TR", "filters": "price_overview"},
+                        )
+                    except httpx.HTTPError as e:
+                        logging.warning(f"Takip listesi Steam partisi alınamadı: {e}")
+                        response = None
+                        break
+                if response.status_code != 429 or attempt == WATCHLIST_RATE_LIMIT_RETRIES:
+                    break
+                await watchlist_backoff(response)
+            if response is None:
+                continue
+            if response.status_code != 200:
+                logging.warning(f"Takip listesi Steam partisi alınamadı. Status Code: {response.status_code}")
+                continue
+            payload = response.json() or {}
+            for appid in batch:
+                entry = payload.get(str(appid)) or {}
+                data = entry.get("data") if entry.get("success") else None
+                price_data = data.get("price_overview") if isinstance(data, dict) else None
+                offers = {}
+                if price_data and isinstance(price_data.get("final"), int):
+                    amount = to_try(price_data["final"] / 100.0, price_data.get("currency", "USD"), usd_rate)
+                    if amount is not None:
+                        offers["Steam"] = [amount, f"https://store.steampowered.com/app/{appid}"]
+                # Fiyatı kalkmış (ücretsiz/satıştan çekilmiş) oyunun eski Steam fiyatı da silinir.
+                for game in by_appid[appid]:
+                    set_source_offers(game, "steam", dict(offers))
+            await asyncio.sleep(WATCHLIST_BATCH_PAUSE)
+
+    async def _refresh_consoles(self, games):
+        # Konsol mağazalarında toplu uç nokta yok; her turda en uzun süredir bakılmayanlar yenilenir.
+        due = sorted(games, key=lambda game: game["console_checked_at"])[:WATCHLIST_CONSOLE_PER_CYCLE]
+
+        async def refresh(game):
+            xbox_result, ps_result = await asyncio.gather(
+                run_limited("xbox", get_xbox_price(game["query"])),
+                run_limited("playstation", get_playstation_price(game["query"])),
+                return_exceptions=True,
+            )
+            WATCHLIST_REFRESHES.inc(2, store="console")
+            for source, store_name, result in (("xbox", "Xbox", xbox_result), ("playstation", "PlayStation", ps_result)):
+                if isinstance(result, Exception):
+                    continue  # Hata: eski fiyat yaşı dolana kadar kullanılır
+                amount = parse_try_price(result.get("price")) if isinstance(result, dict) else None
+                set_source_offers(game, source, {store_name: [amount, result.get("link")]} if amount is not None else {})
+            game["console_checked_at"] = time.time()
+        await asyncio.gather(*(refresh(game) for game in due))
+
+    @staticmethod
+    def _best_price(game, now, max_ages=None):
+        """Cheapest (amount, shop, link) across sources whose last successful fetch is recent enough."""
+        offers = []
+        for source, known in game["prices"].items():
+            kind = "console" if source in ("xbox", "playstation") else source
+            if now - known["checked_at"] > (max_ages or {}).get(kind, WATCHLIST_OFFER_MAX_AGE):
+                continue
+            offers.extend((amount, store_name, link) for store_name, (amount, link) in known["offers"].items() if amount is not None)
+        return min(offers) if offers else None
+
+    async def _notify(self, game, best, previous_best):
+        best_amount, store_name, link = best
+        sent = 0
+        for watch in await self.store.watches_for(game["query"]):
+            target, notified = watch["target_price"], watch["notified_price"]
+            if target is not None:
+                if best_amount > target:
+                    if notified is not None:
+                        # Fiyat hedefin üstüne döndü; bir sonraki düşüş tekrar bildirilsin.
+                        await self.store.mark_notified(watch["id"], None)
+                    continue
+                should_alert = notified is None or best_amount < notified
+            else:
+                reference = notified if notified is not None else previous_best
+                should_alert = reference is not None and best_amount < reference * (1 - WATCHLIST_MIN_DROP)
+            if should_alert and await self._send_alert(watch, game, best_amount, store_name, link):
+                await self.store.mark_notified(watch["id"], best_amount)
+                sent += 1
+        return sent
+
+    async def _send_alert(self, watch, game, amount, store_name, link):
+        embed = discord.Embed(
+            title=f"📉 {game['display_name']} fiyatı düştü!",
+            description=f"**{store_name}**: [{format_try(amount)}]({link or '#'})",
+            color=discord.Color.from_rgb(16, 124, 16),
+        )
+        if watch["target_price"] is not None:
+            embed.set_footer(text=f"Hedef fiyatınız: {format_try(watch['target_price'])} • Takibi bırakmak için: !takipsil {watch['id']}")
+        else:
+            embed.set_footer(text=f"Takibi bırakmak için: !takipsil {watch['id']}")
+        try:
+            user = client.get_user(watch["user_id"]) or await client.fetch_user(watch["user_id"])
+            await user.send(embed=embed)
+            WATCHLIST_ALERTS.inc(result="sent")
+            return True
+        except Exception as e:
+            # DM'leri kapalı kullanıcılar; bildirim işaretlenmez, sonraki turda tekrar denenir.
+            logging.warning(f"Takip bildirimi gönderilemedi (kullanıcı {watch['user_id']}): {e}")
+            WATCHLIST_ALERTS.inc(result="failed")
+            return False
+
+watchlist_refresher = WatchlistRefresher(watchlist_store)
+
+def parse_watch_command(argument):
+    """Splits "<oyun adı> | <hedef fiyat>" into (name, target or None); raises ValueError on a bad price."""
+    name, _, target_text = argument.partition("|")
+    target_text = target_text.strip().lower().replace("tl", "").replace("₺", "").strip()
+    target = None
+    if target_text:
+        if "," in target_text or WATCH_THOUSANDS_RE.fullmatch(target_text):
+            # Türkçe yazım: "1.299,90" ve virgülsüz "1.299" binlik ayraçlı sayılır.
+            target = float(target_text.replace(".", "").replace(",", "."))
+        else:
+            target = float(target_text)
+        if target <= 0:
+            raise ValueError(target_text)
+    return name.strip(), target
+
+async def handle_watch_command(message, argument):
+    try:
+        oyun_adi, target = parse_watch_command(argument)
+    except ValueError:
+        await message.channel.send("Hedef fiyat anlaşılamadı. Örnek: `!takip Elden Ring | 750`")
+        return
+    if not oyun_adi:
+        await message.channel.send("Lütfen bir oyun adı girin. Örnek: `!takip Elden Ring | 750`")
+        return
+    watch_id = await watchlist_store.add(message.author.id, clean_game_name(oyun_adi), oyun_adi, target)
+    if watch_id is None:
+        await message.channel.send(f"En fazla {MAX_WATCHES_PER_USER} oyun takip edebilirsiniz. `!takipsil` ile yer açabilirsiniz.")
+        return
+    target_text = f" hedef fiyat **{format_try(target)}**" if target is not None else " fiyatı düştüğünde"
+    await message.channel.send(f"**{oyun_adi}** takibe alındı (#{watch_id}),{target_text} size DM ile haber verilecek.")
+
+async def handle_watch_list_command(message):
+    watches = await watchlist_store.list_for_user(message.author.id)
+    if not watches:
+        await message.channel.send("Takip ettiğiniz oyun yok. Eklemek için: `!takip <oyun adı> | <hedef fiyat>`")
+        return
+    lines = []
+    for watch in watches:
+        line = f"**#{watch['id']}** {watch['display_name']}"
+        if watch["target_price"] is not None:
+            line += f" — hedef {format_try(watch['target_price'])}"
+        line += f" — şu an {format_try(watch['best_price'])}" if watch["best_price"] is not None else " — henüz kontrol edilmedi"
+        lines.append(line)
+    embed = discord.Embed(title="📋 Takip Listeniz", description="\n".join(lines), color=discord.Color.from_rgb(16, 124, 16))
+    embed.set_footer(text="Silmek için: !takipsil <numara>")
+    await message.channel.send(embed=embed)
+
+async def handle_watch_remove_command(message, argument):
+    watch_id = argument.strip().lstrip("#")
+    if not watch_id.isdigit():
+        await message.channel.send("Lütfen takip numarasını girin. Örnek: `!takipsil 3` (numaralar için `!takipler`)")
+        return
+    if await watchlist_store.remove(message.author.id, int(watch_id)):
+        await message.channel.send(f"#{watch_id} takipten çıkarıldı.")
+    else:
+        await message.channel.send(f"#{watch_id} numaralı bir takibiniz yok.")
+
+# --- Web Sunucusu ve JSON Fiyat API'si (aiohttp) ---
+# Bot ile aynı süreç ve event loop'ta çalışır; on_message ile aynı kuyruk, önbellek, tarayıcı ve
+# HTTP havuzlarını kullanır. Uç noktalar:
+#   GET  /                sağlık kontrolü
+#   GET  /metrics         Prometheus metrikleri
+#   GET  /price?q=<oyun>  tek oyun için fiyatlar (JSON)
+#   POST /prices          {"queries": ["oyun 1", "oyun 2", ...]} -> {"results": [...]}
+# WEB_API_TOKEN tanımlıysa /price ve /prices "Authorization: Bearer <token>" ister. Sunucu
+# varsayılan olarak sadece 127.0.0.1'i dinler; token olmadan dış adrese bağlanmayı reddeder.
+# İstemci kimliği (kuyruk adaleti ve kullanıcı başına sınır) bağlantının adresidir;
+# X-Forwarded-For sadece WEB_API_TRUST_PROXY=1 iken (güvenilen bir ters vekil arkasında) okunur.
+WEB_API_ENABLED = os.environ.get("WEB_API_ENABLED", "1") != "0"
+WEB_API_HOST = os.environ.get("WEB_API_HOST", "127.0.0.1")
+WEB_API_PORT = int(os.environ.get("PORT", 8080))
+WEB_API_TOKEN = os.environ.get("WEB_API_TOKEN")
+WEB_API_TRUST_PROXY = os.environ.get("WEB_API_TRUST_PROXY", "0") == "1"
+WEB_API_BATCH_MAX = int(os.environ.get("WEB_API_BATCH_MAX", 50))
+web_runner = None
+
+def price_result_json(query, display_game_name, sonuclar):
+    """Turns a lookup_prices result into a JSON-serializable dict."""
+    stores = {}
+    for store in ("steam", "xbox", "ps", "epic", "cdkey"):
+        result = sonuclar.get(store)
+        if not isinstance(result, dict):
+            stores[store] = None
+            continue
+        entry = {key: value for key, value in result.items() if key in ("link", "name", "shop", "drm") and value}
+        price = result.get("price")
+        if isinstance(price, tuple):
+            # Steam: (tutar, para birimi); TL karşılığı da eklenir
+            amount, currency = price
+            entry["price"] = {"amount": amount, "currency": currency}
+            try_rate = exchange_rates.rate(currency, "TRY")
+            if try_rate:
+                entry["price"]["try"] = round(amount * try_rate, 2)
+        else:
+            entry["price"] = price
+        stores[store] = entry
+    return {
+        "query": query,
+        "name": display_game_name,
+        "stores": stores,
+        "subscriptions": sonuclar.get("itad_subscriptions", []),
+        "historical_lows": {str(shop_id): low for shop_id, low in (sonuclar.get("historical_lows") or {}).items()},
+        "timed_out": sorted(sonuclar.get("timed_out", ())),
+        "degraded": bool(sonuclar.get("api_only")),
+    }
+
+def web_api_client_key(request):
+    if WEB_API_TRUST_PROXY and request.headers.get("X-Forwarded-For"):
+        # En sağdaki adres, güvendiğimiz vekilin gördüğü istemcidir; soldakiler istemcinin beyanı.
+        return request.headers["X-Forwarded-For"].split(",")[-1].strip()
+    return request.remote or "?"
+
+def web_api_host_allowed(host):
+    """A public bind address is only allowed when the API requires a token."""
+    if WEB_API_TOKEN:
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return host == "localhost"
+
+def web_api_authorized(request):
+    return not WEB_API_TOKEN or request.headers.get("Authorization") == f"Bearer {WEB_API_TOKEN}"
+
+async def web_api_lookup(query, client_key):
+    with log_context(query_id=log_pipeline.new_query_id()):
+        logging.info(f"API fiyat sorgusu: '{query}' ({client_key})")
+        display_game_name, sonuclar = await lookup_scheduler.run(query, "api", client_key)
+        return price_result_json(query, display_game_name, sonuclar)
+
+async def web_home(request):
+    return web.Response(text="Bot Aktif ve Çalışıyor!")
+
+async def web_metrics(request):
+    return web.Response(body=metrics.render().encode("utf-8"), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+async def web_price(request):
+    if not web_api_authorized(request):
+        return web.json_response({"error": "unauthorized"}, status=401)
+    query = request.query.get("q", "").strip()
+    if not query:
+        return web.json_response({"error": "'q' parametresi gerekli"}, status=400)
+    try:
+        return web.json_response(await web_api_lookup(query, web_api_client_key(request)))
+    except LookupRejected as e:
+        return web.json_response({"error": "busy", "reason": e.reason}, status=429, headers={"Retry-After": "10"})
+
+async def web_prices(request):
+    if not web_api_authorized(request):
+        return web.json_response({"error": "unauthorized"}, status=401)
+    try:
+        body = await request.json()
+    except ValueError:
+        return web.json_response({"error": "Geçersiz JSON"}, status=400)
+    queries = body.get("queries") if isinstance(body, dict) else body
+    if not isinstance(queries, list) or not all(isinstance(q, str) and q.strip() for q in queries):
+        return web.json_response({"error": "'queries' boş olmayan metinlerden oluşan bir liste olmalı"}, status=400)
+    if len(queries) > WEB_API_BATCH_MAX:
+        return web.json_response({"error": f"En fazla {WEB_API_BATCH_MAX} oyun sorgulanabilir"}, status=413)
+
+    client_key = web_api_client_key(request)
+    # Kullanıcı başına kuyruk sınırını aşmamak için aynı anda en fazla MAX_QUEUED_PER_USER sorgu gönderilir.
+    in_flight = asyncio.Semaphore(MAX_QUEUED_PER_USER)
+
+    async def run_one(query):
+        async with in_flight:
+            try:
+                return await web_api_lookup(query.strip(), client_key)
+            except LookupRejected as e:
+                return {"query": query, "error": "busy", "reason": e.reason}
+            except Exception as e:
+                logging.error(f"API toplu sorgu hatası ('{query}'): {e}", exc_info=True)
+                return {"query": query, "error": "internal"}
+    return web.json_response({"results": await asyncio.gather(*(run_one(q) for q in queries))})
+
+async def start_web_api():
+    """Starts the aiohttp server on the running loop; a second call does nothing."""
+    global web_runner
+    if web_runner is not None or not WEB_API_ENABLED:
+        return
+    if not web_api_host_allowed(WEB_API_HOST):
+        logging.error(f"Web API başlatılmadı: WEB_API_TOKEN olmadan {WEB_API_HOST} adresine bağlanılmaz (127.0.0.1 kullanın ya da token tanımlayın).")
+        return
+    web_app = web.Application()
+    web_app.add_routes([
+        web.get("/", web_home),
+        web.get("/metrics", web_metrics),
+        web.get("/price", web_price),
+        web.post("/prices", web_prices),
+    ])
+    web_runner = web.AppRunner(web_app, access_log=None)
+    await web_runner.setup()
+    await web.TCPSite(web_runner, WEB_API_HOST, WEB_API_PORT).start()
+    logging.info(f"✅ Web API dinleniyor: http://{WEB_API_HOST}:{WEB_API_PORT}")
+
+async def stop_web_api():
+    global web_runner
+    if web_runner is not None:
+        await web_runner.cleanup()
+        web_runner = None
 
 # --- Discord Bot Ana Kodları ---
 intents = discord.Intents.default()
 intents.message_content = True
 client = discord.Client(intents=intents)
 
+async def setup_hook():
+    # Giriş yapıldıktan sonra, gateway bağlantısından önce bir kez çalışır.
+    await start_web_api()
+client.setup_hook = setup_hook
+
 @client.event
 async def on_ready():
-    global playwright, browser
     logging.info(f'{client.user} olarak Discord\'a giriş yapıldı.')
+    # on_ready yeniden bağlanmalarda tekrar gelir; aşağıdakilerin hepsi tekrar çağrılmaya dayanıklı.
+    start_steam_title_index()
+    exchange_rates.start()
+    watchlist_refresher.start()
+    artifact_store.start()
     try:
-        playwright = await async_playwright().start()
-        # headless=False yaparak tarayıcıyı Replit'te VNC ile görebilirsiniz (debug için faydalı olabilir)
-        browser = await playwright.chromium.launch(headless=True)
-        logging.info("✅ Tarayıcı (PS & Xbox için) başarıyla başlatıldı!")
+        if browser_workers.enabled():
+            # Tarayıcılar işçi süreçlerinde; bu süreç sadece işleri dağıtır ve embed'i çizer.
+            await start_browser_workers()
+        else:
+            browser_supervisor.start()
+            await browser_supervisor.ensure()
     except Exception as e:
         logging.error(f"❌ HATA: Playwright tarayıcısı başlatılamadı: {e}", exc_info=True)
 
@@ -743,210 +3352,54 @@ async def on_message(message):
     if message.author == client.user: 
         return
 
+    komut = message.content.lower()
+    if komut.startswith('!takip '):
+        await handle_watch_command(message, message.content[7:])
+        return
+    if komut.strip() == '!takipler':
+        await handle_watch_list_command(message)
+        return
+    if komut.startswith('!takipsil'):
+        await handle_watch_remove_command(message, message.content[9:])
+        return
+
     if message.content.lower().startswith('!fiyat '):
         oyun_adi_orjinal = message.content[7:].strip()
         if not oyun_adi_orjinal: 
             await message.channel.send("Lütfen bir oyun adı girin.")
             return
+        with log_context(query_id=log_pipeline.new_query_id()):
+            await handle_price_command(message, oyun_adi_orjinal)
 
-        oyun_adi_temiz = clean_game_name(oyun_adi_orjinal)
-        msg = await message.channel.send(f"**{oyun_adi_orjinal}** için mağazalar kontrol ediliyor...")
-        logging.info(f"Fiyat sorgusu başlatıldı: '{oyun_adi_orjinal}' (Temizlenmiş: '{oyun_adi_temiz}')")
-
-        # Önce orijinal (temizlenmemiş) oyun adıyla Steam'i sorgula
-        steam_sonucu_orjinal = await asyncio.to_thread(get_steam_price, oyun_adi_orjinal)
-
-        # Ardından temizlenmiş adla sorgula
-        steam_sonucu_temiz = await asyncio.to_thread(get_steam_price, oyun_adi_temiz)
-
-        # En iyi Steam sonucunu belirle
-        steam_sonucu = None
-        if isinstance(steam_sonucu_orjinal, dict) and steam_sonucu_orjinal.get("name"):
-            # Orijinal isimle bir sonuç bulunduysa bunu kullan
-            steam_sonucu = steam_sonucu_orjinal
-        elif isinstance(steam_sonucu_temiz, dict) and steam_sonucu_temiz.get("name"):
-            # Orijinal isimle bulunamadıysa temizlenmiş olanı kullan
-            steam_sonucu = steam_sonucu_temiz
-
-        # Diğer API'ler için referans adı belirle
-        display_game_name = oyun_adi_orjinal
-        search_name_for_other_apis = oyun_adi_temiz
-        if isinstance(steam_sonucu, dict) and steam_sonucu.get("name"):
-            display_game_name = steam_sonucu['name']
-            search_name_for_other_apis = clean_game_name(steam_sonucu['name'])
-
-        itad_game_id_task = get_itad_game_id(search_name_for_other_apis)
-        cdkey_shop_ids_task = get_itad_shop_ids()
-        itad_game_id, cdkey_shop_ids = await asyncio.gather(itad_game_id_task, cdkey_shop_ids_task)
+async def handle_price_command(message, oyun_adi_orjinal):
+    msg = await message.channel.send(f"**{oyun_adi_orjinal}** için mağazalar kontrol ediliyor...")
 
-        itad_game_id = None
-        # Adım 1: Orijinal oyun adıyla ITAD ID'sini almaya çalış
+    async def show_queue_position(position):
         try:
-            itad_game_id = await get_itad_game_id(oyun_adi_orjinal)
+            await msg.edit(content=f"**{oyun_adi_orjinal}** için sıradasınız ({position}. sıra), birazdan mağazalar kontrol edilecek...")
         except Exception as e:
-            logging.warning(f"Orijinal oyun adıyla ITAD ID'si bulunamadı: {e}")
-
-        # Adım 2: Eğer orijinal adla ID bulunamadıysa, referans adla tekrar dene
-        if not itad_game_id:
-            try:
-                itad_game_id = await get_itad_game_id(search_name_for_other_apis)
-            except Exception as e:
-                logging.error(f"Referans oyun adıyla da ITAD ID'si bulunamadı: {e}")
-                # ID bulunamazsa, diğer ITAD görevlerini başlatma
-                itad_game_id = None 
-
-        tasks = {
-            "ps": get_playstation_price(search_name_for_other_apis),
-        }
-
-        if itad_game_id:
-            tasks["itad_cdkey_prices"] = get_itad_prices(itad_game_id, cdkey_shop_ids)
-            tasks["historical_lows"] = get_historical_lows(itad_game_id)
-            tasks["itad_subscriptions"] = get_itad_subscriptions(itad_game_id)
-        else:
-            logging.warning("ITAD ID bulunamadığı için ilgili görevler başlatılmadı.")
+            logging.warning(f"Sıra bilgisi güncellenemedi: {e}")
 
-        results_from_gather = await asyncio.gather(*tasks.values(), return_exceptions=True)
-        sonuclar = dict(zip(tasks.keys(), results_from_gather))
-        sonuclar["steam"] = steam_sonucu
-
-        itad_all_prices = sonuclar.pop("itad_cdkey_prices", None)
-        if isinstance(itad_all_prices, dict):
-            sonuclar["epic"] = itad_all_prices.get("epic")
-            sonuclar["cdkey"] = itad_all_prices.get("cdkey")
-            sonuclar["xbox"] = itad_all_prices.get("xbox")
-
-        # Xbox için yedek arama mantığı
-        if sonuclar.get("xbox") is None:
-            logging.info("ITAD'dan Xbox fiyatı alınamadı, yedek yöntem deneniyor.")
-            try:
-                # xbox_yedek_sonuc değişkenini tanımlıyoruz ve yedek fonksiyonu çağırıyoruz
-                xbox_yedek_sonuc = await get_xbox_price(search_name_for_other_apis)
-                if xbox_yedek_sonuc:
-                    sonuclar["xbox"] = xbox_yedek_sonuc
-                    logging.info("✅ Yedek yöntemle Xbox fiyatı başarıyla alındı.")
-                else:
-                    logging.warning("❌ Yedek yöntem de Xbox fiyatı bulamadı.")
-            except Exception as e:
-                logging.error(f"Xbox yedek yöntemi çalışırken hata oluştu: {e}")
-
-        subscriptions = sonuclar.get("itad_subscriptions", [])
-        historical_lows = sonuclar.get("historical_lows", {})
-
-        # Embed oluştur
-        embed = discord.Embed(title=f"🎮 {display_game_name} Fiyat Bilgisi ve Linkler V.0.97", color=discord.Color.from_rgb(16, 124, 16))
-        embed.set_footer(text="Fiyatlar anlık olarak mağazalardan ve bazı API'lerden çekilmektedir.")
-
-        def get_not_found_text(platform_name):
-            return f"*Mağazada bulunamadı ya da satışta değil.*"
-
-        # ... (Steam, Xbox, PlayStation, Epic Games, CD-Key alanlarını işleyen kod aynen kalıyor)
-        # Sadece get_xbox_price ve on_message fonksiyonlarının kod içindeki yerlerini doğru ayarladığınızdan emin olun.
-        # ... (Geri kalan kodunuz)
-
-        # --- Steam için alan ekle ---
-        steam_result = sonuclar.get("steam")
-        steam_price_info = steam_result.get("price", "N/A") if steam_result else "N/A"
-        steam_link = steam_result.get("link", "#") if steam_result else "#"
-
-        display_text_steam = "N/A"
-        if isinstance(steam_price_info, tuple):
-            price, currency = steam_price_info
-            try_rate = get_usd_to_try_rate()
-            if try_rate and currency == "USD":
-                tl_price = price * try_rate
-                display_text_steam = f"${price:,.2f} {currency}\n(≈ {tl_price:,.2f} TL)".replace(",", "X").replace(".", ",").replace("X", ".")
-            else:
-                display_text_steam = f"{price} {currency}"
-        elif steam_price_info != "N/A":
-            display_text_steam = str(steam_price_info)
-
-        if display_text_steam == "N/A":
-             field_value_steam = get_not_found_text("Steam")
-        else:
-            low_price_steam = historical_lows.get(61)
-            if low_price_steam:
-                display_text_steam += f"\n*En Düşük Fiyat: {low_price_steam}*"
-            field_value_steam = f"[{display_text_steam}]({steam_link})"
-        embed.add_field(name="Steam", value=field_value_steam, inline=True)
-
-        # --- Xbox için alan ekle (ITAD veya Yedekten çekilen) ---
-        xbox_result = sonuclar.get("xbox")
-        xbox_price = xbox_result.get("price") if xbox_result else None
-        xbox_link = xbox_result.get("link", "#") if xbox_result else "#"
-
-        display_text_xbox = None 
-
-        if xbox_price:
-            display_text_xbox = xbox_price
-
-        subs_to_show = []
-        if any("Game Pass" in s for s in subscriptions): subs_to_show.append("Game Pass'e Dahil")
-        if any("EA Play" in s for s in subscriptions): subs_to_show.append("EA Play'e Dahil")
-
-        if display_text_xbox:
-            if subs_to_show:
-                display_text_xbox += "\n*" + " & ".join(subs_to_show) + "*"
-            low_price_xbox = historical_lows.get(15)
-            if low_price_xbox:
-                display_text_xbox += f"\n*En Düşük Fiyat: {low_price_xbox}*"
-            field_value_xbox = f"[{display_text_xbox}]({xbox_link})"
-        elif subs_to_show:
-            display_text_xbox = "Fiyat Bulunamadı."
-            display_text_xbox += "\n*" + " & ".join(subs_to_show) + "*"
-            field_value_xbox = f"[{display_text_xbox}]({xbox_link})"
-        else:
-            field_value_xbox = get_not_found_text("Xbox")
-
-        embed.add_field(name="Xbox", value=field_value_xbox, inline=True)
-
-        # --- PlayStation için alan ekle ---
-        ps_result = sonuclar.get("ps")
-        ps_price = ps_result.get("price") if ps_result and ps_result.get("price") else None
-        ps_link = ps_result.get("link", "#") if ps_result else "#"
-
-        if ps_price:
-            field_value_ps = f"[{ps_price}]({ps_link})"
-        else:
-            field_value_ps = get_not_found_text("PlayStation")
-        embed.add_field(name="PlayStation", value=field_value_ps, inline=True)
-
-        # --- Epic Games için alan ekle ---
-        epic_result = sonuclar.get("epic")
-        epic_price = epic_result.get("price") if epic_result else None
-        epic_link = epic_result.get("link", "#") if epic_result else "#"
-
-        if epic_price:
-            display_text_epic = epic_price
-            low_price_epic = historical_lows.get(16)
-            if low_price_epic:
-                display_text_epic += f"\n*En Düşük Fiyat: {low_price_epic}*"
-            field_value_epic = f"[{display_text_epic}]({epic_link})"
-        else:
-            field_value_epic = get_not_found_text("Epic Games")
-        embed.add_field(name="Epic Games", value=field_value_epic, inline=True)
-
-        # --- CD-Key için alan ekle ---
-        cdkey_result = sonuclar.get("cdkey")
-        cdkey_price = cdkey_result.get("price") if cdkey_result else None
-        cdkey_link = cdkey_result.get("link", "#") if cdkey_result else "#"
-        cdkey_drm = cdkey_result.get("drm") if cdkey_result else None
-
-        if cdkey_price:
-            display_text_cdkey = cdkey_price
-            if cdkey_drm:
-                display_text_cdkey += f" - {cdkey_drm}"
-            field_value_cdkey = f"[{display_text_cdkey}]({cdkey_link})"
+    streamer = EmbedStreamer(msg)
+    guild_id = message.guild.id if message.guild else "dm"
+    try:
+        display_game_name, sonuclar = await lookup_scheduler.run(
+            oyun_adi_orjinal, guild_id, message.author.id, streamer.push, show_queue_position
+        )
+    except LookupRejected as e:
+        if e.reason == "user":
+            await msg.edit(content="Zaten sırada bekleyen sorgularınız var, lütfen onlar bitince tekrar deneyin.")
         else:
-            field_value_cdkey = "*CD-Key mağazalarında indirimli bulunamadı.*"
-        embed.add_field(name="En Ucuz CD-Key", value=field_value_cdkey, inline=True)
-
-        await msg.edit(content=None, embed=embed)
+            await msg.edit(content="Şu an çok fazla fiyat sorgusu var, lütfen biraz sonra tekrar deneyin.")
+        return
+    await streamer.finish(display_game_name, sonuclar)
 
 # --- Botu ve Sunucuyu Başlatma ---
-# keep_alive() # Gerekliyse yorum satırını kaldırın
-DISCORD_TOKEN = os.environ.get('DISCORD_TOKEN')
-if DISCORD_TOKEN:
-    client.run(DISCORD_TOKEN)
-else:
-    logging.critical("HATA: DISCORD_TOKEN .env dosyasında bulunamadı.")
\ No newline at end of file
+# Web API (ve /metrics) bot ile aynı event loop'ta setup_hook içinde başlatılır; WEB_API_ENABLED=0 ile kapatılabilir.
+# Discord olmadan toplu fiyat sorgusu için: python batch.py <oyun listesi> -o sonuclar.jsonl (bkz. batch.py)
+if __name__ == "__main__":
+    DISCORD_TOKEN = os.environ.get('DISCORD_TOKEN')
+    if DISCORD_TOKEN:
+        client.run(DISCORD_TOKEN)
+    else:
+        logging.critical("HATA: DISCORD_TOKEN .env dosyasında bulunamadı.")
\ No newline at end of file
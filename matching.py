@@ -0,0 +1,147 @@
+# --- Başlık Normalizasyonu ve Eşleşme Puanlama Motoru ---
+# Tüm mağazalar aynı temizleme ve puanlama kurallarını buradan kullanır. Desenler modül
+# yüklenirken bir kez derlenir, normalize edilmiş başlıklar LRU önbellekte tutulur; aynı
+# başlık hem sorguda hem de her mağazanın sonuç listesinde tekrar tekrar geçer.
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+TITLE_CACHE_SIZE = 8192
+
+# ™, ®, © ve kesme işaretleri tamamen silinir ("The Last of Us™" -> "The Last of Us").
+_STRIP_SYMBOLS = str.maketrans("", "", "™®©'’")
+_NON_WORD_RE = re.compile(r'[^\w\s]', flags=re.UNICODE)
+# Eskiden sırayla çalışan yedi re.sub tek bir alternasyonda birleştirildi.
+_EDITION_WORDS_RE = re.compile(
+    r'\s*\(?goty\)?\s*'
+    r'|\s*\(?game of the year\)?\s*'
+    r'|\s*edition\s*'
+    r'|\s*sürümü\s*'
+    r'|\s*remastered\s*'
+    r'|\s*ultimate\s*'
+    r'|\s*deluxe\s*',
+    flags=re.I,
+)
+_WHITESPACE_RE = re.compile(r'\s+')
+_DIGITS_RE = re.compile(r'\d+')
+# Sondaki Romen rakamı -> Arap rakamı; sıra önemli (" IV", " I"'den önce denenmeli).
+_TRAILING_ROMAN = ((" IV", " 4", 4), (" IX", " 9", 9), (" V", " 5", 5), (" III", " 3", 3), (" II", " 2", 2), (" I", " 1", 1))
+_SEQUEL_ROMAN = ((" II ", 2), (" III ", 3), (" IV ", 4), (" V ", 5))
+_PLATFORM_MARKERS = ("ps4", "ps5")
+
+# Puanı bu eşiğin altında kalan en iyi aday "eşleşme yok" sayılır.
+MIN_MATCH_SCORE = 50
+
+Match = namedtuple("Match", "score index title cleaned reasons")
+
+def clean_and_extract_roman(name):
+    """Converts Roman numerals at the end of a string to Arabic numerals."""
+    name = name.upper()
+    for roman, arabic, value in _TRAILING_ROMAN:
+        if name.endswith(roman):
+            return name.replace(roman, arabic), value
+    return name.lower(), None # Return original cleaned name if no roman numeral
+
+@lru_cache(maxsize=TITLE_CACHE_SIZE)
+def clean_game_name(game_name):
+    # Romen rakamlarını sayılara çevir, orijinal metni koru
+    name_with_arabic, _ = clean_and_extract_roman(game_name)
+    cleaned_name = name_with_arabic.translate(_STRIP_SYMBOLS)
+    # Kalan özel karakterleri (harf, rakam veya boşluk olmayan her şeyi) boşlukla değiştir.
+    cleaned_name = _NON_WORD_RE.sub(' ', cleaned_name)
+    cleaned_name = _EDITION_WORDS_RE.sub(' ', cleaned_name)
+    cleaned_name = _WHITESPACE_RE.sub(' ', cleaned_name)
+    return cleaned_name.strip().lower()
+
+@lru_cache(maxsize=TITLE_CACHE_SIZE)
+def extract_numbers_from_title(title):
+    """Extracts all Arabic and Roman numerals from a game title."""
+    numbers = set(map(int, _DIGITS_RE.findall(title)))
+    # Romen rakamları ayrı kelime olarak aranır ('is' içindeki 'I' eşleşmesin diye)
+    title_upper = f" {title.upper()} "
+    for roman, value in _SEQUEL_ROMAN:
+        if roman in title_upper:
+            numbers.add(value)
+    return frozenset(numbers)
+
+def _score_sequel(query_numbers, result_numbers, penalty_reason):
+    """Returns a reason string when the candidate is the wrong entry of a series, else None."""
+    if query_numbers:
+        if not query_numbers.intersection(result_numbers):
+            return f"sorgudaki sayı {sorted(query_numbers)} başlıkta yok ({penalty_reason})"
+    elif any(n > 1 for n in result_numbers):
+        return f"istenmeyen devam oyunu {sorted(result_numbers)} ({penalty_reason})"
+    return None
+
+def _score_containment(query, cleaned, query_numbers):
+    # Steam ve Xbox: sorgu başlıkta geçiyorsa 90, başlık sorguda geçiyorsa 85.
+    if query in cleaned:
+        score, reasons = 90, ["sorgu başlıkta geçiyor (+90)"]
+    elif cleaned in query:
+        score, reasons = 85, ["başlık sorguda geçiyor (+85)"]
+    else:
+        return None, ["başlık eşleşmiyor"]
+    sequel = _score_sequel(query_numbers, extract_numbers_from_title(cleaned), "-100")
+    if sequel:
+        score -= 100
+        reasons.append(sequel)
+    return score, reasons
+
+def _score_playstation(query, cleaned, query_numbers):
+    # PlayStation: önek eşleşmesi tercih edilir, fazladan her karakter bir puan düşürür.
+    if cleaned.startswith(query):
+        score, reasons = 95, ["başlık sorguyla başlıyor (95)"]
+    elif query in cleaned:
+        score, reasons = 90, ["sorgu başlıkta geçiyor (90)"]
+    else:
+        return None, ["başlık eşleşmiyor"]
+    length_penalty = len(cleaned) - len(query)
+    score -= length_penalty
+    reasons.append(f"uzunluk farkı (-{length_penalty})")
+
+    result_numbers = extract_numbers_from_title(cleaned)
+    if query_numbers:
+        sequel = _score_sequel(query_numbers, result_numbers, "elendi")
+    elif any(marker in cleaned for marker in _PLATFORM_MARKERS):
+        # PS4, PS5 gibi platform ibareleri devam oyunu sayılmaz
+        sequel = None
+    else:
+        sequel = _score_sequel(query_numbers, result_numbers, "elendi")
+    if sequel:
+        score = -1
+        reasons.append(sequel)
+    return score, reasons
+
+SCORING_PROFILES = {
+    "steam": _score_containment,
+    "xbox": _score_containment,
+    "playstation": _score_playstation,
+}
+
+def score_candidate(query, title, profile):
+    """Scores one store title against the query; the score is None when the title does not match at all."""
+    return SCORING_PROFILES[profile](query, clean_game_name(title), extract_numbers_from_title(query))
+
+def rank_candidates(query, titles, profile):
+    """Scores every title in one pass and returns the matching ones, best first.
+
+    Ties keep the store's original order, so the first of several equally good
+    results wins, as the old per-store loops did.
+    """
+    scorer = SCORING_PROFILES[profile]
+    query_numbers = extract_numbers_from_title(query)
+    matches = []
+    for index, title in enumerate(titles):
+        cleaned = clean_game_name(title)
+        score, reasons = scorer(query, cleaned, query_numbers)
+        if score is not None:
+            matches.append(Match(score, index, title, cleaned, reasons))
+    matches.sort(key=lambda match: (-match.score, match.index))
+    return matches
+
+def best_candidate(query, titles, profile, min_score=MIN_MATCH_SCORE):
+    """Returns the highest-ranked Match, or None when nothing reaches min_score."""
+    matches = rank_candidates(query, titles, profile)
+    if matches and matches[0].score >= min_score:
+        return matches[0]
+    return None
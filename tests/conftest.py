@@ -0,0 +1,18 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+# main.py yolları import sırasında okur; testler repo içindeki data/ ve debug_output/'a yazmasın.
+_work_dir = tempfile.mkdtemp(prefix="fiyatbot-tests-")
+for name, value in {
+    "LOG_FILE": os.path.join(_work_dir, "bot.log"),
+    "ARTIFACT_DIR": os.path.join(_work_dir, "artifacts"),
+    "RESOLUTION_DB_PATH": os.path.join(_work_dir, "resolutions.sqlite3"),
+    "EXCHANGE_RATE_PATH": os.path.join(_work_dir, "exchange_rates.json"),
+    "STEAM_TITLE_INDEX_DIR": os.path.join(_work_dir, "steam_title_index"),
+    "WATCHLIST_DB_PATH": os.path.join(_work_dir, "watchlist.sqlite3"),
+}.items():
+    os.environ.setdefault(name, value)
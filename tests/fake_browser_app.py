@@ -0,0 +1,34 @@
+# Tarayıcı işçisi testleri için Chromium gerektirmeyen sahte uygulama modülü (bkz. test_browser_workers.py).
+import contextvars
+import os
+
+from log_pipeline import log_context
+
+current_deadline = contextvars.ContextVar("current_deadline", default=None)
+
+class Deadline:
+    def __init__(self, budget):
+        self.budget = budget
+
+class FakeSupervisor:
+    stores = []
+
+    def start(self):
+        pass
+
+    async def ensure(self):
+        pass
+
+    async def close(self):
+        pass
+
+browser_supervisor = FakeSupervisor()
+
+async def scrape(game_name):
+    if game_name == "crash":
+        os._exit(3)
+    if game_name == "fail":
+        raise RuntimeError("scraper broke")
+    return {"price": "100 TL", "name": game_name, "pid": os.getpid()}
+
+BROWSER_SCRAPERS = {"fake": scrape}
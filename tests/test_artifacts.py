@@ -0,0 +1,73 @@
+import asyncio
+import json
+import os
+import time
+
+import artifacts
+
+class FakeResponse:
+    def __init__(self, url, text):
+        self.url = url
+        self.text = text
+
+async def capture(store, *calls):
+    for store_name, game, error in calls:
+        store.capture_response(FakeResponse(f"https://example.com/{game}", "<html>" + "x" * 100 + "</html>"), store_name, game, error)
+        await asyncio.gather(*store._background_tasks)
+
+def test_error_signature_ignores_volatile_parts():
+    a = artifacts.error_signature("xbox", ValueError("timeout after 3000 ms for 'Hades'"))
+    b = artifacts.error_signature("xbox", ValueError("timeout after 4500 ms for 'Elden Ring'"))
+    assert a == b
+    assert a != artifacts.error_signature("playstation", ValueError("timeout after 3000 ms for 'Hades'"))
+
+def test_duplicates_inside_the_window_are_counted_not_saved(tmp_path):
+    store = artifacts.ArtifactStore(str(tmp_path), dedupe_window=900)
+    error = RuntimeError("selector not found")
+    asyncio.run(capture(store, ("xbox", "hades", error), ("xbox", "elden ring", error), ("ps", "hades", error)))
+
+    entries = store.entries()
+    assert [entry["store"] for entry in entries] == ["xbox", "ps"]
+    assert entries[0]["duplicates"] == 1
+    index = json.loads((tmp_path / artifacts.INDEX_FILE).read_text(encoding="utf-8"))
+    assert [entry["id"] for entry in index] == [entry["id"] for entry in entries]
+    assert all(os.path.exists(tmp_path / name) for entry in entries for name in entry["files"])
+
+def test_oldest_entries_are_pruned_past_the_size_limit(tmp_path):
+    store = artifacts.ArtifactStore(str(tmp_path), dedupe_window=0, max_bytes=1)
+    asyncio.run(capture(store, ("xbox", "first", ValueError("a")), ("xbox", "second", ValueError("b"))))
+
+    assert store.entries() == []
+    assert sorted(os.listdir(tmp_path)) == [artifacts.INDEX_FILE]
+
+def test_pruning_keeps_entries_that_fit(tmp_path):
+    store = artifacts.ArtifactStore(str(tmp_path), dedupe_window=0)
+    asyncio.run(capture(store, ("xbox", "first", ValueError("a"))))
+    store.max_bytes = store.total_bytes * 2 - 1
+    asyncio.run(capture(store, ("xbox", "second", ValueError("b"))))
+    assert [entry["game"] for entry in store.entries()] == ["second"]
+
+def test_expired_entries_are_pruned_without_new_failures(tmp_path, monkeypatch):
+    store = artifacts.ArtifactStore(str(tmp_path), dedupe_window=0, max_age=60)
+    asyncio.run(capture(store, ("xbox", "first", ValueError("a"))))
+    assert store.total_bytes > 0
+
+    later = time.time() + 61
+    monkeypatch.setattr(artifacts.time, "time", lambda: later)
+    assert store.entries() == []
+    asyncio.run(store.prune())
+    assert store.total_bytes == 0
+    assert sorted(os.listdir(tmp_path)) == [artifacts.INDEX_FILE]
+
+def test_dedupe_signatures_expire_after_the_window(monkeypatch):
+    store = artifacts.ArtifactStore(dedupe_window=900)
+    now = [1000.0]
+    monkeypatch.setattr(artifacts.time, "time", lambda: now[0])
+    assert store.admit("xbox", ValueError("a")) is not None
+    now[0] += 100
+    assert store.admit("xbox", ValueError("b")) is not None
+    assert store.admit("xbox", ValueError("a")) is None
+
+    now[0] += 850
+    assert store.admit("ps", ValueError("c")) is not None
+    assert list(store._last_seen) == [artifacts.error_signature("xbox", ValueError("b")), artifacts.error_signature("ps", ValueError("c"))]
@@ -0,0 +1,40 @@
+import io
+import json
+
+import batch
+
+def test_read_titles_skips_blanks_comments_and_duplicates(tmp_path, monkeypatch):
+    path = tmp_path / "titles.txt"
+    path.write_text("Hades\n\n# yorum\n  Elden Ring  \nHades\n", encoding="utf-8")
+    assert batch.read_titles(str(path)) == ["Hades", "Elden Ring"]
+
+    monkeypatch.setattr("sys.stdin", io.StringIO("Portal\nPortal 2\n"))
+    assert batch.read_titles("-") == ["Portal", "Portal 2"]
+
+def test_completed_titles_ignores_errors_and_partial_lines(tmp_path):
+    path = tmp_path / "out.jsonl"
+    path.write_text(
+        json.dumps({"query": "Hades", "name": "Hades"}) + "\n"
+        + json.dumps({"query": "Portal", "error": "RuntimeError: boom"}) + "\n"
+        + '{"query": "Elden Ri',
+        encoding="utf-8",
+    )
+    assert batch.completed_titles(str(path)) == {"Hades"}
+    assert batch.completed_titles(str(tmp_path / "missing.jsonl")) == set()
+
+def test_open_output_repairs_a_cut_off_last_line(tmp_path):
+    path = tmp_path / "out.jsonl"
+    path.write_text('{"query": "Hades"}\n{"query": "Elden Ri', encoding="utf-8")
+    with batch.open_output(str(path)) as out:
+        out.write(json.dumps({"query": "Portal"}) + "\n")
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert lines[-1] == '{"query": "Portal"}'
+    assert batch.completed_titles(str(path)) == {"Hades", "Portal"}
+
+def test_open_output_keeps_complete_files_as_is(tmp_path):
+    path = tmp_path / "sub" / "out.jsonl"
+    with batch.open_output(str(path)) as out:
+        out.write('{"query": "Hades"}\n')
+    with batch.open_output(str(path)) as out:
+        out.write('{"query": "Portal"}\n')
+    assert path.read_text(encoding="utf-8") == '{"query": "Hades"}\n{"query": "Portal"}\n'
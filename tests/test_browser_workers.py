@@ -0,0 +1,52 @@
+import asyncio
+import sys
+import types
+
+import pytest
+
+import browser_workers
+
+async def wait_until_ready(worker, timeout=30):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not worker.is_ready():
+        assert asyncio.get_running_loop().time() < deadline, "worker did not come back"
+        await asyncio.sleep(0.05)
+
+def test_worker_serves_jobs_and_respawns_after_crash():
+    async def scenario():
+        pool = browser_workers.BrowserWorkerPool(["fake"], workers_per_store=1, app_name="fake_browser_app")
+        await pool.start()
+        worker = pool.workers["fake"][0]
+        try:
+            first = await pool.run("fake", "hades", 10)
+            assert first["name"] == "hades"
+
+            with pytest.raises(browser_workers.WorkerJobFailed, match="scraper broke"):
+                await pool.run("fake", "fail", 10)
+
+            with pytest.raises(browser_workers.WorkerCrashed):
+                await pool.run("fake", "crash", 10)
+            assert worker.pending == {}
+
+            await wait_until_ready(worker)
+            second = await pool.run("fake", "hades", 10)
+            assert second["name"] == "hades"
+            assert second["pid"] != first["pid"]
+        finally:
+            await pool.close()
+    asyncio.run(scenario())
+
+def test_run_without_ready_worker_fails():
+    async def scenario():
+        pool = browser_workers.BrowserWorkerPool(["fake"], workers_per_store=1, app_name="fake_browser_app")
+        with pytest.raises(browser_workers.WorkerJobFailed):
+            await pool.run("fake", "hades", 10)
+    asyncio.run(scenario())
+
+def test_worker_reuses_main_script_already_run_by_spawn(monkeypatch):
+    mp_main = types.ModuleType("__mp_main__")
+    mp_main.__file__ = "/srv/fiyatbot/fake_browser_app.py"
+    monkeypatch.setitem(sys.modules, "__mp_main__", mp_main)
+    monkeypatch.delitem(sys.modules, "fake_browser_app", raising=False)
+    assert browser_workers._load_app("fake_browser_app") is mp_main
+    assert sys.modules["fake_browser_app"] is mp_main
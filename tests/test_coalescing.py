@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+import main
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    main.inflight_lookups.clear()
+    yield
+    main.inflight_lookups.clear()
+
+@pytest.fixture
+def lookups(monkeypatch):
+    calls = []
+    release = {}
+
+    async def fake_lookup(query, progress=None, api_only=False):
+        calls.append(query)
+        await release["event"].wait()
+        if query == "Broken":
+            raise RuntimeError("lookup failed")
+        progress.stage_done("steam", {"price": "100"})
+        return query, {"steam": {"price": "100"}}
+
+    monkeypatch.setattr(main, "lookup_prices", fake_lookup)
+    return calls, release
+
+def test_identical_queries_share_one_lookup_and_its_progress(lookups):
+    calls, release = lookups
+    seen = {"first": [], "second": []}
+
+    async def scenario():
+        release["event"] = asyncio.Event()
+        first = asyncio.create_task(main.lookup_prices_coalesced("Hades", on_progress=seen["first"].append))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(main.lookup_prices_coalesced("HADES™", on_progress=seen["second"].append))
+        await asyncio.sleep(0)
+        release["event"].set()
+        return await asyncio.gather(first, second)
+
+    first, second = asyncio.run(scenario())
+    assert calls == ["Hades"]
+    assert first == second == ("Hades", {"steam": {"price": "100"}})
+    # Her iki mesaj da hem ilk durumu hem de ara sonucu alır.
+    assert [len(snapshots) for snapshots in seen.values()] == [2, 2]
+    assert main.inflight_lookups == {}
+
+def test_cancelled_waiter_does_not_cancel_the_shared_lookup(lookups):
+    calls, release = lookups
+
+    async def scenario():
+        release["event"] = asyncio.Event()
+        first = asyncio.create_task(main.lookup_prices_coalesced("Hades"))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(main.lookup_prices_coalesced("Hades"))
+        await asyncio.sleep(0)
+        first.cancel()
+        release["event"].set()
+        return await second
+
+    assert asyncio.run(scenario())[0] == "Hades"
+    assert calls == ["Hades"]
+
+def test_failure_reaches_every_waiter_and_next_query_starts_fresh(lookups):
+    calls, release = lookups
+
+    async def scenario():
+        release["event"] = asyncio.Event()
+        waiters = [asyncio.create_task(main.lookup_prices_coalesced("Broken")) for _ in range(2)]
+        await asyncio.sleep(0)
+        release["event"].set()
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        await main.lookup_prices_coalesced("Hades")
+
+    asyncio.run(scenario())
+    assert calls == ["Broken", "Hades"]
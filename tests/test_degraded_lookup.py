@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+import main
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    main.price_cache._entries.clear()
+    main.inflight_lookups.clear()
+    yield
+    main.price_cache._entries.clear()
+    main.inflight_lookups.clear()
+
+def test_degraded_console_miss_is_not_cached(monkeypatch):
+    async def http_fails(game_name):
+        raise RuntimeError("http down")
+
+    async def browser(store, game_name):
+        return {"price": "₺899,00", "link": f"https://{store}/{game_name}"}
+
+    monkeypatch.setattr(main, "get_xbox_price_http", http_fails)
+    monkeypatch.setattr(main, "get_playstation_price_http", http_fails)
+    monkeypatch.setattr(main, "scrape_with_browser", browser)
+
+    async def fetch(store, fetcher, api_only):
+        main.api_only_lookup.set(api_only)
+        return await main.price_cache.get_or_fetch(store, "hades", lambda: fetcher("hades"))
+
+    async def scenario():
+        for store, fetcher in (("xbox", main.get_xbox_price), ("playstation", main.get_playstation_price)):
+            with pytest.raises(main.BrowserSkipped):
+                await asyncio.create_task(fetch(store, fetcher, api_only=True))
+            assert (store, "hades") not in main.price_cache._entries
+            result = await asyncio.create_task(fetch(store, fetcher, api_only=False))
+            assert result["price"] == "₺899,00"
+
+    asyncio.run(scenario())
+
+def test_full_lookup_does_not_join_degraded_one(monkeypatch):
+    calls = []
+
+    async def fake_lookup(query, progress=None, api_only=False):
+        calls.append(api_only)
+        await asyncio.sleep(0.01)
+        return query, {"api_only": api_only}
+
+    monkeypatch.setattr(main, "lookup_prices", fake_lookup)
+
+    async def scenario():
+        degraded = asyncio.create_task(main.lookup_prices_coalesced("Hades", api_only=True))
+        await asyncio.sleep(0)
+        full = await main.lookup_prices_coalesced("Hades")
+        assert full[1]["api_only"] is False
+        assert (await degraded)[1]["api_only"] is True
+
+        # Tam sorgu çalışırken gelen eksik sorgu onun sonucunu paylaşır.
+        full_task = asyncio.create_task(main.lookup_prices_coalesced("Hades"))
+        await asyncio.sleep(0)
+        joined = await main.lookup_prices_coalesced("Hades", api_only=True)
+        assert joined[1]["api_only"] is False
+        await full_task
+
+    asyncio.run(scenario())
+    assert calls == [True, False, False]
@@ -0,0 +1,60 @@
+import asyncio
+
+import httpx
+import pytest
+
+import fixtures
+
+@pytest.fixture
+def fixture_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(fixtures, "FIXTURE_DIR", str(tmp_path))
+    return tmp_path
+
+def test_fixture_path_ignores_param_order_and_secrets(fixture_dir):
+    a = fixtures.fixture_path("GET", "https://api.isthereanydeal.com/games/search/v1?title=Hades&key=secret1&results=5")
+    b = fixtures.fixture_path("GET", "https://api.isthereanydeal.com/games/search/v1?results=5&title=Hades&key=secret2")
+    assert a == b
+    assert a.startswith(str(fixture_dir / "api.isthereanydeal.com"))
+    assert a != fixtures.fixture_path("GET", "https://api.isthereanydeal.com/games/search/v1?title=Celeste&results=5")
+    assert a != fixtures.fixture_path("POST", "https://api.isthereanydeal.com/games/search/v1?title=Hades&results=5")
+
+def test_fixture_path_sorts_itad_id_lists(fixture_dir):
+    url = "https://api.isthereanydeal.com/games/prices/v3?country=TR"
+    assert fixtures.fixture_path("POST", url, b'["b", "a"]') == fixtures.fixture_path("POST", url, b'["a","b"]')
+    assert fixtures.fixture_path("POST", url, b'["a"]') != fixtures.fixture_path("POST", url, b'["a","b"]')
+
+def test_recorded_response_replays_without_network(fixture_dir, monkeypatch):
+    seen = []
+
+    def upstream(request):
+        seen.append(str(request.url))
+        return httpx.Response(200, json={"items": [{"name": "Hades"}]}, headers={"x-upstream": "1"})
+
+    async def fetch():
+        transport = fixtures.FixtureTransport(httpx.MockTransport(upstream))
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await client.get("https://store.steampowered.com/api/storesearch/", params={"term": "hades", "key": "secret"})
+
+    monkeypatch.setattr(fixtures, "FIXTURE_MODE", "record")
+    recorded = asyncio.run(fetch())
+    assert recorded.json() == {"items": [{"name": "Hades"}]}
+    saved = list(fixture_dir.rglob("*.json"))
+    assert len(saved) == 1
+    assert "secret" not in saved[0].read_text(encoding="utf-8")
+
+    monkeypatch.setattr(fixtures, "FIXTURE_MODE", "replay")
+    replayed = asyncio.run(fetch())
+    assert len(seen) == 1
+    assert replayed.status_code == 200
+    assert replayed.json() == recorded.json()
+    assert replayed.headers["x-upstream"] == "1"
+
+def test_replay_without_recording_raises(fixture_dir, monkeypatch):
+    monkeypatch.setattr(fixtures, "FIXTURE_MODE", "replay")
+
+    async def fetch():
+        async with httpx.AsyncClient(transport=fixtures.FixtureTransport()) as client:
+            return await client.get("https://store.steampowered.com/api/appdetails", params={"appids": "1145360"})
+
+    with pytest.raises(fixtures.FixtureMissing):
+        asyncio.run(fetch())
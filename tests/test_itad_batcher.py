@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+import main
+
+@pytest.fixture
+def posted(monkeypatch):
+    calls = []
+
+    async def fake_batch(path, params, game_ids):
+        game_ids = list(game_ids)
+        calls.append(game_ids)
+        if "broken" in game_ids:
+            raise main.ItadBatchError(500, "oops")
+        return {game_id: {"id": game_id, "path": path} for game_id in game_ids if game_id != "unknown"}
+
+    monkeypatch.setattr(main, "post_itad_batch", fake_batch)
+    return calls
+
+def test_concurrent_ids_share_one_request(posted):
+    async def scenario():
+        batcher = main.ItadBatcher("/games/prices/v3", {}, window=0.01, max_size=100)
+        return await asyncio.gather(batcher.fetch("a"), batcher.fetch("b"), batcher.fetch("unknown"))
+
+    a, b, unknown = asyncio.run(scenario())
+    assert posted == [["a", "b", "unknown"]]
+    assert a == {"id": "a", "path": "/games/prices/v3"}
+    assert b["id"] == "b"
+    assert unknown is None
+
+def test_full_batch_is_sent_without_waiting_for_the_window(posted):
+    async def scenario():
+        batcher = main.ItadBatcher("/games/prices/v3", {}, window=60, max_size=2)
+        results = await asyncio.wait_for(asyncio.gather(batcher.fetch("a"), batcher.fetch("b")), timeout=5)
+        assert batcher._timer is None
+        return results
+
+    assert [entry["id"] for entry in asyncio.run(scenario())] == ["a", "b"]
+    assert posted == [["a", "b"]]
+
+def test_duplicate_ids_in_one_window_are_requested_once(posted):
+    async def scenario():
+        batcher = main.ItadBatcher("/games/prices/v3", {}, window=0.01, max_size=100)
+        return await asyncio.gather(batcher.fetch("a"), batcher.fetch("a"), batcher.fetch("b"))
+
+    first, second, _ = asyncio.run(scenario())
+    assert posted == [["a", "b"]]
+    assert first == second == {"id": "a", "path": "/games/prices/v3"}
+
+def test_failed_request_fails_every_caller_in_the_batch(posted):
+    async def scenario():
+        batcher = main.ItadBatcher("/games/prices/v3", {}, window=0.01, max_size=100)
+        return await asyncio.gather(batcher.fetch("a"), batcher.fetch("broken"), batcher.fetch("a"), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert posted == [["a", "broken"]]
+    assert all(isinstance(result, main.ItadBatchError) for result in results)
@@ -0,0 +1,36 @@
+import asyncio
+
+import httpx
+import pytest
+
+import main
+
+@pytest.fixture
+def itad(monkeypatch, tmp_path):
+    store = main.ResolutionStore(str(tmp_path / "resolutions.sqlite3"))
+    monkeypatch.setattr(main, "resolution_store", store)
+    monkeypatch.setattr(main, "ITAD_API_KEY", "test-key")
+    results = []
+
+    async def fake_hedged_get(host, path, name, params=None, timeout=None):
+        return httpx.Response(200, json=results)
+
+    monkeypatch.setattr(main, "hedged_get", fake_hedged_get)
+    return store, results
+
+def test_confident_match_is_persisted(itad):
+    store, results = itad
+    results.extend([
+        {"id": "dlc", "slug": "hades-ii", "title": "Hades II"},
+        {"id": "game", "slug": "hades", "title": "Hades"},
+    ])
+    assert asyncio.run(main.get_itad_game_id("Hades")) == "game"
+    resolved = asyncio.run(store.get("hades", "itad"))
+    assert resolved["store_id"] == "game"
+    assert resolved["confidence"] >= main.RESOLUTION_MIN_CONFIDENCE
+
+def test_weak_match_is_used_but_not_persisted(itad):
+    store, results = itad
+    results.append({"id": "other", "slug": "celeste", "title": "Celeste"})
+    assert asyncio.run(main.get_itad_game_id("Hades")) == "other"
+    assert asyncio.run(store.get("hades", "itad")) is None
@@ -0,0 +1,53 @@
+import json
+import logging
+import queue
+
+import log_pipeline
+
+def make_record(level=logging.INFO, msg="hello %s", args=("world",)):
+    return logging.LogRecord("test", level, __file__, 1, msg, args, None, func="lookup")
+
+def filtered(record):
+    return log_pipeline.ContextFilter().filter(record)
+
+def test_json_formatter_includes_context_fields():
+    with log_pipeline.log_context(query_id="abcd1234", store="xbox"):
+        record = make_record()
+        assert filtered(record)
+    entry = json.loads(log_pipeline.JsonFormatter().format(record))
+    assert entry["msg"] == "hello world"
+    assert entry["level"] == "INFO"
+    assert entry["func"] == "lookup"
+    assert entry["query_id"] == "abcd1234"
+    assert entry["store"] == "xbox"
+    assert "stage" not in entry
+    assert record.context == " [query_id=abcd1234 store=xbox]"
+
+def test_log_context_nests_and_resets():
+    with log_pipeline.log_context(query_id="q1"):
+        with log_pipeline.log_context(store="steam"):
+            assert log_pipeline.current_context() == {"query_id": "q1", "store": "steam"}
+        assert log_pipeline.current_context() == {"query_id": "q1"}
+    assert log_pipeline.current_context() == {}
+
+def test_debug_sampling_is_decided_per_query(monkeypatch):
+    monkeypatch.setattr(log_pipeline, "LOG_DEBUG_SAMPLE_RATE", 0.5)
+    for query_id in ("q1", "q2", "q3", "q4", "q5"):
+        with log_pipeline.log_context(query_id=query_id):
+            decisions = {filtered(make_record(logging.DEBUG)) for _ in range(5)}
+        assert len(decisions) == 1
+    # INFO ve üstü hiç örneklenmez
+    with log_pipeline.log_context(query_id="q1"):
+        assert filtered(make_record(logging.INFO))
+
+def test_queue_handler_truncates_and_counts_drops():
+    handler = log_pipeline.DroppingQueueHandler(queue.Queue(1))
+    record = make_record(msg="%s", args=("x" * (log_pipeline.LOG_MAX_MESSAGE + 50),))
+    prepared = handler.prepare(record)
+    assert prepared.msg == "x" * log_pipeline.LOG_MAX_MESSAGE + "... [50 karakter kısaltıldı]"
+    assert prepared.args is None
+
+    dropped = log_pipeline.dropped_records
+    handler.enqueue(prepared)
+    handler.enqueue(prepared)
+    assert log_pipeline.dropped_records == dropped + 1
@@ -0,0 +1,44 @@
+import pytest
+
+from matching import best_candidate, clean_game_name, extract_numbers_from_title, rank_candidates, score_candidate
+
+@pytest.mark.parametrize("title, expected", [
+    ("The Last of Us™ Part I", "the last of us part 1"),
+    ("Assassin’s Creed® Valhalla", "assassins creed valhalla"),
+    ("The Witcher 3: Wild Hunt - Game of the Year Edition", "the witcher 3 wild hunt"),
+    ("Final Fantasy VII Remastered", "final fantasy vii"),
+    ("Hades II", "hades 2"),
+    ("  Elden   Ring  ", "elden ring"),
+])
+def test_clean_game_name(title, expected):
+    assert clean_game_name(title) == expected
+
+def test_extract_numbers_from_title():
+    assert extract_numbers_from_title("hades ii") == frozenset({2})
+    assert extract_numbers_from_title("forza horizon 5") == frozenset({5})
+    # "is" içindeki "I" sayı sayılmaz
+    assert extract_numbers_from_title("this is it") == frozenset()
+
+def test_containment_profile_rejects_unwanted_sequels():
+    titles = ["Hades II", "Hades", "Hades Soundtrack"]
+    match = best_candidate("hades", titles, "steam")
+    assert match.title == "Hades"
+    assert score_candidate("hades", "Hades II", "steam")[0] == -10
+
+def test_ties_keep_store_order():
+    matches = rank_candidates("portal", ["Portal", "Portal Bundle"], "xbox")
+    assert [match.title for match in matches] == ["Portal", "Portal Bundle"]
+    assert matches[0].score == matches[1].score == 90
+
+def test_playstation_profile_prefers_short_prefix_matches():
+    titles = ["Marvel's Spider-Man 2 Digital Deluxe", "Marvel's Spider-Man 2", "Marvel's Spider-Man Remastered"]
+    match = best_candidate(clean_game_name("Marvel's Spider-Man 2"), titles, "playstation")
+    assert match.title == "Marvel's Spider-Man 2"
+    assert match.score == 95
+
+def test_platform_marker_is_not_a_sequel():
+    score, _ = score_candidate("god of war", "God of War PS4", "playstation")
+    assert score > 0
+
+def test_no_candidate_below_threshold():
+    assert best_candidate("elden ring", ["Dark Souls III", "Bloodborne"], "steam") is None
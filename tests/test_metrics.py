@@ -0,0 +1,48 @@
+import pytest
+
+import metrics
+
+@pytest.fixture
+def registry():
+    return metrics.Registry()
+
+def test_counter_exposition(registry):
+    counter = metrics.Counter("fiyatbot_test_total", "Test counter.", ["store"], registry=registry)
+    counter.inc(store="steam")
+    counter.inc(2, store="xbox")
+    counter.inc(store="steam")
+    assert registry.render() == (
+        "# HELP fiyatbot_test_total Test counter.\n"
+        "# TYPE fiyatbot_test_total counter\n"
+        'fiyatbot_test_total{store="steam"} 2\n'
+        'fiyatbot_test_total{store="xbox"} 2\n'
+    )
+
+def test_label_values_are_escaped(registry):
+    counter = metrics.Counter("fiyatbot_escape_total", "Escaping.", ["name"], registry=registry)
+    counter.inc(name='a "b"\\\n')
+    assert 'fiyatbot_escape_total{name="a \\"b\\"\\\\\\n"} 1' in registry.render()
+
+def test_wrong_labels_are_rejected(registry):
+    counter = metrics.Counter("fiyatbot_labels_total", "Labels.", ["store"], registry=registry)
+    with pytest.raises(ValueError):
+        counter.inc(shop="steam")
+
+def test_gauge_function_and_missing_values(registry):
+    gauge = metrics.Gauge("fiyatbot_depth", "Depth.", ["store"], registry=registry)
+    gauge.set_function(lambda: {("xbox",): 3, ("ps",): None})
+    assert registry.render().splitlines()[2:] == ['fiyatbot_depth{store="xbox"} 3']
+    gauge.set_function(lambda: None)
+    assert registry.render().splitlines()[2:] == []
+
+def test_histogram_buckets_are_cumulative(registry):
+    histogram = metrics.Histogram("fiyatbot_seconds", "Latency.", buckets=(0.1, 1.0), registry=registry)
+    for value in (0.05, 0.5, 0.7, 5.0):
+        histogram.observe(value)
+    assert registry.render().splitlines()[2:] == [
+        'fiyatbot_seconds_bucket{le="0.1"} 1',
+        'fiyatbot_seconds_bucket{le="1.0"} 3',
+        'fiyatbot_seconds_bucket{le="+Inf"} 4',
+        "fiyatbot_seconds_sum 6.25",
+        "fiyatbot_seconds_count 4",
+    ]
@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+import main
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    # Sadece main'in gördüğü saat değişir; event loop gerçek saati kullanmaya devam eder.
+    monkeypatch.setattr(main, "time", clock)
+    return clock
+
+def new_cache(max_entries=10):
+    return main.PriceCache(max_entries, {"steam": 100}, default_ttl=50, negative_ttl=10, stale_ttl=30)
+
+class Fetcher:
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+async def settle(cache):
+    await asyncio.gather(*cache._refreshing.values())
+
+def test_positive_entries_live_for_the_store_ttl(clock):
+    async def scenario():
+        cache = new_cache()
+        fetcher = Fetcher({"price": "100"}, {"price": "90"})
+        assert await cache.get_or_fetch("steam", "hades", fetcher) == {"price": "100"}
+        clock.now += 99
+        assert await cache.get_or_fetch("steam", "hades", fetcher) == {"price": "100"}
+        assert fetcher.calls == 1
+        # Stale süresi de geçtiyse kayıt silinir ve eşzamanlı olarak yeniden alınır.
+        clock.now += 100 + 30
+        assert await cache.get_or_fetch("steam", "hades", fetcher) == {"price": "90"}
+        assert fetcher.calls == 2
+    asyncio.run(scenario())
+
+def test_not_found_uses_the_negative_ttl(clock):
+    async def scenario():
+        cache = new_cache()
+        fetcher = Fetcher(None, {"price": "100"})
+        assert await cache.get_or_fetch("steam", "hades", fetcher) is None
+        clock.now += 9
+        assert await cache.get_or_fetch("steam", "hades", fetcher) is None
+        assert fetcher.calls == 1
+        clock.now += 2 + 30
+        assert await cache.get_or_fetch("steam", "hades", fetcher) == {"price": "100"}
+    asyncio.run(scenario())
+
+def test_upstream_failures_are_not_cached(clock):
+    async def scenario():
+        cache = new_cache()
+        fetcher = Fetcher(main.StoreUnavailable("HTTP 503"), {"price": "100"})
+        with pytest.raises(main.StoreUnavailable):
+            await cache.get_or_fetch("steam", "hades", fetcher)
+        assert len(cache) == 0
+        assert await cache.get_or_fetch("steam", "hades", fetcher) == {"price": "100"}
+    asyncio.run(scenario())
+
+def test_lru_evicts_the_least_recently_used_entry(clock):
+    async def scenario():
+        cache = new_cache(max_entries=2)
+        for key in ("a", "b"):
+            await cache.get_or_fetch("steam", key, Fetcher({"price": key}))
+        await cache.get_or_fetch("steam", "a", Fetcher())  # a en son kullanılan olur
+        await cache.get_or_fetch("steam", "c", Fetcher({"price": "c"}))
+        assert set(key for _, key in cache._entries) == {"a", "c"}
+    asyncio.run(scenario())
+
+def test_stale_entry_is_served_and_refreshed_in_background(clock):
+    async def scenario():
+        cache = new_cache()
+        await cache.get_or_fetch("steam", "hades", Fetcher({"price": "100"}))
+        clock.now += 101
+        refresher = Fetcher({"price": "90"})
+        assert await cache.get_or_fetch("steam", "hades", refresher) == {"price": "100"}
+        await settle(cache)
+        assert await cache.get_or_fetch("steam", "hades", Fetcher()) == {"price": "90"}
+        assert cache.stats == {"hits": 1, "stale_hits": 1, "misses": 1}
+    asyncio.run(scenario())
+
+@pytest.mark.parametrize("refresh_result", [main.StoreUnavailable("timeout"), None])
+def test_failed_or_empty_refresh_keeps_the_stale_price(clock, refresh_result):
+    async def scenario():
+        cache = new_cache()
+        await cache.get_or_fetch("steam", "hades", Fetcher({"price": "100"}))
+        clock.now += 101
+        assert await cache.get_or_fetch("steam", "hades", Fetcher(refresh_result)) == {"price": "100"}
+        await settle(cache)
+        assert await cache.get_or_fetch("steam", "hades", Fetcher()) == {"price": "100"}
+    asyncio.run(scenario())
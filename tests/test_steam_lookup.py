@@ -0,0 +1,36 @@
+import asyncio
+
+import main
+
+class FakeIndex:
+    def __init__(self):
+        self.queries = []
+
+    def lookup(self, query):
+        self.queries.append(query)
+        return 1145360, "Hades", 90
+
+def test_index_hit_is_looked_up_once_and_persisted(monkeypatch, tmp_path):
+    index = FakeIndex()
+    store = main.ResolutionStore(str(tmp_path / "resolutions.sqlite3"))
+    app_ids = []
+
+    async def fake_app_price(app_id):
+        app_ids.append(app_id)
+        return {"price": (100.0, "USD"), "link": f"https://store.steampowered.com/app/{app_id}", "name": "Hades"}
+
+    monkeypatch.setattr(main, "steam_title_index", index)
+    monkeypatch.setattr(main, "resolution_store", store)
+    monkeypatch.setattr(main, "get_steam_app_price", fake_app_price)
+
+    result = asyncio.run(main.get_best_steam_result("Hades", "hades"))
+    assert result["name"] == "Hades"
+    assert index.queries == ["hades"]
+    assert app_ids == [1145360]
+    resolved = asyncio.run(store.get("hades", "steam"))
+    assert resolved["store_id"] == "1145360"
+    assert resolved["confidence"] == 90
+
+    # Çözümlenmiş sorgu indekse tekrar bakmaz.
+    asyncio.run(main.get_steam_price("hades"))
+    assert index.queries == ["hades"]
@@ -0,0 +1,48 @@
+import json
+
+import main
+from title_index import TitleIndex, parse_app_list
+
+APPS = {
+    400: "Portal",
+    620: "Portal 2",
+    323180: "Portal 2 Soundtrack",
+    1145360: "Hades",
+    1145350: "Hades II",
+    292030: "The Witcher® 3: Wild Hunt",
+}
+
+def test_lookup_prefers_the_bare_title(tmp_path):
+    index = TitleIndex.build(str(tmp_path / "index"), APPS)
+    assert len(index) == len(APPS)
+    assert index.lookup("Portal 2") == (620, "Portal 2", 90)
+    assert index.lookup("the witcher 3")[0] == 292030
+    # "Hades" sorgusu devam oyununa düşmemeli
+    assert index.lookup("Hades")[0] == 1145360
+    assert index.lookup("zzz unknown game") is None
+
+def test_reopen_and_snapshot_delta(tmp_path):
+    directory = str(tmp_path / "index")
+    TitleIndex.build(directory, APPS)
+    index = TitleIndex.open(directory)
+    assert index.lookup("Portal")[0] == 400
+
+    updated = dict(APPS)
+    del updated[400]
+    updated[2050650] = "Resident Evil 4"
+    index = index.with_snapshot(updated)
+    assert index.lookup("resident evil 4")[0] == 2050650
+    assert index.app_names() == updated
+    # Delta diske yazılır; yeniden açılan indeks aynı sonucu verir.
+    assert TitleIndex.open(directory).app_names() == updated
+
+def test_parse_app_list_skips_unnamed_apps():
+    payload = {"applist": {"apps": [{"appid": 1, "name": " A "}, {"appid": 2, "name": ""}, {"appid": "3", "name": "C"}]}}
+    assert parse_app_list(payload) == {1: "A"}
+
+def test_build_steam_title_index_decodes_in_one_step(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "STEAM_TITLE_INDEX_DIR", str(tmp_path / "steam"))
+    body = json.dumps({"applist": {"apps": [{"appid": appid, "name": name} for appid, name in APPS.items()]}}).encode()
+    index = main.build_steam_title_index(body, None)
+    assert index.lookup("Portal 2")[0] == 620
+    assert main.build_steam_title_index(b'{"applist": {"apps": []}}', index) is None
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+import main
+
+@pytest.mark.parametrize("argument, expected", [
+    ("Elden Ring | 1.299", ("Elden Ring", 1299.0)),
+    ("Elden Ring | 1.299,90", ("Elden Ring", 1299.90)),
+    ("Elden Ring | 750", ("Elden Ring", 750.0)),
+    ("Elden Ring | 750,5", ("Elden Ring", 750.5)),
+    ("Elden Ring | 1.299 TL", ("Elden Ring", 1299.0)),
+    ("Elden Ring", ("Elden Ring", None)),
+])
+def test_parse_watch_command(argument, expected):
+    assert main.parse_watch_command(argument) == expected
+
+@pytest.mark.parametrize("argument", ["Hades | abc", "Hades | 0", "Hades | -5"])
+def test_parse_watch_command_rejects_bad_prices(argument):
+    with pytest.raises(ValueError):
+        main.parse_watch_command(argument)
+
+def new_game():
+    return {"query": "hades", "itad_id": "itad-1", "steam_appid": None, "prices": {}}
+
+def test_itad_refresh_replaces_previous_offers(monkeypatch):
+    responses = [
+        {"itad-1": {"deals": [
+            {"shop": {"name": "Steam"}, "price": {"amount": 100.0, "currency": "TRY"}, "url": "s"},
+            {"shop": {"name": "Epic Game Store"}, "price": {"amount": 50.0, "currency": "TRY"}, "url": "e"},
+        ]}},
+        # İndirim bitti: Epic artık listede yok
+        {"itad-1": {"deals": [{"shop": {"name": "Steam"}, "price": {"amount": 100.0, "currency": "TRY"}, "url": "s"}]}},
+    ]
+
+    async def fake_batch(path, params, ids):
+        return responses.pop(0)
+
+    monkeypatch.setattr(main, "post_itad_batch", fake_batch)
+    monkeypatch.setattr(main, "WATCHLIST_BATCH_PAUSE", 0)
+    refresher = main.WatchlistRefresher(None)
+    game = new_game()
+
+    asyncio.run(refresher._refresh_itad([game], usd_rate=None))
+    now = game["prices"]["itad"]["checked_at"]
+    assert refresher._best_price(game, now) == (50.0, "Epic Game Store", "e")
+    asyncio.run(refresher._refresh_itad([game], usd_rate=None))
+    assert refresher._best_price(game, now) == (100.0, "Steam", "s")
+
+def test_best_price_ignores_sources_that_stopped_refreshing():
+    game = new_game()
+    main.set_source_offers(game, "itad", {"Epic Game Store": [50.0, "e"]}, now=0)
+    main.set_source_offers(game, "steam", {"Steam": [100.0, "s"]}, now=main.WATCHLIST_OFFER_MAX_AGE)
+    assert main.WatchlistRefresher._best_price(game, main.WATCHLIST_OFFER_MAX_AGE) == (50.0, "Epic Game Store", "e")
+    assert main.WatchlistRefresher._best_price(game, main.WATCHLIST_OFFER_MAX_AGE + 1) == (100.0, "Steam", "s")
+
+def test_console_failure_keeps_last_offer(monkeypatch):
+    async def xbox_fails(name):
+        raise RuntimeError("down")
+
+    async def ps_not_found(name):
+        return None
+
+    monkeypatch.setattr(main, "get_xbox_price", xbox_fails)
+    monkeypatch.setattr(main, "get_playstation_price", ps_not_found)
+    game = new_game()
+    game["console_checked_at"] = 0
+    main.set_source_offers(game, "xbox", {"Xbox": [300.0, "x"]}, now=1)
+    main.set_source_offers(game, "playstation", {"PlayStation": [200.0, "p"]}, now=1)
+
+    asyncio.run(main.WatchlistRefresher(None)._refresh_consoles([game]))
+    assert game["prices"]["xbox"]["offers"] == {"Xbox": [300.0, "x"]}
+    assert game["prices"]["playstation"]["offers"] == {}
+
+def test_itad_refresh_retries_rate_limited_batch_after_retry_after(monkeypatch):
+    calls = []
+    sleeps = []
+
+    async def fake_batch(path, params, ids):
+        calls.append(list(ids))
+        if len(calls) == 1:
+            raise main.ItadBatchError(429, "slow down", {"retry-after": "7"})
+        return {"itad-1": {"deals": [{"shop": {"name": "Steam"}, "price": {"amount": 100.0, "currency": "TRY"}, "url": "s"}]}}
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+
+    monkeypatch.setattr(main, "post_itad_batch", fake_batch)
+    monkeypatch.setattr(main.asyncio, "sleep", fake_sleep)
+    monkeypatch.setattr(main, "WATCHLIST_BATCH_PAUSE", 0)
+    game = new_game()
+
+    asyncio.run(main.WatchlistRefresher(None)._refresh_itad([game], usd_rate=None))
+    assert calls == [["itad-1"], ["itad-1"]]
+    assert sleeps[0] == 7.0
+    assert game["prices"]["itad"]["offers"] == {"Steam": [100.0, "s"]}
@@ -0,0 +1,26 @@
+from aiohttp.test_utils import make_mocked_request
+
+import main
+
+def request_from(remote, headers=None):
+    request = make_mocked_request("GET", "/price?q=hades", headers=headers or {})
+    # make_mocked_request'in sahte transport'u peername vermez
+    return request.clone(remote=remote)
+
+def test_client_key_ignores_forwarded_for_by_default(monkeypatch):
+    monkeypatch.setattr(main, "WEB_API_TRUST_PROXY", False)
+    request = request_from("203.0.113.7", {"X-Forwarded-For": "198.51.100.1"})
+    assert main.web_api_client_key(request) == "203.0.113.7"
+
+def test_client_key_uses_proxy_appended_address_when_trusted(monkeypatch):
+    monkeypatch.setattr(main, "WEB_API_TRUST_PROXY", True)
+    request = request_from("127.0.0.1", {"X-Forwarded-For": "10.9.9.9, 198.51.100.1"})
+    assert main.web_api_client_key(request) == "198.51.100.1"
+
+def test_public_bind_requires_token(monkeypatch):
+    monkeypatch.setattr(main, "WEB_API_TOKEN", None)
+    assert main.web_api_host_allowed("127.0.0.1")
+    assert main.web_api_host_allowed("localhost")
+    assert not main.web_api_host_allowed("0.0.0.0")
+    monkeypatch.setattr(main, "WEB_API_TOKEN", "secret")
+    assert main.web_api_host_allowed("0.0.0.0")
@@ -0,0 +1,252 @@
+# --- Yerel Steam Başlık İndeksi ---
+# Steam'in tüm uygulama listesinden (appid, ad) üretilen trigram ters indeksi. Ad çözümleme
+# ağa çıkmadan, milisaniyenin altında yapılır; Steam storesearch yalnızca yedek olarak kalır.
+#
+# Disk düzeni (TITLE_INDEX_DIR altında):
+#   meta.json     -> sürüm, belge sayısı, trigram -> [postings ofseti, adet]
+#   docs.bin      -> belge başına (appid, ad ofseti, ad uzunluğu), uint32
+#   names.bin     -> UTF-8 adların art arda dizilmiş hali
+#   postings.bin  -> trigram başına sıralı belge id listeleri, uint32
+#   delta.json    -> son derlemeden sonra eklenen/silinen uygulamalar
+# Belge id'leri temizlenmiş ad uzunluğuna göre sıralanır; eşit puanlı adaylarda kısa
+# (yani en "çıplak") başlık kazanır, "Portal 2" ile "Portal 2 Soundtrack" gibi.
+import json
+import mmap
+import os
+import shutil
+import time
+from array import array
+from bisect import bisect_left
+from itertools import chain
+
+from matching import clean_game_name, rank_candidates, MIN_MATCH_SCORE
+
+INDEX_VERSION = 1
+GRAM_SIZE = 3
+# Tek bir sorguda puanlanacak en fazla aday; id sırası kısa başlıkları öne aldığı için yeterli.
+MAX_CANDIDATES = 200
+# Delta, temel indeksin bu oranını aşınca dosyalar baştan derlenir.
+COMPACT_RATIO = 0.05
+_DOC_FIELDS = 3
+# Toplu derlemede yüz binlerce ad tek sefer temizlenir; sorgu önbelleğini doldurmasın.
+_clean_uncached = clean_game_name.__wrapped__
+
+def trigrams(cleaned):
+    return {cleaned[i:i + GRAM_SIZE] for i in range(len(cleaned) - GRAM_SIZE + 1)}
+
+def _map_file(path):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+class TitleIndex:
+    """Trigram inverted index over Steam app names with memory-mapped postings and a small delta overlay."""
+
+    def __init__(self, directory, meta, delta):
+        self.directory = directory
+        self.meta = meta
+        self._grams = meta["trigrams"]
+        self._maps = [_map_file(os.path.join(directory, name)) for name in ("docs.bin", "names.bin", "postings.bin")]
+        docs_map, self._names, postings_map = self._maps
+        self._docs = memoryview(docs_map).cast("I") if docs_map else memoryview(array("I"))
+        self._postings = memoryview(postings_map).cast("I") if postings_map else memoryview(array("I"))
+        self.base_count = meta["doc_count"]
+        self._base_by_appid = None
+
+        # Delta katmanı: eklenen belgeler temel id'lerin devamından numaralanır, silinenler tombstone olur.
+        self.delta = delta
+        self._tombstones = set()
+        self._delta_docs = []  # (appid, name)
+        self._delta_postings = {}
+        removed = set(delta["removed"])
+        if removed:
+            self._tombstones = {doc_id for appid, doc_id in self._appid_map().items() if appid in removed}
+        for appid, name in delta["added"]:
+            doc_id = self.base_count + len(self._delta_docs)
+            self._delta_docs.append((appid, name))
+            for gram in trigrams(_clean_uncached(name)):
+                self._delta_postings.setdefault(gram, []).append(doc_id)
+
+    # --- Okuma ---
+    @classmethod
+    def open(cls, directory):
+        """Opens a previously built index, or returns None when there is none (or it is from another version)."""
+        try:
+            with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("version") != INDEX_VERSION:
+                return None
+            delta = {"added": [], "removed": []}
+            delta_path = os.path.join(directory, "delta.json")
+            if os.path.exists(delta_path):
+                with open(delta_path, encoding="utf-8") as f:
+                    delta = json.load(f)
+            return cls(directory, meta, delta)
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def __len__(self):
+        return self.base_count + len(self._delta_docs) - len(self._tombstones)
+
+    @property
+    def built_at(self):
+        return self.meta.get("refreshed_at", self.meta.get("built_at", 0))
+
+    def doc(self, doc_id):
+        if doc_id >= self.base_count:
+            return self._delta_docs[doc_id - self.base_count]
+        appid, offset, length = self._docs[doc_id * _DOC_FIELDS:(doc_id + 1) * _DOC_FIELDS]
+        return appid, self._names[offset:offset + length].decode("utf-8")
+
+    def _appid_map(self):
+        if self._base_by_appid is None:
+            self._base_by_appid = {self._docs[i * _DOC_FIELDS]: i for i in range(self.base_count)}
+        return self._base_by_appid
+
+    def _base_postings(self, gram):
+        entry = self._grams.get(gram)
+        if not entry:
+            return self._postings[0:0]
+        offset, count = entry
+        return self._postings[offset:offset + count]
+
+    def _contains(self, gram, doc_id):
+        if doc_id >= self.base_count:
+            return doc_id in self._delta_postings.get(gram, ())
+        postings = self._base_postings(gram)
+        i = bisect_left(postings, doc_id)
+        return i < len(postings) and postings[i] == doc_id
+
+    def candidates(self, cleaned_query, limit=MAX_CANDIDATES):
+        """Returns up to `limit` doc ids whose names contain every trigram of the query, shortest names first."""
+        grams = trigrams(cleaned_query)
+        if not grams:
+            return []
+        # En nadir trigramdan başla; diğerleri ikili arama ile doğrulanır.
+        sized = sorted(grams, key=lambda g: len(self._base_postings(g)) + len(self._delta_postings.get(g, ())))
+        rarest, rest = sized[0], sized[1:]
+        found = []
+        for doc_id in chain(self._base_postings(rarest), self._delta_postings.get(rarest, ())):
+            if doc_id in self._tombstones:
+                continue
+            if all(self._contains(gram, doc_id) for gram in rest):
+                found.append(doc_id)
+                if len(found) >= limit:
+                    break
+        return found
+
+    def lookup(self, query, min_score=MIN_MATCH_SCORE):
+        """Resolves a title to (appid, canonical name, score) using the Steam scoring rules, or None."""
+        cleaned_query = clean_game_name(query)
+        if len(cleaned_query) < GRAM_SIZE:
+            return None
+        docs = [self.doc(doc_id) for doc_id in self.candidates(cleaned_query)]
+        matches = rank_candidates(cleaned_query, [name for _, name in docs], "steam")
+        if not matches or matches[0].score < min_score:
+            return None
+        best = matches[0]
+        return docs[best.index][0], best.title, best.score
+
+    def app_names(self):
+        names = {}
+        for doc_id in range(self.base_count):
+            if doc_id not in self._tombstones:
+                appid, name = self.doc(doc_id)
+                names[appid] = name
+        for appid, name in self._delta_docs:
+            names[appid] = name
+        return names
+
+    # --- Yazma ---
+    @classmethod
+    def build(cls, directory, apps):
+        """Writes a fresh index for an {appid: name} mapping and opens it."""
+        started = time.monotonic()
+        entries = sorted(
+            ((_clean_uncached(name), appid, name) for appid, name in apps.items()),
+            key=lambda entry: (len(entry[0]), entry[1]),
+        )
+        docs = array("I")
+        names = bytearray()
+        gram_postings = {}
+        for doc_id, (cleaned, appid, name) in enumerate(entries):
+            encoded = name.encode("utf-8")
+            docs.extend((appid, len(names), len(encoded)))
+            names += encoded
+            for gram in trigrams(cleaned):
+                gram_postings.setdefault(gram, array("I")).append(doc_id)
+
+        postings = array("I")
+        gram_table = {}
+        for gram, ids in gram_postings.items():
+            gram_table[gram] = [len(postings), len(ids)]
+            postings.extend(ids)
+
+        now = time.time()
+        meta = {"version": INDEX_VERSION, "doc_count": len(entries), "built_at": now, "refreshed_at": now, "trigrams": gram_table}
+        # Önce geçici dizine yazılır, sonra yer değiştirilir; yarım kalmış bir derleme okunmaz.
+        tmp_dir = directory.rstrip(os.sep) + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        with open(os.path.join(tmp_dir, "docs.bin"), "wb") as f:
+            docs.tofile(f)
+        with open(os.path.join(tmp_dir, "names.bin"), "wb") as f:
+            f.write(names)
+        with open(os.path.join(tmp_dir, "postings.bin"), "wb") as f:
+            postings.tofile(f)
+        with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        old_dir = directory.rstrip(os.sep) + ".old"
+        shutil.rmtree(old_dir, ignore_errors=True)
+        if os.path.exists(directory):
+            os.replace(directory, old_dir)
+        os.replace(tmp_dir, directory)
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+        index = cls.open(directory)
+        index.build_seconds = time.monotonic() - started
+        return index
+
+    def with_snapshot(self, apps):
+        """Applies a newer {appid: name} snapshot and returns the index to use from now on.
+
+        Small changes only go into delta.json; once the delta grows past COMPACT_RATIO
+        of the base the whole index is rebuilt.
+        """
+        if self.app_names() == apps:
+            self._touch_meta()
+            return self
+
+        base_names = {}
+        for doc_id in range(self.base_count):
+            appid, name = self.doc(doc_id)
+            base_names[appid] = name
+        delta_added = {appid: name for appid, name in apps.items() if base_names.get(appid) != name}
+        delta_removed = [appid for appid, name in base_names.items() if apps.get(appid) != name]
+        if len(delta_added) + len(delta_removed) > max(self.base_count * COMPACT_RATIO, 1000):
+            return TitleIndex.build(self.directory, apps)
+
+        delta = {"added": [[appid, name] for appid, name in delta_added.items()], "removed": delta_removed}
+        delta_path = os.path.join(self.directory, "delta.json")
+        with open(delta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(delta, f, ensure_ascii=False)
+        os.replace(delta_path + ".tmp", delta_path)
+        self._touch_meta()
+        return TitleIndex(self.directory, self.meta, delta)
+
+    def _touch_meta(self):
+        self.meta["refreshed_at"] = time.time()
+        meta_path = os.path.join(self.directory, "meta.json")
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, ensure_ascii=False)
+        os.replace(meta_path + ".tmp", meta_path)
+
+def parse_app_list(payload):
+    """Turns a GetAppList response into {appid: name}, skipping unnamed apps."""
+    apps = {}
+    for app in payload.get("applist", {}).get("apps", []):
+        name = (app.get("name") or "").strip()
+        if name and isinstance(app.get("appid"), int):
+            apps[app["appid"]] = name
+    return apps